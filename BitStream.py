@@ -0,0 +1,204 @@
+import numpy
+
+
+
+# ----- Bitstream writer ----- #
+
+# Size (in bits) of the accumulator before flushing its complete bytes to the bytearray
+ACCUMULATOR_SIZE_IN_BITS = 64
+
+
+# Writes (value, nBits) pairs into an integer accumulator and moves the
+# completed bytes to a bytearray (MSB first, as done by the hybrid coder)
+class BitStreamWriter():
+
+    def __init__(self):
+        # bytearray with the already completely coded bytes
+        self.bitStream = bytearray()
+        # Bits written but not yet moved to the bytearray (right aligned)
+        self.accumulator = 0
+        # Number of valid bits in the accumulator
+        self.accumulatedBits = 0
+        # Number of complete bytes already removed from the bytearray (written to a file)
+        self.nWrittenBytes = 0
+
+
+    # Write the 'nBits' least significant bits of 'value' into the bitstream
+    def writeBits(self, value, nBits):
+        self.accumulator = (self.accumulator << nBits) | (int(value) & ((1 << nBits) - 1))
+        self.accumulatedBits = self.accumulatedBits + nBits
+        if self.accumulatedBits >= ACCUMULATOR_SIZE_IN_BITS:
+            self.flushCompleteBytes()
+
+
+    # Move all the complete bytes of the accumulator to the bytearray
+    def flushCompleteBytes(self):
+        nBytes = self.accumulatedBits >> 3
+        if nBytes > 0:
+            remainingBits = self.accumulatedBits & 0x7
+            self.bitStream += (self.accumulator >> remainingBits).to_bytes(nBytes, 'big')
+            self.accumulator = self.accumulator & ((1 << remainingBits) - 1)
+            self.accumulatedBits = remainingBits
+
+
+    # Write a sequence of codes at once (see packCodes)
+    def writeCodes(self, codeValues, codeLengths):
+        # The bits still in the accumulator are packed in front of the new codes
+        self.flushCompleteBytes()
+        codeValues = numpy.concatenate((numpy.array([self.accumulator], dtype=numpy.uint64), numpy.asarray(codeValues, dtype=numpy.uint64)))
+        codeLengths = numpy.concatenate((numpy.array([self.accumulatedBits], dtype=numpy.int64), numpy.asarray(codeLengths, dtype=numpy.int64)))
+        packedBytes, nBits = packCodes(codeValues, codeLengths)
+        # Move the complete bytes to the bytearray and keep the rest in the accumulator
+        nBytes = nBits >> 3
+        self.bitStream += packedBytes[:nBytes].tobytes()
+        self.accumulatedBits = nBits & 0x7
+        self.accumulator = int(packedBytes[nBytes]) >> (8 - self.accumulatedBits) if self.accumulatedBits > 0 else 0
+
+
+    # Write the bytes of the bytearray to a file and remove them from the bytearray
+    # (the bits still in the accumulator are kept)
+    def writeCompleteBytesToFile(self, filePointer):
+        filePointer.write(self.bitStream)
+        self.nWrittenBytes = self.nWrittenBytes + len(self.bitStream)
+        del self.bitStream[:]
+
+
+    # Number of bits already written into the current (uncompleted) byte
+    def getWrittenBitsInCurrentByte(self):
+        return self.accumulatedBits & 0x7
+
+
+    # Number of completely coded bytes (including the ones still in the accumulator and the ones already written to a file)
+    def getNumberOfCompleteBytes(self):
+        return self.nWrittenBytes + len(self.bitStream) + (self.accumulatedBits >> 3)
+
+
+
+
+# ----- Vectorized bit packer ----- #
+
+# Pack a sequence of codes into bytes (MSB first), producing the same bits as
+# calling BitStreamWriter.writeBits(codeValue, codeLength) for each code
+# Inputs:
+#   codeValues: array of unsigned integers (up to 64 bits)
+#   codeLengths: array with the number of bits of each code. Codes longer than 64 bits
+#                are written as 'zeros' followed by the 64 bits of the code value
+# Returns:
+#   packedBytes: uint8 array with the packed bits (the last byte padded with 'zeros')
+#   nBits: total number of bits
+def packCodes(codeValues, codeLengths):
+    codeValues = numpy.asarray(codeValues, dtype=numpy.uint64).ravel()
+    codeLengths = numpy.asarray(codeLengths, dtype=numpy.int64).ravel()
+    # Codes with zero bits do not write anything
+    nonEmptyCodes = codeLengths > 0
+    codeValues = codeValues[nonEmptyCodes]
+    codeLengths = codeLengths[nonEmptyCodes]
+    if codeLengths.size == 0:
+        return numpy.zeros(1, dtype=numpy.uint8), 0
+    # Position (in bits) of the end of each code
+    endOffsets = numpy.cumsum(codeLengths)
+    nBits = int(endOffsets[-1])
+    # Only the (up to 64) last bits of each code can be 'ones'
+    significantLengths = numpy.minimum(codeLengths, 64)
+    shortCodes = significantLengths < 64
+    codeValues[shortCodes] &= (numpy.uint64(1) << significantLengths[shortCodes].astype(numpy.uint64)) - numpy.uint64(1)
+    startOffsets = endOffsets - significantLengths
+    # Each code is written into the 64-bit word containing its first significant bit, and the bits
+    # exceeding that word into the next one. End of the code inside its first word (1 ... 127)
+    wordIndexes = startOffsets >> 6
+    endInWord = (startOffsets & 63) + significantLengths
+    crossingCodes = endInWord > 64
+    firstWordValues = numpy.where(crossingCodes,
+                                  codeValues >> numpy.clip(endInWord - 64, 0, 63).astype(numpy.uint64),
+                                  codeValues << numpy.clip(64 - endInWord, 0, 63).astype(numpy.uint64))
+    words = numpy.zeros((nBits >> 6) + 2, dtype=numpy.uint64)
+    # The codes do not overlap, so the words are obtained as the 'or' of all the codes starting in them
+    # (the codes are sorted, so the codes of each word are consecutive)
+    wordStarts = numpy.flatnonzero(numpy.concatenate(([True], wordIndexes[1:] != wordIndexes[:-1])))
+    words[wordIndexes[wordStarts]] = numpy.bitwise_or.reduceat(firstWordValues, wordStarts)
+    # Only one code can continue in each word
+    words[wordIndexes[crossingCodes] + 1] |= codeValues[crossingCodes] << (128 - endInWord[crossingCodes]).astype(numpy.uint64)
+    # Words to bytes (MSB first)
+    packedBytes = words.astype('>u8').view(numpy.uint8)[:(nBits + 7) >> 3]
+    return packedBytes, nBits
+
+
+
+
+# ----- Reverse bitstream reader ----- #
+
+# Number of bytes loaded into the reading window each time it is refilled
+WINDOW_REFILL_SIZE_IN_BYTES = 8
+
+
+# Reads the bitstream backwards (from its last bit to its first one) as done by the
+# hybrid decoder. The bits still not read at the end of the bitstream are kept in an
+# integer window, whose least significant bit is the next bit to be read.
+# The bits read are returned as integers, with the first read bit as the least significant one
+class ReverseBitStreamReader():
+
+    def __init__(self, bitStream):
+        self.bitStream = bitStream
+        # Index of the byte following the last byte not yet loaded into the window
+        self.nextByteIndex = len(bitStream)
+        # Bits loaded from the bitstream and still not read
+        self.window = 0
+        # Number of valid bits in the window
+        self.windowBits = 0
+
+
+    # Load bytes into the window until it contains at least 'nBits' bits
+    # If the begining of the bitstream is reached, the missing bits are read as 'zeros'
+    def fillWindow(self, nBits):
+        while self.windowBits < nBits and self.nextByteIndex > 0:
+            startByteIndex = max(0, self.nextByteIndex - WINDOW_REFILL_SIZE_IN_BYTES)
+            newBits = int.from_bytes(self.bitStream[startByteIndex:self.nextByteIndex], 'big')
+            self.window = self.window | (newBits << self.windowBits)
+            self.windowBits = self.windowBits + 8 * (self.nextByteIndex - startByteIndex)
+            self.nextByteIndex = startByteIndex
+
+
+    # Return the next 'nBits' bits without removing them from the bitstream
+    def peek(self, nBits):
+        if self.windowBits < nBits:
+            self.fillWindow(nBits)
+        return self.window & ((1 << nBits) - 1)
+
+
+    # Remove the next 'nBits' bits from the bitstream
+    def skip(self, nBits):
+        if self.windowBits < nBits:
+            self.fillWindow(nBits)
+        self.window = self.window >> nBits
+        self.windowBits = max(self.windowBits - nBits, 0)
+
+
+    # Return the next 'nBits' bits and remove them from the bitstream
+    def read(self, nBits):
+        if self.windowBits < nBits:
+            self.fillWindow(nBits)
+        value = self.window & ((1 << nBits) - 1)
+        self.window = self.window >> nBits
+        self.windowBits = max(self.windowBits - nBits, 0)
+        return value
+
+
+    # Number of consecutive next bits (up to 'maxBits') equal to 'bitValue' (0 or 1)
+    # The bits are not removed from the bitstream
+    def countTrailingBits(self, bitValue, maxBits):
+        bits = self.peek(maxBits)
+        if bitValue:
+            bits = bits ^ ((1 << maxBits) - 1)
+        if bits == 0:
+            return maxBits
+        return (bits & -bits).bit_length() - 1
+
+
+    # Number of consecutive next 'zeros' (up to 'maxBits')
+    def countTrailingZeros(self, maxBits):
+        return self.countTrailingBits(0, maxBits)
+
+
+    # Number of bits not yet read
+    def getRemainingBits(self):
+        return 8 * self.nextByteIndex + self.windowBits
@@ -1,22 +1,13 @@
 import numpy
-import pickle
 
+from BitStream import BitStreamWriter
+from HybridCodingTables import getCodingTables
+from HybridAccumulator import computeAccumulatorTrajectory, CodeSelectionTables
 
-# ----- Coding Tables ----- #
-
-# Low-Entropy Code Input Symbo Limit and Threshold (Table 5-16)
-# Code index, i || Input Simbol Limit, Li || Threshold, Ti
-INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH = 'CodingTables/LowEntropyCodeInputSymbolLimitAndThreshold.pickle'
 
-# Code tables (Input to output)
-# List. Element index = Code index
-# Each list element is a dictionary with 'key' = 'input codeword'
-INPUT_TO_OUTPUT_CODEWORDS = 'CodingTables/CodingTable.pickle'
+# ----- Coding Tables ----- #
 
-# Flush tables (Input to output)
-# List. Element index = Code index
-# Each list element is a dictionary with 'key' = 'input codeword'
-FLUSH_INPUT_TO_OUTPUT_CODEWORDS = 'CodingTables/FlushCodingTable.pickle'
+# The coding tables are loaded once per process and shared by all the instances (see HybridCodingTables.py)
 
 
 
@@ -49,8 +40,8 @@ class HybridCoder():
 
         # Coding Tables
         self.Table_InputSimbolLimitAndThreshold = None
-        self.Table_InputToOutputCodeWords = None
-        self.Table_FlushInputToOutputCodeWords = None
+        #   Integer tries of the low-entropy codes (one per code index, including the flush codes)
+        self.LowEntropyCodeTries = None
         self.loadCodingTables()
 
         # Coder variables
@@ -72,15 +63,16 @@ class HybridCoder():
         self.gamma = None  
         #   Threshold: T(0) (page 5-23 - Table 5-16)
         self.T0 = self.Table_InputSimbolLimitAndThreshold[0][2]
+        #   Breakpoints of Σ for selecting the processing and the code indexes for each Γ (built for D and ɣ^*)
+        self.codeSelectionTables = None
         #   Unary Length Limit: 8 <= Umax <= 32
         self.Umax = None
-        #   Active prefix for the low entropy coder
+        #   Active prefix for the low entropy coder (node of the trie of each code index)
         self.ActivePrefix = None
 
         # Bitstream variables
+        self.bitWriter = None       # bit accumulator writing (value, nBits) pairs into the bitstream
         self.bitStream = None       # bytearray with the already completely coded bytes
-        self.currentByte = None     # byte being coded (still uncompleted)
-        self.writtenBits = None     # number of bits already written into the current byte
         self.outputWordSize = None  # Not really needed but specified in the CCSDS123 Standard
 
         # Image variables
@@ -105,43 +97,31 @@ class HybridCoder():
         return min(max(minVal, x), maxVal)
 
 
-    # Load the coding files from the pickle files
+    # Get the coding tables shared by all the coder instances (loaded on first use)
     def loadCodingTables(self):
+        codingTables = getCodingTables()
         # Low-Entropy Code Input Symbo Limit and Threshold
-        filePath = INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH
-        filePointer = open(filePath, 'rb')
-        self.Table_InputSimbolLimitAndThreshold = pickle.load(filePointer)
-        filePointer.close() 
-        # Code tables (Input to output)
-        filePath = INPUT_TO_OUTPUT_CODEWORDS
-        filePointer = open(filePath, 'rb')
-        self.Table_InputToOutputCodeWords = pickle.load(filePointer)
-        filePointer.close() 
-        # Flush tables (Input to output)
-        filePath = FLUSH_INPUT_TO_OUTPUT_CODEWORDS
-        filePointer = open(filePath, 'rb')
-        self.Table_FlushInputToOutputCodeWords = pickle.load(filePointer)
-        filePointer.close() 
-
-
-    # Write the binary string into the byte array bit by bit
+        self.Table_InputSimbolLimitAndThreshold = codingTables.getTable('InputSymbolLimitAndThreshold')
+        # Low-entropy code tries
+        self.LowEntropyCodeTries = codingTables.getTable('LowEntropyCodeTries')
+
+
+    # Write the binary string into the bitstream
     def writeBinaryStringToBitStream(self, binaryString):
         nBits = len(binaryString)
-        for bit in binaryString:
-            self.currentByte = (self.currentByte << 1) | (int(bit) & 0x1)
-            self.writtenBits = self.writtenBits + 1
-            if self.writtenBits == 8:
-                self.bitStream.append(self.currentByte)
-                self.currentByte = 0
-                self.writtenBits = 0
+        if nBits > 0:
+            self.bitWriter.writeBits(int(binaryString, 2), nBits)
 
 
     # Add the 'padingValue' to the last byte of the bitstream until completing it
     def padding(self, padingValue):
-        # PadingValue: '0' or '1'
-        binaryString = padingValue
-        while self.writtenBits != 0:
-            self.writeBinaryStringToBitStream(binaryString)      
+        # PadingValue: 0 or 1
+        nBits = (8 - self.bitWriter.getWrittenBitsInCurrentByte()) & 0x7
+        if padingValue:
+            self.bitWriter.writeBits((1 << nBits) - 1, nBits)
+        else:
+            self.bitWriter.writeBits(0, nBits)
+        self.bitWriter.flushCompleteBytes()
 
 
     # Write the bitstream to a binary file
@@ -154,8 +134,9 @@ class HybridCoder():
 
     # Write an integer value to bitstream using specific number of bits
     def writeIntegerValueToBitstream(self, integerNumber, nBits):
-        binaryString = bin(integerNumber)[2:].zfill(nBits)
-        self.writeBinaryStringToBitStream(binaryString)
+        # Values not fitting in 'nBits' are written using all their significant bits
+        nBits = max(nBits, int(integerNumber).bit_length())
+        self.bitWriter.writeBits(integerNumber, nBits)
 
 
 
@@ -169,6 +150,8 @@ class HybridCoder():
 
     # Initialize varialbes
     def initializeCodingVariables(self):
+        # Code selection tables for the dynamic range and ɣ^*
+        self.codeSelectionTables = CodeSelectionTables(self.dynamicRangeInBits, self.gamma, self.Table_InputSimbolLimitAndThreshold)
         # Counter: Γ(0) = 2^ɣ(0)
         self.Gamma = 2**self.gamma_0  
         # High-Resoulutin accumulator list (one Σ per band)
@@ -183,13 +166,13 @@ class HybridCoder():
                 Sigma_0_clipped = self.clip(self.Sigma_0[band], 0, 2**(self.dynamicRangeInBits+self.gamma_0)-1 )  
                 self.SigmaList.append(Sigma_0_clipped)
         # Active prefix
+        # Active prefix (empty active prefix: node 0)
         self.ActivePrefix = []
         for index in range(0, 16):
-            self.ActivePrefix.append('')
+            self.ActivePrefix.append(0)
         # Bitstream variables
-        self.bitStream = bytearray()
-        self.currentByte = 0
-        self.writtenBits = 0
+        self.bitWriter = BitStreamWriter()
+        self.bitStream = self.bitWriter.bitStream
         self.GammaList = []
         for band in range(0, self.nBands):
             self.GammaList.append(self.Gamma)
@@ -217,40 +200,38 @@ class HybridCoder():
     #   j: unsigned integer to be coded
     #   k: unsigned integer code index
     def GPO2_coding(self, j, k):
+        j = int(j)
         # Coding
-        if int(j/2**k) < self.Umax:
+        nZeros = j >> k
+        if nZeros < self.Umax:
             # bitstream:
             #   k least significant bits of j
             #   followed by a 'one'
             #   followed by int(j/2^k) 'zeros'
-            # Process
-            #   Convert the decimal integer to binary format and remove the '0b' of the start
-            binaryString = bin(j)[2:]
-            #   Extract only the k least significant bits
-            if k == 0:
-                binaryString = ''
-            elif len(binaryString) >= k:
-                binaryString = binaryString[-k:]
-            elif len(binaryString) < k:
-                binaryString = binaryString.zfill(k)
-            #   Add the required 'one'
-            binaryString = binaryString + '1'
-            #   Add the j/2^k 'zeros'
-            nZeros = int(j/2**k)
-            binaryString = binaryString + ''.zfill(nZeros)
+            codeValue = ((((j & ((1 << k) - 1)) << 1) | 0x1) << nZeros)
+            codeLength = k + 1 + nZeros
         else:
             # bitstream:
             #   Binary representation of j using D-bits (D: Dynamic range in bits)
             #   followed by Umax 'zeros'
-            # Process
-            #   Convert the decimal integer to binary format and remove the '0b' of the start
-            binaryString = bin(j)[2:]
-            #   Append the number of required zeros at the start to complete the string with the specified length
-            binaryString = binaryString.zfill(self.dynamicRangeInBits)
-            #   Append the Umax zeros at the end
-            binaryString = binaryString + ''.zfill(self.Umax)
-        # Write the binary string to the bitstream
-        self.writeBinaryStringToBitStream(binaryString)
+            codeValue = j << self.Umax
+            codeLength = max(self.dynamicRangeInBits, j.bit_length()) + self.Umax
+        # Write the code to the bitstream
+        self.bitWriter.writeBits(codeValue, codeLength)
+
+
+    # Vectorized version of GPO2_coding for arrays of values 'j' and code indexes 'k'
+    # The code of each value is returned as the bits before the 'zeros' (head) and the number of 'zeros'
+    def GPO2_codes(self, j, k):
+        nZeros = j >> k
+        modeA = nZeros < self.Umax
+        #   k least significant bits of j followed by a 'one' | Binary representation of j using D-bits
+        headValues = numpy.where(modeA, ((j & ((1 << k) - 1)) << 1) | 0x1, j)
+        headLengths = numpy.where(modeA, k + 1, self.dynamicRangeInBits)
+        headLengths[~modeA] = [max(self.dynamicRangeInBits, value.bit_length()) for value in j[~modeA].tolist()]
+        #   followed by int(j/2^k) 'zeros' | followed by Umax 'zeros'
+        nZeros = numpy.where(modeA, nZeros, self.Umax)
+        return headValues, headLengths, nZeros
 
 
     # Update the High Resolution Accumulator (Σ(t): Sigma) and the Counter (Γ(t): Gamma)
@@ -263,8 +244,7 @@ class HybridCoder():
         else:
             # Rescaling, Add the least significant bit of Σ(t-1) to the bitstream
             # TIP: Σ(t-1) is self.Sigma before being updated
-            binaryString = bin(self.Sigma)[-1:]
-            self.writeBinaryStringToBitStream(binaryString)
+            self.bitWriter.writeBits(self.Sigma & 0x1, 1)
             # Update the values (rescaling them)
             self.Sigma = int((self.Sigma + 4*mappedResidual + 1)/2)
             self.Gamma = int((self.Gamma + 1)/2)
@@ -274,7 +254,7 @@ class HybridCoder():
     # Returns True: current mapped residual has to be processed as high-entropy
     # Returns False: current mapped residual has to be processed as low-entropy
     def EvaluateHighEntropyCondition(self):
-        if self.Sigma * (2**14) >= self.T0 * self.Gamma:
+        if self.codeSelectionTables.isHighEntropy(self.Sigma, self.Gamma):
             # Process current residual as high entropy
             return True
         else:
@@ -282,7 +262,6 @@ class HybridCoder():
             return False
 
 
-    # TODO: TBD. Optimize this doing the loop in reverser order.
     # Process the mapped residual with the high-entropy processing
     def HighEntropyProcess(self, mappedResidual):
         # Get largest 'k' satisfying:
@@ -292,61 +271,44 @@ class HybridCoder():
         #   D: dynamicRangeInBits
         #   Σ(t): Sigma 
         #   Γ(t): Gamma
-        k_good = 2
-        k = 3
-        while k <= max(self.dynamicRangeInBits-2, 2): 
-            if self.Gamma * 2**(k+2) <= self.Sigma + int( (49/2**5)*self.Gamma ):
-                k_good = k
-                k = k + 1
-            else:
-                break
+        k_good = self.codeSelectionTables.getK(self.Sigma, self.Gamma)
         # Code the mappedResidual using the appropiate value of 'k' and the 'GPO2' method 
         self.GPO2_coding(mappedResidual, k_good)
 
 
 
 
-    # TODO: TBD. Optimize this doing the loop in reverser order.
     # Process the mapped residual with the high-entropy processing
     def LowEntropyProcess(self, mappedResidual):
         # Get the largest code index 'i' satisfying:
         #   Σ(t) · 2^14 < Γ(t) · T(i)
-        i_good = 0
-        i = 1
-        while i < 16: #len(self.Table_InputSimbolLimitAndThreshold):
-            #  Threshold, Ti
-            Ti = self.Table_InputSimbolLimitAndThreshold[i][2]
-            # Condition to be satisfied
-            if self.Sigma * 2**14 < self.Gamma * Ti:
-                i_good = i
-                i = i + 1
-            else:
-                break
-        i = i_good
-        # Get the corresponding Input Simbol Limit, Li
-        Li = self.Table_InputSimbolLimitAndThreshold[i][1]       
-        # Get the Input Symbol 'l(t)'
+        i = self.codeSelectionTables.getCodeIndex(self.Sigma, self.Gamma)
+        # Code the mapped residual with the selected code index
+        self.LowEntropyProcessWithCodeIndex(mappedResidual, i)
+
+
+    # Process the mapped residual with the low-entropy processing using the code index 'i'
+    def LowEntropyProcessWithCodeIndex(self, mappedResidual, i):
+        # Get the trie of the code index and the corresponding Input Simbol Limit, Li
+        trie = self.LowEntropyCodeTries[i]
+        Li = trie.Li
+        # Get the Input Symbol 'l(t)': the mapped residual value (0 ... Li) or the scape symbol 'X' (Li+1)
         if mappedResidual <= Li:
-            # TODO: TBD.
-            # l: string with the hexadecimal value of the mapped residual
-            l = hex(mappedResidual).split('x')[-1]
+            l = mappedResidual
         else:
-            # TODO: TBD.
-            # l: Scape symbol 'X'
-            l = 'X'
+            l = trie.escapeSymbol
             # Write the residual value to the bitstream using the GPO2 function
             # Rk'(δ(t) - L(i) - 1) with k=0
             residualValue = mappedResidual - Li -1
             self.GPO2_coding(residualValue, 0)
-        # Update the active prefix
-        self.ActivePrefix[i] = self.ActivePrefix[i] + l.upper()
-        # Get the current input-output code table (dict)
-        # Check if the active prefix matches a complete codeword. If it does, add the 
-        # active prefix to the output bitstream and clear the active prefix
-        if self.ActivePrefix[i] in self.Table_InputToOutputCodeWords[i]:
-            outputCodeWord = self.Table_InputToOutputCodeWords[i].get(self.ActivePrefix[i])
-            self.writeBinaryStringToBitStream(outputCodeWord)
-            self.ActivePrefix[i] = ''
+        # Update the active prefix. If it matches a complete codeword, add its output
+        # codeword to the output bitstream and clear the active prefix
+        transition = trie.transitions[self.ActivePrefix[i]][l]
+        if transition >= 0:
+            self.ActivePrefix[i] = transition
+        else:
+            self.bitWriter.writeBits(*trie.codes[~transition])
+            self.ActivePrefix[i] = 0
 
 
 
@@ -355,25 +317,21 @@ class HybridCoder():
         flushValues = []
         # Codify the remaining active prefix using the corresponding code index for each of them
         for i in range(0, 16):    
-            fulshOutputCodeWord = self.Table_FlushInputToOutputCodeWords[i].get(self.ActivePrefix[i])
-            self.writeBinaryStringToBitStream(fulshOutputCodeWord)  
-            flushValues.append(fulshOutputCodeWord)      
+            fulshOutputCodeWord = self.LowEntropyCodeTries[i].flushCodes[self.ActivePrefix[i]]
+            self.bitWriter.writeBits(*fulshOutputCodeWord)
+            flushValues.append(fulshOutputCodeWord)
         # Codify Σ(t) as binary using 2+D+ɣ^* bits for each band in increasing order
         nBits = 2 + self.dynamicRangeInBits + self.gamma
         for Sigma in self.SigmaList:
-            binaryString = bin(Sigma)[2:]
-            binaryString = binaryString.zfill(nBits)
-            self.writeBinaryStringToBitStream(binaryString)
+            self.writeIntegerValueToBitstream(Sigma, nBits)
         # Add a '1' to the bitstream
-        self.writeBinaryStringToBitStream('1')
+        self.bitWriter.writeBits(1, 1)
         # Padding '0' until completing the last byte
-        self.padding('0')
+        self.padding(0)
         # Add 0 bytes until the number of bytes in the bitstream is multiple of the word size.
         # If it already is a multiple, add 'word size' bytes with 'zeros'
-        # self.currentByte = 0
-        # self.bitStream.append(self.currentByte)
         while len(self.bitStream) % self.outputWordSize != 0:
-            self.bitStream.append(self.currentByte)
+            self.bitStream.append(0)
 
 
 
@@ -386,9 +344,7 @@ class HybridCoder():
         self.getHighResolutionAccumulatorForTargetBand(band)
         # Code first mapped residual of each band as a plain binary with D bits
         if row == 0 and col == 0:
-            binaryString = bin(mappedResidual)[2:]
-            binaryString = binaryString.zfill(self.dynamicRangeInBits)
-            self.writeBinaryStringToBitStream(binaryString)
+            self.writeIntegerValueToBitstream(mappedResidual, self.dynamicRangeInBits)
         else:
             # Update the high resolution accumulator and the counter
             self.UpdateHighResolutionAccumulatorAndCounter(mappedResidual)
@@ -403,6 +359,88 @@ class HybridCoder():
         self.storeCurrentHighResolutionAccumulatorForTargetBand(band)
 
 
+    # Code all the mapped residuals in the corresponding order (BSQ | BIL | BIP)
+    # The trajectory of Σ(t) and Γ(t) of each band, and the coding decisions only depending on it, are computed
+    # for all the mapped residuals of the band at once, and all the generated codes are written at once to the bitstream
+    def codeMappedResiduals(self, MappedResidualsMatrix, codingOrder):
+        # Axes order of a (band, row, col) array for each coding order
+        codingOrderAxes = {'bsq': (0, 1, 2), 'bil': (1, 0, 2), 'bip': (1, 2, 0)}
+        if codingOrder not in codingOrderAxes:
+            return
+        # Per band arrays with the mapped residuals and the coding decisions, as (band, row·col)
+        nSamplesPerBand = self.nRows * self.nCols
+        mappedResiduals = numpy.asarray(MappedResidualsMatrix, dtype=numpy.int64).transpose(2, 0, 1).reshape(self.nBands, nSamplesPerBand)
+        rescaling = numpy.zeros((self.nBands, nSamplesPerBand), dtype=bool)
+        rescalingBits = numpy.zeros((self.nBands, nSamplesPerBand), dtype=numpy.int64)
+        highEntropy = numpy.zeros((self.nBands, nSamplesPerBand), dtype=bool)
+        kValues = numpy.zeros((self.nBands, nSamplesPerBand), dtype=numpy.int64)
+        codeIndex = numpy.zeros((self.nBands, nSamplesPerBand), dtype=numpy.int64)
+        # First mapped residual of each band is coded as a plain binary with D bits
+        firstSample = numpy.zeros((self.nBands, nSamplesPerBand), dtype=bool)
+        firstSample[:, 0] = True
+        for band in range(0, self.nBands):
+            trajectory = computeAccumulatorTrajectory(mappedResiduals[band, 1:], self.SigmaList[band], self.GammaList[band], self.gamma, self.codeSelectionTables)
+            rescaling[band, 1:] = trajectory.rescaling
+            rescalingBits[band, 1:] = trajectory.rescalingBits
+            highEntropy[band, 1:] = trajectory.highEntropy
+            kValues[band, 1:] = trajectory.k
+            codeIndex[band, 1:] = trajectory.codeIndex
+            # Store the final values for encoding them in the image tail
+            self.SigmaList[band] = trajectory.finalSigma
+            self.GammaList[band] = trajectory.finalGamma
+        # Sort all the arrays in the coding order and write all the codes at once
+        def sortInCodingOrder(values):
+            return values.reshape(self.nBands, self.nRows, self.nCols).transpose(codingOrderAxes[codingOrder]).ravel()
+        codeValues, codeLengths = self.generateCodes(*map(sortInCodingOrder, [mappedResiduals, firstSample, rescaling, rescalingBits, highEntropy, kValues, codeIndex]))
+        self.bitWriter.writeCodes(codeValues, codeLengths)
+
+
+    # Generate the codes of a sequence of mapped residuals (in coding order) with their precomputed coding decisions
+    # The codes are returned as arrays of values and lengths to be written at once with BitStreamWriter.writeCodes
+    # Only the low-entropy output codewords have to be generated sequentially, since they depend on the active prefixes
+    def generateCodes(self, mappedResiduals, firstSample, rescaling, rescalingBits, highEntropy, kValues, codeIndex):
+        nSamples = mappedResiduals.size
+        # Four codes per mapped residual:
+        #   rescaling bit | plain value or GPO2 head | GPO2 'zeros' | low-entropy output codeword
+        codeValues = numpy.zeros((nSamples, 4), dtype=numpy.uint64)
+        codeLengths = numpy.zeros((nSamples, 4), dtype=numpy.int64)
+        codeValues[:, 0] = rescalingBits
+        codeLengths[:, 0] = rescaling
+        # First mapped residuals, as plain binary with D bits
+        firstIndexes = numpy.flatnonzero(firstSample)
+        codeValues[firstIndexes, 1] = mappedResiduals[firstIndexes]
+        codeLengths[firstIndexes, 1] = [max(self.dynamicRangeInBits, value.bit_length()) for value in mappedResiduals[firstIndexes].tolist()]
+        # Low-entropy mapped residuals greater than the Input Simbol Limit L(i) are escaped
+        inputSymbolLimits = numpy.array([row[1] for row in self.Table_InputSimbolLimitAndThreshold], dtype=numpy.int64)[codeIndex]
+        lowEntropy = ~highEntropy & ~firstSample
+        escape = lowEntropy & (mappedResiduals > inputSymbolLimits)
+        # GPO2 codes: high-entropy mapped residuals, and escaped values Rk'(δ(t) - L(i) - 1) with k=0
+        GPO2Indexes = numpy.flatnonzero((highEntropy & ~firstSample) | escape)
+        j = numpy.where(escape, mappedResiduals - inputSymbolLimits - 1, mappedResiduals)[GPO2Indexes]
+        k = numpy.where(escape, 0, kValues)[GPO2Indexes]
+        headValues, headLengths, nZeros = self.GPO2_codes(j, k)
+        codeValues[GPO2Indexes, 1] = headValues
+        codeLengths[GPO2Indexes, 1] = headLengths
+        codeLengths[GPO2Indexes, 2] = nZeros
+        # Low-entropy output codewords, adding the input symbols (escape symbol: L(i)+1) to the active prefixes
+        lowEntropyIndexes = numpy.flatnonzero(lowEntropy)
+        inputSymbols = numpy.minimum(mappedResiduals, inputSymbolLimits + 1)[lowEntropyIndexes]
+        outputIndexes = []
+        outputCodes = []
+        for index, i, inputSymbol in zip(lowEntropyIndexes.tolist(), codeIndex[lowEntropyIndexes].tolist(), inputSymbols.tolist()):
+            trie = self.LowEntropyCodeTries[i]
+            transition = trie.transitions[self.ActivePrefix[i]][inputSymbol]
+            if transition >= 0:
+                self.ActivePrefix[i] = transition
+            else:
+                outputIndexes.append(index)
+                outputCodes.append(trie.codes[~transition])
+                self.ActivePrefix[i] = 0
+        if len(outputCodes) > 0:
+            codeValues[outputIndexes, 3], codeLengths[outputIndexes, 3] = zip(*outputCodes)
+        return codeValues.ravel(), codeLengths.ravel()
+
+
 
 
 
@@ -445,27 +483,7 @@ class HybridCoder():
         self.generateHeader(headerBinaryString)
 
         # Code each mapped residual in the corresponding order (BSQ | BIL | BIP)
-        #   BSQ
-        if codingOrder == 'bsq':
-            for band  in range(0, self.nBands):
-                for row in range(0, self.nRows):
-                    for col in range(0, self.nCols):
-                        # Code the mapped residual
-                        self.codeTargetMappedResidual(MappedResidualsMatrix, row, col, band)
-        #   BIL
-        if codingOrder == 'bil':
-            for row in range(0, self.nRows):
-                for band  in range(0, self.nBands):
-                    for col in range(0, self.nCols):   
-                        # Code the mapped residual
-                        self.codeTargetMappedResidual(MappedResidualsMatrix, row, col, band)
-        #   BIP
-        if codingOrder == 'bip':
-            for row in range(0, self.nRows):
-                for col in range(0, self.nCols):
-                    for band  in range(0, self.nBands):
-                        # Code the mapped residual
-                        self.codeTargetMappedResidual(MappedResidualsMatrix, row, col, band)
+        self.codeMappedResiduals(MappedResidualsMatrix, codingOrder)
 
 
         # Code image tail
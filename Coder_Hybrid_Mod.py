@@ -1,23 +1,36 @@
 from os import access
 import numpy
-import pickle
+import struct
+
+from BitStream import BitStreamWriter
+from HybridCodingTables import getCodingTables
+from HybridAccumulator import computeAccumulatorTrajectory, CodeSelectionTables
 
 
 # ----- Coding Tables ----- #
 
-# Low-Entropy Code Input Symbo Limit and Threshold (Table 5-16)
-# Code index, i || Input Simbol Limit, Li || Threshold, Ti
-INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH = 'CodingTables/LowEntropyCodeInputSymbolLimitAndThreshold.pickle'
+# The coding tables are loaded once per process and shared by all the instances (see HybridCodingTables.py)
+
+
+# ----- Streaming ----- #
+
+# Minimum number of complete bytes kept in the bitstream before writing them to the output file (coding sessions)
+STREAM_BUFFER_SIZE_IN_BYTES = 1 << 20
+
+# Number of mapped residuals coded at once by HybridCoder.code and HybridCoder.codeToBytes
+# The arrays of codes and coding decisions of each chunk use about 300 bytes per mapped residual
+CODING_CHUNK_SIZE = 1 << 16
+
 
-# Code tables (Input to output)
-# List. Element index = Code index
-# Each list element is a dictionary with 'key' = 'input codeword'
-INPUT_TO_OUTPUT_CODEWORDS = 'CodingTables/CodingTable.pickle'
+# ----- Coder state ----- #
 
-# Flush tables (Input to output)
-# List. Element index = Code index
-# Each list element is a dictionary with 'key' = 'input codeword'
-FLUSH_INPUT_TO_OUTPUT_CODEWORDS = 'CodingTables/FlushCodingTable.pickle'
+# Serialized coder state (see HybridCoderState):
+#   magic, version, D, ɣ(0), ɣ^*, Umax, output word size, Σ(t), Γ(t), number of coded samples,
+#   number of bytes written to the output file, accumulator and number of accumulated bits,
+#   active prefix of each code index (16 values), and number of bytes still in the bitstream (followed by them)
+STATE_MAGIC = 0x31534348   # 'HCS1'
+STATE_VERSION = 1
+STATE_FORMAT = '>IBBBBBHQHQQQB16HI'
 
 
 
@@ -50,8 +63,8 @@ class HybridCoder():
 
         # Coding Tables
         self.Table_InputSimbolLimitAndThreshold = None
-        self.Table_InputToOutputCodeWords = None
-        self.Table_FlushInputToOutputCodeWords = None
+        #   Integer tries of the low-entropy codes (one per code index, including the flush codes)
+        self.LowEntropyCodeTries = None
         self.loadCodingTables()
 
         # Coder variables
@@ -69,15 +82,16 @@ class HybridCoder():
         self.gamma = None  
         #   Threshold: T(0) (page 5-23 - Table 5-16)
         self.T0 = self.Table_InputSimbolLimitAndThreshold[0][2]
+        #   Breakpoints of Σ for selecting the processing and the code indexes for each Γ (built for D and ɣ^*)
+        self.codeSelectionTables = None
         #   Unary Length Limit: 8 <= Umax <= 32
         self.Umax = None
-        #   Active prefix for the low entropy coder
+        #   Active prefix for the low entropy coder (node of the trie of each code index)
         self.ActivePrefix = None
 
         # Bitstream variables
+        self.bitWriter = None       # bit accumulator writing (value, nBits) pairs into the bitstream
         self.bitStream = None       # bytearray with the already completely coded bytes
-        self.currentByte = None     # byte being coded (still uncompleted)
-        self.writtenBits = None     # number of bits already written into the current byte
         self.outputWordSize = None  # Not really needed but specified in the CCSDS123 Standard
 
         # Input vector variables
@@ -100,43 +114,31 @@ class HybridCoder():
         return min(max(minVal, x), maxVal)
 
 
-    # Load the coding files from the pickle files
+    # Get the coding tables shared by all the coder instances (loaded on first use)
     def loadCodingTables(self):
+        codingTables = getCodingTables()
         # Low-Entropy Code Input Symbo Limit and Threshold
-        filePath = INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH
-        filePointer = open(filePath, 'rb')
-        self.Table_InputSimbolLimitAndThreshold = pickle.load(filePointer)
-        filePointer.close()
-        # Code tables (Input to output)
-        filePath = INPUT_TO_OUTPUT_CODEWORDS
-        filePointer = open(filePath, 'rb')
-        self.Table_InputToOutputCodeWords = pickle.load(filePointer)
-        filePointer.close()
-        # Flush tables (Input to output)
-        filePath = FLUSH_INPUT_TO_OUTPUT_CODEWORDS
-        filePointer = open(filePath, 'rb')
-        self.Table_FlushInputToOutputCodeWords = pickle.load(filePointer)
-        filePointer.close()
+        self.Table_InputSimbolLimitAndThreshold = codingTables.getTable('InputSymbolLimitAndThreshold')
+        # Low-entropy code tries
+        self.LowEntropyCodeTries = codingTables.getTable('LowEntropyCodeTries')
 
 
-    # Write the binary string into the byte array bit by bit
+    # Write the binary string into the bitstream
     def writeBinaryStringToBitStream(self, binaryString):
         nBits = len(binaryString)
-        for bit in binaryString:
-            self.currentByte = (self.currentByte << 1) | (int(bit) & 0x1)
-            self.writtenBits = self.writtenBits + 1
-            if self.writtenBits == 8:
-                self.bitStream.append(self.currentByte)
-                self.currentByte = 0
-                self.writtenBits = 0
+        if nBits > 0:
+            self.bitWriter.writeBits(int(binaryString, 2), nBits)
 
 
     # Add the 'padingValue' to the last byte of the bitstream until completing it
     def padding(self, padingValue):
-        # PadingValue: '0' or '1'
-        binaryString = padingValue
-        while self.writtenBits != 0:
-            self.writeBinaryStringToBitStream(binaryString)      
+        # PadingValue: 0 or 1
+        nBits = (8 - self.bitWriter.getWrittenBitsInCurrentByte()) & 0x7
+        if padingValue:
+            self.bitWriter.writeBits((1 << nBits) - 1, nBits)
+        else:
+            self.bitWriter.writeBits(0, nBits)
+        self.bitWriter.flushCompleteBytes()
 
 
     # Write the bitstream to a binary file
@@ -149,8 +151,9 @@ class HybridCoder():
 
     # Write an integer value to bitstream using specific number of bits
     def writeIntegerValueToBitstream(self, integerNumber, nBits):
-        binaryString = bin(integerNumber)[2:].zfill(nBits)
-        self.writeBinaryStringToBitStream(binaryString)
+        # Values not fitting in 'nBits' are written using all their significant bits
+        nBits = max(nBits, int(integerNumber).bit_length())
+        self.bitWriter.writeBits(integerNumber, nBits)
 
 
 
@@ -164,6 +167,8 @@ class HybridCoder():
 
     # Initialize varialbes
     def initializeCodingVariables(self):
+        # Code selection tables for the dynamic range and ɣ^*
+        self.codeSelectionTables = CodeSelectionTables(self.dynamicRangeInBits, self.gamma, self.Table_InputSimbolLimitAndThreshold)
         # Counter: Γ(0) = 2^ɣ(0)
         self.Gamma = 2**self.gamma_0  
         # High-Resolution accumulator 
@@ -171,13 +176,15 @@ class HybridCoder():
         Sigma_0_clipped = self.clip(self.Sigma_0, 0, 2**(self.dynamicRangeInBits+self.gamma_0)-1 )
         self.Sigma = Sigma_0_clipped
         # Active prefix
+        # Active prefix (empty active prefix: node 0)
         self.ActivePrefix = []
         for index in range(0, 16):
-            self.ActivePrefix.append('')
+            self.ActivePrefix.append(0)
         # Bitstream variables
-        self.bitStream = bytearray()
-        self.currentByte = 0
-        self.writtenBits = 0
+        self.bitWriter = BitStreamWriter()
+        self.bitStream = self.bitWriter.bitStream
+        # Number of mapped residuals already coded
+        self.codedSamples = 0
 
 
     # Generate Header
@@ -193,40 +200,38 @@ class HybridCoder():
     #   j: unsigned integer to be coded
     #   k: unsigned integer code index
     def GPO2_coding(self, j, k):
+        j = int(j)
         # Coding
-        if int(j/2**k) < self.Umax:
+        nZeros = j >> k
+        if nZeros < self.Umax:
             # bitstream:
             #   k least significant bits of j
             #   followed by a 'one'
             #   followed by int(j/2^k) 'zeros'
-            # Process
-            #   Convert the decimal integer to binary format and remove the '0b' of the start
-            binaryString = bin(j)[2:]
-            #   Extract only the k least significant bits
-            if k == 0:
-                binaryString = ''
-            elif len(binaryString) >= k:
-                binaryString = binaryString[-k:]
-            elif len(binaryString) < k:
-                binaryString = binaryString.zfill(k)
-            #   Add the required 'one'
-            binaryString = binaryString + '1'
-            #   Add the j/2^k 'zeros'
-            nZeros = int(j/2**k)
-            binaryString = binaryString + ''.zfill(nZeros)
+            codeValue = ((((j & ((1 << k) - 1)) << 1) | 0x1) << nZeros)
+            codeLength = k + 1 + nZeros
         else:
             # bitstream:
             #   Binary representation of j using D-bits (D: Dynamic range in bits)
             #   followed by Umax 'zeros'
-            # Process
-            #   Convert the decimal integer to binary format and remove the '0b' of the start
-            binaryString = bin(j)[2:]
-            #   Append the number of required zeros at the start to complete the string with the specified length
-            binaryString = binaryString.zfill(self.dynamicRangeInBits)
-            #   Append the Umax zeros at the end
-            binaryString = binaryString + ''.zfill(self.Umax)
-        # Write the binary string to the bitstream
-        self.writeBinaryStringToBitStream(binaryString)
+            codeValue = j << self.Umax
+            codeLength = max(self.dynamicRangeInBits, j.bit_length()) + self.Umax
+        # Write the code to the bitstream
+        self.bitWriter.writeBits(codeValue, codeLength)
+
+
+    # Vectorized version of GPO2_coding for arrays of values 'j' and code indexes 'k'
+    # The code of each value is returned as the bits before the 'zeros' (head) and the number of 'zeros'
+    def GPO2_codes(self, j, k):
+        nZeros = j >> k
+        modeA = nZeros < self.Umax
+        #   k least significant bits of j followed by a 'one' | Binary representation of j using D-bits
+        headValues = numpy.where(modeA, ((j & ((1 << k) - 1)) << 1) | 0x1, j)
+        headLengths = numpy.where(modeA, k + 1, self.dynamicRangeInBits)
+        headLengths[~modeA] = [max(self.dynamicRangeInBits, value.bit_length()) for value in j[~modeA].tolist()]
+        #   followed by int(j/2^k) 'zeros' | followed by Umax 'zeros'
+        nZeros = numpy.where(modeA, nZeros, self.Umax)
+        return headValues, headLengths, nZeros
 
 
     # Update the High Resolution Accumulator (Σ(t): Sigma) and the Counter (Γ(t): Gamma)
@@ -239,8 +244,7 @@ class HybridCoder():
         else:
             # Rescaling, Add the least significant bit of Σ(t-1) to the bitstream
             # TIP: Σ(t-1) is self.Sigma before being updated
-            binaryString = bin(self.Sigma)[-1:]
-            self.writeBinaryStringToBitStream(binaryString)
+            self.bitWriter.writeBits(self.Sigma & 0x1, 1)
             # Update the values (rescaling them)
             self.Sigma = numpy.int64((self.Sigma + 4*mappedResidual + 1)/2)
             self.Gamma = numpy.int64((self.Gamma + 1)/2)
@@ -249,7 +253,7 @@ class HybridCoder():
     # Returns True: current mapped residual has to be processed as high-entropy
     # Returns False: current mapped residual has to be processed as low-entropy
     def EvaluateHighEntropyCondition(self):
-        if self.Sigma * (2**14) >= self.T0 * self.Gamma:
+        if self.codeSelectionTables.isHighEntropy(self.Sigma, self.Gamma):
             # Process current residual as high entropy
             return True
         else:
@@ -257,7 +261,6 @@ class HybridCoder():
             return False
 
 
-    # TODO: TBD. Optimize this doing the loop in reverser order.
     # Process the mapped residual with the high-entropy processing
     def HighEntropyProcess(self, mappedResidual):
         # Get largest 'k' satisfying:
@@ -267,61 +270,44 @@ class HybridCoder():
         #   D: dynamicRangeInBits
         #   Σ(t): Sigma 
         #   Γ(t): Gamma
-        k_good = 2
-        k = 3
-        while k <= max(self.dynamicRangeInBits-2, 2): 
-            if self.Gamma * 2**(k+2) <= self.Sigma + int( (49/2**5)*self.Gamma ): 
-                k_good = k
-                k = k + 1
-            else:
-                break
+        k_good = self.codeSelectionTables.getK(self.Sigma, self.Gamma)
         # Code the mappedResidual using the appropiate value of 'k' and the 'GPO2' method 
         self.GPO2_coding(mappedResidual, k_good)
 
 
 
 
-    # TODO: TBD. Optimize this doing the loop in reverser order.
     # Process the mapped residual with the high-entropy processing
     def LowEntropyProcess(self, mappedResidual):
         # Get the largest code index 'i' satisfying:
         #   Σ(t) · 2^14 < Γ(t) · T(i)
-        i_good = 0
-        i = 1
-        while i < 16: #len(self.Table_InputSimbolLimitAndThreshold):
-            #  Threshold, Ti
-            Ti = self.Table_InputSimbolLimitAndThreshold[i][2]
-            # Condition to be satisfied
-            if self.Sigma * 2**14 < self.Gamma * Ti:
-                i_good = i
-                i = i + 1
-            else:
-                break
-        i = i_good
-        # Get the corresponding Input Simbol Limit, Li
-        Li = self.Table_InputSimbolLimitAndThreshold[i][1]       
-        # Get the Input Symbol 'l(t)'
+        i = self.codeSelectionTables.getCodeIndex(self.Sigma, self.Gamma)
+        # Code the mapped residual with the selected code index
+        self.LowEntropyProcessWithCodeIndex(mappedResidual, i)
+
+
+    # Process the mapped residual with the low-entropy processing using the code index 'i'
+    def LowEntropyProcessWithCodeIndex(self, mappedResidual, i):
+        # Get the trie of the code index and the corresponding Input Simbol Limit, Li
+        trie = self.LowEntropyCodeTries[i]
+        Li = trie.Li
+        # Get the Input Symbol 'l(t)': the mapped residual value (0 ... Li) or the scape symbol 'X' (Li+1)
         if mappedResidual <= Li:
-            # TODO: TBD.
-            # l: string with the hexadecimal value of the mapped residual
-            l = hex(mappedResidual).split('x')[-1]
+            l = mappedResidual
         else:
-            # TODO: TBD.
-            # l: Scape symbol 'X'
-            l = 'X'
+            l = trie.escapeSymbol
             # Write the residual value to the bitstream using the GPO2 function
             # Rk'(δ(t) - L(i) - 1) with k=0
             residualValue = mappedResidual - Li -1
             self.GPO2_coding(residualValue, 0)
-        # Update the active prefix
-        self.ActivePrefix[i] = self.ActivePrefix[i] + l.upper()
-        # Get the current input-output code table (dict)
-        # Check if the active prefix matches a complete codeword. If it does, add the 
-        # active prefix to the output bitstream and clear the active prefix
-        if self.ActivePrefix[i] in self.Table_InputToOutputCodeWords[i]:
-            outputCodeWord = self.Table_InputToOutputCodeWords[i].get(self.ActivePrefix[i])
-            self.writeBinaryStringToBitStream(outputCodeWord)
-            self.ActivePrefix[i] = ''
+        # Update the active prefix. If it matches a complete codeword, add its output
+        # codeword to the output bitstream and clear the active prefix
+        transition = trie.transitions[self.ActivePrefix[i]][l]
+        if transition >= 0:
+            self.ActivePrefix[i] = transition
+        else:
+            self.bitWriter.writeBits(*trie.codes[~transition])
+            self.ActivePrefix[i] = 0
 
 
 
@@ -330,24 +316,20 @@ class HybridCoder():
         flushValues = []
         # Codify the remaining active prefix using the corresponding code index for each of them
         for i in range(0, 16):    
-            flushOutputCodeWord = self.Table_FlushInputToOutputCodeWords[i].get(self.ActivePrefix[i])
-            self.writeBinaryStringToBitStream(flushOutputCodeWord)  
+            flushOutputCodeWord = self.LowEntropyCodeTries[i].flushCodes[self.ActivePrefix[i]]
+            self.bitWriter.writeBits(*flushOutputCodeWord)
             flushValues.append(flushOutputCodeWord)
         # Codify Σ(t) as binary using 2+D+ɣ^* bits for each band in increasing order
         nBits = 2 + self.dynamicRangeInBits + self.gamma
-        binaryString = bin(self.Sigma)[2:]
-        binaryString = binaryString.zfill(nBits)
-        self.writeBinaryStringToBitStream(binaryString)
+        self.writeIntegerValueToBitstream(self.Sigma, nBits)
         # Add a '1' to the bitstream
-        self.writeBinaryStringToBitStream('1')
+        self.bitWriter.writeBits(1, 1)
         # Padding '0' until completing the last byte
-        self.padding('0')
+        self.padding(0)
         # Add 0 bytes until the number of bytes in the bitstream is multiple of the word size.
         # If it already is a multiple, add 'word size' bytes with 'zeros'
-        # self.currentByte = 0
-        # self.bitStream.append(self.currentByte)
-        while len(self.bitStream) % self.outputWordSize != 0:
-            self.bitStream.append(self.currentByte)
+        while self.bitWriter.getNumberOfCompleteBytes() % self.outputWordSize != 0:
+            self.bitStream.append(0)
 
 
 
@@ -358,9 +340,7 @@ class HybridCoder():
         mappedResidual = MappedResidualsMatrix[index]
         # Code first mapped residual a plain binary with D bits
         if index == 0:
-            binaryString = bin(mappedResidual)[2:]
-            binaryString = binaryString.zfill(self.dynamicRangeInBits)
-            self.writeBinaryStringToBitStream(binaryString)
+            self.writeIntegerValueToBitstream(mappedResidual, self.dynamicRangeInBits)
         else:
             # Update the high resolution accumulator and the counter
             self.UpdateHighResolutionAccumulatorAndCounter(mappedResidual)
@@ -373,6 +353,77 @@ class HybridCoder():
                 self.LowEntropyProcess(mappedResidual)
 
 
+    # Code all the mapped residuals
+    # The trajectory of Σ(t) and Γ(t), and the coding decisions only depending on it, are computed for
+    # all the mapped residuals at once, and all the generated codes are written at once to the bitstream
+    # The mapped residuals continue the already coded ones (so the input can be coded in consecutive chunks)
+    def codeMappedResiduals(self, MappedResidualsMatrix):
+        mappedResiduals = numpy.asarray(MappedResidualsMatrix, dtype=numpy.int64).ravel()
+        if mappedResiduals.size == 0:
+            return
+        # Code first mapped residual a plain binary with D bits (it does not update the accumulator and the counter)
+        firstSample = numpy.zeros(mappedResiduals.size, dtype=bool)
+        firstSample[0] = self.codedSamples == 0
+        nFirstSamples = int(firstSample[0])
+        # Trajectory of the accumulator and the counter
+        trajectory = computeAccumulatorTrajectory(mappedResiduals[nFirstSamples:], self.Sigma, self.Gamma, self.gamma, self.codeSelectionTables)
+        def includeFirstSample(values):
+            return numpy.concatenate((numpy.zeros(nFirstSamples, dtype=values.dtype), values))
+        codeValues, codeLengths = self.generateCodes(mappedResiduals, firstSample, includeFirstSample(trajectory.rescaling), includeFirstSample(trajectory.rescalingBits),
+                                                     includeFirstSample(trajectory.highEntropy), includeFirstSample(trajectory.k), includeFirstSample(trajectory.codeIndex))
+        self.bitWriter.writeCodes(codeValues, codeLengths)
+        # Final values of the accumulator and the counter
+        self.Sigma = trajectory.finalSigma
+        self.Gamma = trajectory.finalGamma
+        self.codedSamples = self.codedSamples + mappedResiduals.size
+
+
+    # Generate the codes of a sequence of mapped residuals (in coding order) with their precomputed coding decisions
+    # The codes are returned as arrays of values and lengths to be written at once with BitStreamWriter.writeCodes
+    # Only the low-entropy output codewords have to be generated sequentially, since they depend on the active prefixes
+    def generateCodes(self, mappedResiduals, firstSample, rescaling, rescalingBits, highEntropy, kValues, codeIndex):
+        nSamples = mappedResiduals.size
+        # Four codes per mapped residual:
+        #   rescaling bit | plain value or GPO2 head | GPO2 'zeros' | low-entropy output codeword
+        codeValues = numpy.zeros((nSamples, 4), dtype=numpy.uint64)
+        codeLengths = numpy.zeros((nSamples, 4), dtype=numpy.int64)
+        codeValues[:, 0] = rescalingBits
+        codeLengths[:, 0] = rescaling
+        # First mapped residuals, as plain binary with D bits
+        firstIndexes = numpy.flatnonzero(firstSample)
+        codeValues[firstIndexes, 1] = mappedResiduals[firstIndexes]
+        codeLengths[firstIndexes, 1] = [max(self.dynamicRangeInBits, value.bit_length()) for value in mappedResiduals[firstIndexes].tolist()]
+        # Low-entropy mapped residuals greater than the Input Simbol Limit L(i) are escaped
+        inputSymbolLimits = numpy.array([row[1] for row in self.Table_InputSimbolLimitAndThreshold], dtype=numpy.int64)[codeIndex]
+        lowEntropy = ~highEntropy & ~firstSample
+        escape = lowEntropy & (mappedResiduals > inputSymbolLimits)
+        # GPO2 codes: high-entropy mapped residuals, and escaped values Rk'(δ(t) - L(i) - 1) with k=0
+        GPO2Indexes = numpy.flatnonzero((highEntropy & ~firstSample) | escape)
+        j = numpy.where(escape, mappedResiduals - inputSymbolLimits - 1, mappedResiduals)[GPO2Indexes]
+        k = numpy.where(escape, 0, kValues)[GPO2Indexes]
+        headValues, headLengths, nZeros = self.GPO2_codes(j, k)
+        codeValues[GPO2Indexes, 1] = headValues
+        codeLengths[GPO2Indexes, 1] = headLengths
+        codeLengths[GPO2Indexes, 2] = nZeros
+        # Low-entropy output codewords, adding the input symbols (escape symbol: L(i)+1) to the active prefixes
+        lowEntropyIndexes = numpy.flatnonzero(lowEntropy)
+        inputSymbols = numpy.minimum(mappedResiduals, inputSymbolLimits + 1)[lowEntropyIndexes]
+        outputIndexes = []
+        outputCodes = []
+        for index, i, inputSymbol in zip(lowEntropyIndexes.tolist(), codeIndex[lowEntropyIndexes].tolist(), inputSymbols.tolist()):
+            trie = self.LowEntropyCodeTries[i]
+            transition = trie.transitions[self.ActivePrefix[i]][inputSymbol]
+            if transition >= 0:
+                self.ActivePrefix[i] = transition
+            else:
+                outputIndexes.append(index)
+                outputCodes.append(trie.codes[~transition])
+                self.ActivePrefix[i] = 0
+        if len(outputCodes) > 0:
+            codeValues[outputIndexes, 3], codeLengths[outputIndexes, 3] = zip(*outputCodes)
+        return codeValues.ravel(), codeLengths.ravel()
+
+
 
 
 
@@ -393,43 +444,230 @@ class HybridCoder():
 
 
 
-    def code(self, dynamicRangeInBits, headerBinaryString, outputFilePath, MappedResidualsMatrix, outputWordSize=1):
-
+    # Current state of the coder (everything needed to continue coding after the already coded samples)
+    # The complete bytes of the accumulator are moved to the bitstream first, so only the bits of the
+    # uncompleted byte are kept in the state (as required by HybridCoderState.toBytes)
+    def getState(self):
+        self.bitWriter.flushCompleteBytes()
+        state = HybridCoderState()
+        state.dynamicRangeInBits = self.dynamicRangeInBits
+        state.gamma_0 = self.gamma_0
+        state.gamma = self.gamma
+        state.Umax = self.Umax
+        state.outputWordSize = self.outputWordSize
+        state.Sigma = self.Sigma
+        state.Gamma = self.Gamma
+        state.codedSamples = self.codedSamples
+        state.nWrittenBytes = self.bitWriter.nWrittenBytes
+        state.accumulator = self.bitWriter.accumulator
+        state.accumulatedBits = self.bitWriter.accumulatedBits
+        state.ActivePrefix = list(self.ActivePrefix)
+        state.pendingBytes = bytes(self.bitStream)
+        return state
+
+
+    # Continue coding from a state obtained with getState (in this or in other coder instance)
+    def setState(self, state):
+        self.dynamicRangeInBits = state.dynamicRangeInBits
+        self.outputWordSize = state.outputWordSize
+        self.setConfigurationParameters(state.Umax, state.gamma, state.gamma_0, self.Sigma_0)
+        self.initializeCodingVariables()
+        self.Sigma = state.Sigma
+        self.Gamma = state.Gamma
+        self.codedSamples = state.codedSamples
+        self.ActivePrefix = list(state.ActivePrefix)
+        self.bitWriter.nWrittenBytes = state.nWrittenBytes
+        self.bitWriter.accumulator = state.accumulator
+        self.bitWriter.accumulatedBits = state.accumulatedBits
+        self.bitStream += state.pendingBytes
+
+
+    # Open a coding session writing the bitstream to 'outputFilePath' (see HybridCodingSession)
+    def openSession(self, dynamicRangeInBits, headerBinaryString, outputFilePath, outputWordSize=1, bufferSizeInBytes=STREAM_BUFFER_SIZE_IN_BYTES):
         # Set the input variables
         #   Dynamic range (D)
         self.dynamicRangeInBits = dynamicRangeInBits
         #   Output word size
         self.outputWordSize = outputWordSize
-
-        # Get the array shape
-        self.inputLength = MappedResidualsMatrix.size
-
         # Initialize the coding variables
         self.initializeCodingVariables()
-
         # Generate header
         self.generateHeader(headerBinaryString)
+        return HybridCodingSession(self, open(outputFilePath, 'wb'), bufferSizeInBytes)
+
+
+    # Continue a coding session from a checkpoint (see HybridCodingSession.checkpoint)
+    # The output file is truncated to the bytes written when the checkpoint was taken
+    def resumeSession(self, state, outputFilePath, bufferSizeInBytes=STREAM_BUFFER_SIZE_IN_BYTES):
+        self.setState(state)
+        filePointer = open(outputFilePath, 'r+b')
+        filePointer.truncate(state.nWrittenBytes)
+        filePointer.seek(0, 2)
+        return HybridCodingSession(self, filePointer, bufferSizeInBytes)
 
-        # Code each mapped residual 
-        for index in range(0, self.inputLength):
-            # Code the mapped residual
-            self.codeTargetMappedResidual(MappedResidualsMatrix, index)
 
-        # Bits coded pre tail codification
-        print('pre tail ' + str(len(self.bitStream)))
 
-        # Code image tail
+
+    # Code all the mapped residuals and return the bitstream (bytes with the content of the coded file)
+    def codeToBytes(self, dynamicRangeInBits, headerBinaryString, MappedResidualsMatrix, outputWordSize=1):
+        self.dynamicRangeInBits = dynamicRangeInBits
+        self.outputWordSize = outputWordSize
+        self.initializeCodingVariables()
+        self.generateHeader(headerBinaryString)
+        for chunk in getCodingChunks(MappedResidualsMatrix):
+            self.codeMappedResiduals(chunk)
         self.codeImageTail()
+        return bytes(self.bitStream)
+
+
+
+
+    def code(self, dynamicRangeInBits, headerBinaryString, outputFilePath, MappedResidualsMatrix, outputWordSize=1):
+
+        # Get the array shape
+        self.inputLength = MappedResidualsMatrix.size
+
+        # Initialize the coding variables and generate header
+        session = self.openSession(dynamicRangeInBits, headerBinaryString, outputFilePath, outputWordSize)
+
+        # Code each mapped residual (in chunks, so the memory used does not depend on the input size)
+        session.feedChunks(getCodingChunks(MappedResidualsMatrix))
 
-        print('post tail ' + str(len(self.bitStream)))
+        # Bits coded pre tail codification
+        print('pre tail ' + str(self.bitWriter.getNumberOfCompleteBytes()))
+
+        # Code image tail and write the rest of the bitstream to file
+        session.close()
 
-        # Write bitstream to file
-        self.writeBitStreamToBinaryFile(outputFilePath)
+        print('post tail ' + str(self.bitWriter.getNumberOfCompleteBytes()))
 
         # Display coding compression ratio
-        outputBits = 8 * len(self.bitStream)
+        outputBits = 8 * self.bitWriter.getNumberOfCompleteBytes()
         inputBits = self.inputLength * self.dynamicRangeInBits
         codingCompressionRatio = inputBits / outputBits
         codingCompressionRatio = round(codingCompressionRatio, 2)
         print('Coding compression ratio: {}'.format(codingCompressionRatio))
 
+
+
+
+
+# Consecutive chunks of CODING_CHUNK_SIZE mapped residuals (in 'C' order) of an array of any shape
+def getCodingChunks(MappedResidualsMatrix, chunkSize=CODING_CHUNK_SIZE):
+    mappedResiduals = numpy.asarray(MappedResidualsMatrix).ravel()
+    for start in range(0, mappedResiduals.size, chunkSize):
+        yield mappedResiduals[start:start + chunkSize]
+
+
+
+
+# ----- Coding sessions ----- #
+
+# Codes a stream of mapped residuals received in consecutive chunks (for example, the frames of a pushbroom sensor)
+# The complete bytes of the bitstream are written to the output file each time they reach 'bufferSizeInBytes', so
+# the memory used depends on the chunk and buffer sizes and not on the total number of mapped residuals.
+# The output file is the same one obtained with HybridCoder.code for the concatenation of all the chunks
+#   session = coder.openSession(dynamicRangeInBits, headerBinaryString, outputFilePath)
+#   session.feed(chunk) / session.feedChunks(iterator)
+#   state = session.checkpoint()  ->  session = otherCoder.resumeSession(state, outputFilePath)
+#   session.close()
+class HybridCodingSession():
+
+    def __init__(self, coder, filePointer, bufferSizeInBytes=STREAM_BUFFER_SIZE_IN_BYTES):
+        self.coder = coder
+        self.filePointer = filePointer
+        self.bufferSizeInBytes = bufferSizeInBytes
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        if exceptionType is None:
+            self.close()
+        else:
+            self.filePointer.close()
+
+
+    # Code a chunk of mapped residuals (array of any shape, coded in its 'C' order)
+    def feed(self, chunk):
+        self.coder.codeMappedResiduals(chunk)
+        if len(self.coder.bitStream) >= self.bufferSizeInBytes:
+            self.coder.bitWriter.writeCompleteBytesToFile(self.filePointer)
+
+
+    # Code all the chunks of an iterable (list, iterator, generator...)
+    def feedChunks(self, chunks):
+        for chunk in chunks:
+            self.feed(chunk)
+
+
+    # Number of mapped residuals already coded
+    def getNumberOfCodedSamples(self):
+        return self.coder.codedSamples
+
+
+    # Write all the complete bytes to the output file and return the state of the coder
+    # The session can go on after the checkpoint, or be resumed from it later (HybridCoder.resumeSession)
+    def checkpoint(self):
+        self.coder.bitWriter.flushCompleteBytes()
+        self.coder.bitWriter.writeCompleteBytesToFile(self.filePointer)
+        self.filePointer.flush()
+        return self.coder.getState()
+
+
+    # Code the image tail, write the rest of the bitstream and close the output file
+    def close(self):
+        if self.filePointer.closed:
+            return
+        self.coder.codeImageTail()
+        self.coder.bitWriter.writeCompleteBytesToFile(self.filePointer)
+        self.filePointer.close()
+
+
+
+# State of the hybrid coder after coding some samples (Coder_Hybrid_Mod.HybridCoder.getState)
+# It is serialized with toBytes (less than 100 bytes after a checkpoint) and restored with fromBytes
+class HybridCoderState():
+
+    def __init__(self):
+        # Coding parameters
+        self.dynamicRangeInBits = None
+        self.gamma_0 = None
+        self.gamma = None
+        self.Umax = None
+        self.outputWordSize = None
+        # Accumulator Σ(t), counter Γ(t) and number of coded samples
+        self.Sigma = None
+        self.Gamma = None
+        self.codedSamples = None
+        # Bitstream: bytes already written to the output file, bits of the uncompleted bytes
+        # and complete bytes still not written to the output file
+        self.nWrittenBytes = None
+        self.accumulator = None
+        self.accumulatedBits = None
+        self.pendingBytes = None
+        # Active prefix (node of the trie) of each code index
+        self.ActivePrefix = None
+
+
+    def toBytes(self):
+        if not 0 <= self.accumulatedBits < 8 or not 0 <= self.accumulator < (1 << self.accumulatedBits):
+            raise ValueError('The accumulator of the state has {} bits, only the bits of an uncompleted byte can be serialized (get the state with HybridCoder.getState)'.format(self.accumulatedBits))
+        return struct.pack(STATE_FORMAT, STATE_MAGIC, STATE_VERSION, self.dynamicRangeInBits, self.gamma_0, self.gamma, self.Umax, self.outputWordSize,
+                           self.Sigma, self.Gamma, self.codedSamples, self.nWrittenBytes, self.accumulator, self.accumulatedBits,
+                           *self.ActivePrefix, len(self.pendingBytes)) + self.pendingBytes
+
+
+    @staticmethod
+    def fromBytes(stateBytes):
+        state = HybridCoderState()
+        headerSize = struct.calcsize(STATE_FORMAT)
+        values = struct.unpack(STATE_FORMAT, stateBytes[:headerSize])
+        if values[0] != STATE_MAGIC or values[1] != STATE_VERSION:
+            raise ValueError('Not a hybrid coder state (version {})'.format(STATE_VERSION))
+        (state.dynamicRangeInBits, state.gamma_0, state.gamma, state.Umax, state.outputWordSize,
+         state.Sigma, state.Gamma, state.codedSamples, state.nWrittenBytes, state.accumulator, state.accumulatedBits) = values[2:13]
+        state.ActivePrefix = list(values[13:29])
+        state.pendingBytes = bytes(stateBytes[headerSize:headerSize + values[29]])
+        return state
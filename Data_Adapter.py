@@ -1,90 +1,192 @@
-import numpy as np
-
-class Adapter():
-
-    def __init__(self, CentroidPath, PixelsPath, ProjectionsPath):
-
-        # Data paths
-        self.Centroid_Path = CentroidPath
-        self.Pixels_Path = PixelsPath
-        self.Projections_Path = ProjectionsPath
-
-        # Input vectors
-        self.PM_Centroid = None
-        self.PM_Pixels = None
-        self.PM_Projections = None
-
-        # Number of bands
-        self.nBands = None
-        # Number of endmembers
-        self.endMembers = None
-        # Blocksize
-        self.blockSize = None
-        # Number of blocks
-        self.numBlocks = None
-
-        # Load the data specified
-        self.LoadData()
-
-        # Get input characteristics
-        self.GetInputCharacteristics()
-
-
-
-
-    # Load the data from the vectors specified in the diferent data paths
-    def LoadData(self):
-        self.PM_Centroid = np.load(self.Centroid_Path)
-        self.PM_Pixels = np.load(self.Pixels_Path)
-        self.PM_Projections = np.load(self.Projections_Path)
-        print(self.PM_Centroid.shape)
-        print(self.PM_Pixels.shape)
-        print(self.PM_Projections.shape)
-
-
-    # Get the number of bands captured by the hyperspectral camera,
-    # the  number of endmembers obtained by the hyperLCA transform
-    # and the block size utilized 
-    def GetInputCharacteristics(self):
-        self.nBands = self.PM_Centroid.size
-        self.endMembers = self.PM_Projections.shape[0]
-        print(self.endMembers)
-
-
-    
-    # Concatenate PM_Centroid, PM_Pixels and PM_Projections into a single 1D array
-    # PM_Centroid     -> (nBands, 1)
-    # PM_Pixels       -> (nBands, endMembers)
-    # PM_Projections  -> (endMembers, blockSize)
-    # outVector       -> [PM_Centroid + PM_Pixels(nBands,endMember1) + PM_Projections(endMember1, blockSize) + ....
-    #                       + PM_Pixels(nBands,endMemberN) + PM_Projections(endMemberN, blockSize)]
-    def AdaptInputTo1DVector(self, numBlocks):
-        aux = 0
-        for b in range(0, numBlocks):
-            accumulatedData = self.PM_Centroid[:, b].flatten()
-            aux = b * 512
-            for i in range(0, 11):
-                subPixels = self.PM_Pixels[:, (b * 11) + i].flatten()
-                subProjections = self.PM_Projections[i, aux : (512 * (b + 1))]
-                #print("yepa: {}", subProjections.size)
-                block = np.concatenate((accumulatedData, subPixels, subProjections), axis = 0)
-                accumulatedData = block
-            if(b == 0):
-                blocks = block
-            else:
-                blocks = np.concatenate((blocks, block), axis = 0)
-        return blocks.astype(int)
-
-
-    # Compare the 1D vector used as input for the hybrid coder with the 1D vector obtained from the hybrid decoder
-    def CompareVectors(self, inputVector, outputVector):
-        equal = False
-        sum = 0
-        for i in range(0, inputVector.size):
-            sum += inputVector[i] - outputVector[i]
-
-        if sum == 0:
-            equal = True
-
-        return equal
-            
+import numpy as np
+
+class Adapter():
+
+    def __init__(self, CentroidPath, PixelsPath, ProjectionsPath):
+
+        # Data paths
+        self.Centroid_Path = CentroidPath
+        self.Pixels_Path = PixelsPath
+        self.Projections_Path = ProjectionsPath
+
+        # Input vectors
+        self.PM_Centroid = None
+        self.PM_Pixels = None
+        self.PM_Projections = None
+
+        # Number of bands
+        self.nBands = None
+        # Number of endmembers
+        self.endMembers = None
+        # Blocksize
+        self.blockSize = None
+        # Number of blocks
+        self.numBlocks = None
+        # Index maps of the 1D array for each number of blocks (see GetLayoutIndexMaps)
+        self.layoutIndexMaps = {}
+
+        # Load the data specified
+        self.LoadData()
+
+        # Get input characteristics
+        self.GetInputCharacteristics()
+
+
+
+
+    # Load the data from the vectors specified in the diferent data paths
+    # The files are memory-mapped (read only): only the blocks that are adapted are read from disk
+    def LoadData(self):
+        self.PM_Centroid = np.load(self.Centroid_Path, mmap_mode='r')
+        self.PM_Pixels = np.load(self.Pixels_Path, mmap_mode='r')
+        self.PM_Projections = np.load(self.Projections_Path, mmap_mode='r')
+        print(self.PM_Centroid.shape)
+        print(self.PM_Pixels.shape)
+        print(self.PM_Projections.shape)
+
+
+    # Get the number of bands captured by the hyperspectral camera,
+    # the  number of endmembers obtained by the hyperLCA transform
+    # and the block size utilized 
+    # PM_Centroid     -> (nBands, numBlocks)
+    # PM_Pixels       -> (nBands, numBlocks · endMembers)
+    # PM_Projections  -> (endMembers, numBlocks · blockSize)
+    def GetInputCharacteristics(self):
+        self.nBands = self.PM_Centroid.shape[0]
+        self.numBlocks = self.PM_Centroid.shape[1]
+        self.endMembers = self.PM_Pixels.shape[1] // self.numBlocks
+        self.blockSize = self.PM_Projections.shape[1] // self.numBlocks
+        print(self.endMembers)
+
+
+    
+    # Concatenate PM_Centroid, PM_Pixels and PM_Projections into a single 1D array
+    # PM_Centroid     -> (nBands, 1)
+    # PM_Pixels       -> (nBands, endMembers)
+    # PM_Projections  -> (endMembers, blockSize)
+    # outVector       -> [PM_Centroid + PM_Pixels(nBands,endMember1) + PM_Projections(endMember1, blockSize) + ....
+    #                       + PM_Pixels(nBands,endMemberN) + PM_Projections(endMemberN, blockSize)]
+    # All the blocks have the same length, so the output is allocated once and each part of the layout is
+    # filled with a single slice assignment for all the blocks (converted to 'dtype' by the assignment)
+    def AdaptInputTo1DVector(self, numBlocks, dtype=int):
+        return self.AdaptBlocksTo1DVector(0, numBlocks, dtype)
+
+
+    # 1D array (layout of AdaptInputTo1DVector) of the blocks firstBlock ... firstBlock + numBlocks - 1
+    def AdaptBlocksTo1DVector(self, firstBlock, numBlocks, dtype=int):
+        if firstBlock + numBlocks > self.numBlocks:
+            raise IndexError('Blocks {} to {} requested, the input data has {} blocks'.format(firstBlock, firstBlock + numBlocks - 1, self.numBlocks))
+        blocks = np.empty(numBlocks * self.GetBlockLength(), dtype=dtype)
+        lastBlock = firstBlock + numBlocks
+        # Views of the output: (numBlocks, block) and (numBlocks, endMembers, pixel + projection)
+        blocksView = blocks.reshape(numBlocks, -1)
+        endMembersView = blocksView[:, self.nBands :].reshape(numBlocks, self.endMembers, self.nBands + self.blockSize)
+        blocksView[:, 0 : self.nBands] = self.PM_Centroid[:, firstBlock : lastBlock].T
+        endMembersView[:, :, 0 : self.nBands] = self.PM_Pixels[:, firstBlock * self.endMembers : lastBlock * self.endMembers].T.reshape(numBlocks, self.endMembers, self.nBands)
+        endMembersView[:, :, self.nBands :] = self.PM_Projections[:, firstBlock * self.blockSize : lastBlock * self.blockSize].reshape(self.endMembers, numBlocks, self.blockSize).transpose(1, 0, 2)
+        return blocks
+
+
+    # Generator of the 1D array of each block (layout of AdaptInputTo1DVector), adapted when it is requested,
+    # so the blocks can be coded in a streaming fashion (e.g. HybridCodingSession.feedChunks) with the memory
+    # of a single block
+    def IterateBlocks(self, numBlocks=None, dtype=int):
+        if numBlocks is None:
+            numBlocks = self.numBlocks
+        for b in range(0, numBlocks):
+            yield self.AdaptBlocksTo1DVector(b, 1, dtype)
+
+
+    # Number of elements of one block of the 1D array returned by AdaptInputTo1DVector
+    def GetBlockLength(self):
+        return self.nBands + self.endMembers * (self.nBands + self.blockSize)
+
+
+    # Number of elements of each block of the 1D array returned by AdaptInputTo1DVector
+    # (the blocks can be coded as independent segments, see HybridSegments.py)
+    def GetBlockLengths(self, numBlocks):
+        return [self.GetBlockLength()] * numBlocks
+
+
+    # Split one block of the 1D array returned by AdaptInputTo1DVector into its centroid, pixels and projections
+    # blockCentroid    -> (nBands,)
+    # blockPixels      -> (nBands, endMembers)
+    # blockProjections -> (endMembers, blockSize)
+    def SplitBlockVector(self, blockVector):
+        blockCentroid = blockVector[0 : self.nBands]
+        endMembers = blockVector[self.nBands :].reshape(self.endMembers, -1)
+        blockPixels = endMembers[:, 0 : self.nBands].T
+        blockProjections = endMembers[:, self.nBands :]
+        return blockCentroid, blockPixels, blockProjections
+
+
+    # Positions in the 1D array returned by AdaptInputTo1DVector(numBlocks) of each element of
+    # PM_Pixels (nBands, numBlocks · endMembers) and PM_Projections (endMembers, numBlocks · blockSize)
+    # The maps are computed once for each number of blocks
+    def GetLayoutIndexMaps(self, numBlocks):
+        if numBlocks not in self.layoutIndexMaps:
+            positions = np.arange(numBlocks * self.GetBlockLength()).reshape(numBlocks, -1)
+            endMembersPositions = positions[:, self.nBands :].reshape(numBlocks, self.endMembers, self.nBands + self.blockSize)
+            pixelsMap = endMembersPositions[:, :, 0 : self.nBands].transpose(2, 0, 1).reshape(self.nBands, numBlocks * self.endMembers)
+            projectionsMap = endMembersPositions[:, :, self.nBands :].transpose(1, 0, 2).reshape(self.endMembers, numBlocks * self.blockSize)
+            self.layoutIndexMaps[numBlocks] = (pixelsMap, projectionsMap)
+        return self.layoutIndexMaps[numBlocks]
+
+
+    # Split a 1D array with the layout of AdaptInputTo1DVector (e.g. the output of the hybrid or the Golomb-Rice
+    # decoders) back into PM_Centroid, PM_Pixels and PM_Projections
+    # PM_Centroid is a view of the vector, PM_Pixels and PM_Projections are gathered with the index maps
+    def Adapt1DVectorToInput(self, vector):
+        vector = np.asarray(vector).ravel()
+        blockLength = self.GetBlockLength()
+        if vector.size % blockLength != 0:
+            raise ValueError('The vector has {} elements, not a multiple of the block length ({})'.format(vector.size, blockLength))
+        numBlocks = vector.size // blockLength
+        pixelsMap, projectionsMap = self.GetLayoutIndexMaps(numBlocks)
+        PM_Centroid = vector.reshape(numBlocks, blockLength)[:, 0 : self.nBands].T
+        return PM_Centroid, vector[pixelsMap], vector[projectionsMap]
+
+
+    # Position of the element 'i' of the 1D array returned by AdaptInputTo1DVector
+    # Returns the block, the component ('centroid', 'pixel' or 'projection'), the endmember (None for the
+    # centroid) and the band or sample of the component
+    def GetLayoutPosition(self, i):
+        block, offset = divmod(int(i), self.GetBlockLength())
+        if offset < self.nBands:
+            return block, 'centroid', None, offset
+        endMember, offset = divmod(offset - self.nBands, self.nBands + self.blockSize)
+        if offset < self.nBands:
+            return block, 'pixel', endMember, offset
+        return block, 'projection', endMember, offset - self.nBands
+
+
+    # First element where two 1D arrays with the layout of AdaptInputTo1DVector differ
+    # Returns None if they are equal, or the position of the first mismatch (see GetLayoutPosition) and the index
+    # of the element in the vector (the length of the shortest vector if one of them is a prefix of the other)
+    def FindFirstMismatch(self, inputVector, outputVector):
+        inputVector = np.asarray(inputVector).ravel()
+        outputVector = np.asarray(outputVector).ravel()
+        n = min(inputVector.size, outputVector.size)
+        mismatch = inputVector[0 : n] != outputVector[0 : n]
+        i = int(np.argmax(mismatch)) if n > 0 else 0
+        if n > 0 and mismatch[i]:
+            return self.GetLayoutPosition(i) + (i,)
+        if inputVector.size != outputVector.size:
+            return self.GetLayoutPosition(n) + (n,)
+        return None
+
+
+    # Compare the 1D vector used as input for the hybrid coder with the 1D vector obtained from the hybrid decoder
+    # (exact comparison of all the elements, the first mismatch is printed)
+    def CompareVectors(self, inputVector, outputVector):
+        mismatch = self.FindFirstMismatch(inputVector, outputVector)
+        if mismatch is None:
+            return True
+        block, component, endMember, position, i = mismatch
+        if component == 'centroid':
+            print('First mismatch at element {}: block {}, centroid (band {})'.format(i, block, position))
+        elif component == 'pixel':
+            print('First mismatch at element {}: block {}, pixel {} (band {})'.format(i, block, endMember, position))
+        else:
+            print('First mismatch at element {}: block {}, projection {} (sample {})'.format(i, block, endMember, position))
+        return False
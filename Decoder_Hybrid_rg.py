@@ -1,23 +1,14 @@
 import numpy
-import pickle
 import json
 
+from BitStream import ReverseBitStreamReader
+from HybridCodingTables import getCodingTables, DECODING_LOOKUP_SECONDARY_FLAG
+from HybridAccumulator import CodeSelectionTables, CounterSchedule
 
-# ----- Coding Tables ----- #
-
-# Low-Entropy Code Input Symbo Limit and Threshold (Table 5-16)
-# Code index, i || Input Simbol Limit, Li || Threshold, Ti
-INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH = 'CodingTables/LowEntropyCodeInputSymbolLimitAndThreshold.pickle'
 
-# Code tables (Input to output)
-# List. Element index = Code index
-# Each list element is a dictionary with 'key' = 'input codeword'
-OUTPUT_TO_INPUT_CODEWORDS = 'CodingTables/DecodingTable.pickle'
+# ----- Coding Tables ----- #
 
-# Flush tables (Input to output)
-# List. Element index = Code index
-# Each list element is a dictionary with 'key' = 'input codeword'
-FLUSH_OUTPUT_TO_INPUT_CODEWORDS = 'CodingTables/FlushDecodingTable.pickle'
+# The coding tables are loaded once per process and shared by all the instances (see HybridCodingTables.py)
 
 
 
@@ -30,8 +21,8 @@ class HybridDecoder():
 
         # Coding Tables
         self.Table_InputSimbolLimitAndThreshold = None
-        self.Table_OutputToInputCodeWords = None
-        self.Table_FlushOutputToInputCodeWords = None
+        #   Integer tries of the low-entropy codes (one per code index, including the flush codes)
+        self.LowEntropyCodeTries = None
         self.loadCodingTables()
 
         # Coder variables
@@ -49,24 +40,24 @@ class HybridDecoder():
         self.gamma = None
         #   Threshold: T(0) (page 5-23 - Table 5-16)
         self.T0 = self.Table_InputSimbolLimitAndThreshold[0][2]
+        #   Breakpoints of Σ for selecting the processing and the code indexes for each Γ (built for D and ɣ^*)
+        self.codeSelectionTables = None
         #   Unary Length Limit: 8 <= Umax <= 32
         self.Umax = None
-        #   Active prefix list for the low entropy coder
+        #   Active prefix list for the low entropy coder (input symbols still to be decoded for each code index)
         self.ActivePrefixList = None
 
         # Bitstream variables
         self.bitStream = None           # bytearray with the already completely coded bytes
-        self.currentByteIndex = None    # byte being coded (still uncompleted)
-        self.readBits = None            # number of bits already read from the current byte
+        self.bitReader = None           # reader of the bitstream from its end (integer reads)
 
         # Image parameters
         self.nBands = None
         self.nRows = None
         self.nCols = None
 
-        # Variables for storing the counter values
-        self.GammaList = None
-        self.RescalingList = None
+        # Counter values Γ(t) (obtained directly from 't')
+        self.counterSchedule = None
 
 
 
@@ -79,94 +70,34 @@ class HybridDecoder():
         return value
 
 
-    # Load the coding files from the pickle files
+    # Get the coding tables shared by all the decoder instances (loaded on first use)
     def loadCodingTables(self):
+        codingTables = getCodingTables()
         # Low-Entropy Code Input Symbo Limit and Threshold
-        filePath = INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH
-        filePointer = open(filePath, 'rb')
-        self.Table_InputSimbolLimitAndThreshold = pickle.load(filePointer)
-        filePointer.close() 
-        # Code tables (Input to output)
-        filePath = OUTPUT_TO_INPUT_CODEWORDS
-        filePointer = open(filePath, 'rb')
-        self.Table_OutputToInputCodeWords = pickle.load(filePointer)
-        filePointer.close() 
-        # Flush tables (Input to output)
-        filePath = FLUSH_OUTPUT_TO_INPUT_CODEWORDS
-        filePointer = open(filePath, 'rb')
-        self.Table_FlushOutputToInputCodeWords = pickle.load(filePointer)
-        filePointer.close() 
+        self.Table_InputSimbolLimitAndThreshold = codingTables.getTable('InputSymbolLimitAndThreshold')
+        # Low-entropy code tries
+        self.LowEntropyCodeTries = codingTables.getTable('LowEntropyCodeTries')
 
 
-    # Read a binary string of 'nBits' from the bitstream 
-    # Inputs:
-    #   nBits: number of bits to be read and returned in string format
-    #   updateCounters: indicates if the returned currentByte and readBits are modified or not
-    #   reverseReading: Bolean. 
-    #       True: read from the back (as normaly done in the decoder)
-    #       False: read from the begining (as done in the header)
-    def readBinaryStringFromBitStream(self, nBits, updateCounters=True, reverseReading = True):
-        currentByteIndexLocal = self.currentByteIndex
-        readBitsLocal = self.readBits
-        binaryString = ''
-        currentByte = self.bitStream[currentByteIndexLocal]
-        for counter in range(0, nBits):
-            # Get a new byte to be decoded
-            if readBitsLocal == 0:
-                currentByte = self.bitStream[currentByteIndexLocal] 
-            # Decode the specific bit
-            if reverseReading:
-                bitIntegerValue = ((currentByte >> readBitsLocal) & 0x1)
-                binaryString = str(bitIntegerValue) + binaryString
-            else:
-                bitIntegerValue = ((currentByte >> (7 - readBitsLocal)) & 0x1)
-                binaryString = binaryString + str(bitIntegerValue)
-            # Update counters
-            readBitsLocal = readBitsLocal + 1
-            if readBitsLocal >= 8:
-                readBitsLocal = 0
-                if reverseReading:
-                    currentByteIndexLocal = currentByteIndexLocal - 1
-                else:
-                    currentByteIndexLocal = currentByteIndexLocal + 1
-        # Return the desired values
-        if updateCounters:
-            self.currentByteIndex = currentByteIndexLocal
-            self.readBits = readBitsLocal
-        return binaryString
-
-
-    def readIntegerValueFromBitstreamForHeader(self, nBits):
-        binaryString = self.readBinaryStringFromBitStream(nBits, updateCounters=True, reverseReading=False)
-        integerValue = int(binaryString, 2)
-        return integerValue
-   
-
-    # Read bits from the bitstream, one by one, until one of them matches the inversePadingValue
-    #   inversePadingValue: '0', '1'
+    # Remove bits from the bitstream until one of them matches the inversePadingValue (also removed)
+    #   inversePadingValue: 0, 1
     def inversePadding(self, inversePadingValue):
-        binaryString = self.readBinaryStringFromBitStream(1, updateCounters=True)
-        while binaryString == '0':
-            binaryString = self.readBinaryStringFromBitStream(1, updateCounters=True)
+        nMatchingBits = self.bitReader.countTrailingBits(1 - inversePadingValue, 64)
+        while nMatchingBits == 64:
+            self.bitReader.skip(nMatchingBits)
+            nMatchingBits = self.bitReader.countTrailingBits(1 - inversePadingValue, 64)
+        self.bitReader.skip(nMatchingBits + 1)
 
 
-    # Read bits from the bitstream, one by one, while the read bit matches the targetValue
-    #   targetValue: '0', '1'
-    #   updateCounters: indicates if the returned currentByte and readBits are modified or not
+    # Get the number of consecutive bits in the bitstream matching the targetValue
+    #   targetValue: 0, 1
+    #   updateCounters: indicates if the matching bits are removed from the bitstream or not
     def getNumberOfBitsEqualToTargetValue(self, targetValue, maximumNumberOfBits, updateCounters=True):
         # Get number of bits matching the target value
-        nMatchingBits = 0
-        binaryString = self.readBinaryStringFromBitStream(maximumNumberOfBits, updateCounters=False)
-        while True:
-            bitFronBinaryString = binaryString[-1:]
-            if bitFronBinaryString == targetValue:
-                nMatchingBits = nMatchingBits + 1
-                binaryString = binaryString[:-1]
-            else:
-                break
+        nMatchingBits = self.bitReader.countTrailingBits(targetValue, maximumNumberOfBits)
         # Update counters if necessary
         if updateCounters:
-            binaryString = self.readBinaryStringFromBitStream(nMatchingBits, updateCounters=True)
+            self.bitReader.skip(nMatchingBits)
         # Return the result
         return nMatchingBits
 
@@ -178,12 +109,19 @@ class HybridDecoder():
         filePointer.close()
 
 
-    def getOutputCodeWordFromBitstream(self, dictionary):
-        outputCodeWord = ''
-        while not outputCodeWord in dictionary:
-            newBitString = self.readBinaryStringFromBitStream(1, updateCounters=True)
-            outputCodeWord = newBitString + outputCodeWord
-        return outputCodeWord
+    # Decode the next codeword of the bitstream using the lookup table of its code index
+    # Returns the value stored in the lookup table for the codeword (code or node of the low-entropy code tries)
+    def getInputCodeWordFromBitstream(self, lookupTable):
+        (primaryBits, entries) = lookupTable
+        entry = entries[self.bitReader.peek(primaryBits)]
+        # Long codeword: resolve it with the secondary table
+        if entry & DECODING_LOOKUP_SECONDARY_FLAG:
+            secondaryBits = entry & (DECODING_LOOKUP_SECONDARY_FLAG - 1)
+            entry = entries[(entry >> 8) + (self.bitReader.peek(primaryBits + secondaryBits) >> primaryBits)]
+        self.bitReader.skip(entry & 0xFF)
+        return entry >> 8
+
+
 
 
 
@@ -196,54 +134,32 @@ class HybridDecoder():
     
 
     def initializeDecodingVariables(self):        
+        # Code selection tables for the dynamic range and ɣ^*
+        self.codeSelectionTables = CodeSelectionTables(self.dynamicRangeInBits, self.gamma, self.Table_InputSimbolLimitAndThreshold)
         # Counter: Γ(0) = 2^ɣ(0)
-        # Values ordered according to 't = col + row * nCols'
-        self.GammaList = []
-        self.RescalingList = []
-        Gamma = 2**self.gamma_0  
-        for row in range(0, self.nRows):
-            for col in range(0, self.nCols):
-                # Update the Gamma Value
-                if not (row == 0 and col == 0):
-                    if Gamma < 2**self.gamma - 1:
-                        Gamma = Gamma + 1
-                        self.RescalingList.append(False)
-                    else:
-                        Gamma = int((Gamma + 1)/2) 
-                        self.RescalingList.append(True)
-                else:
-                    self.RescalingList.append(False)
-                # Store the Gamma value in the Gamma Matrix
-                self.GammaList.append(Gamma)      
+        # Values according to 't = col + row * nCols'
+        self.counterSchedule = CounterSchedule(2**self.gamma_0, self.gamma)
         # Bitstream variables 
-        # TIP: it would be possible to reverser the bitstream order using self.bitStream.reverse()
-        # In such a case, 'self.currentByteIndex' should be 0, and the reading function should increase
-        # the 'self.currentByteIndex' value instead of decrease it
-        self.currentByteIndex = len(self.bitStream) - 1
-        self.readBits = 0
+        self.bitReader = ReverseBitStreamReader(self.bitStream)
 
 
 
 
     def decodeImageTail(self):
         # Remove the padding values
-        self.inversePadding('1')
+        self.inversePadding(1)
         # Read the 'D+2+ɣ^*' bits binary integer Σ(t) value for each band in decreasing order
         nBits = self.dynamicRangeInBits + 2 + self.gamma
         self.SigmaList = []
         for b in range(0, self.nBands):
-            binaryString = self.readBinaryStringFromBitStream(nBits, updateCounters=True)
-            Sigma = int(binaryString, 2)
+            Sigma = self.bitReader.read(nBits)
             self.SigmaList.insert(0, Sigma)
-        # Get Flush codewords
+        # Get Flush codewords (active prefix of each code index as a list of input symbols)
         self.ActivePrefixList = []
-        flushValues = []
         for i in range(15, -1, -1):
-            dictionary_OutputToInputCodeWords = self.Table_FlushOutputToInputCodeWords[i]
-            outputCodeWord = self.getOutputCodeWordFromBitstream(dictionary_OutputToInputCodeWords)
-            inputCodeWord = dictionary_OutputToInputCodeWords.get(outputCodeWord)
-            self.ActivePrefixList.insert(0, inputCodeWord)
-            flushValues.insert(0, outputCodeWord)
+            trie = self.LowEntropyCodeTries[i]
+            node = self.getInputCodeWordFromBitstream(trie.flushDecodingLookupTable)
+            self.ActivePrefixList.insert(0, list(trie.nodeSymbols[node]))
 
 
 
@@ -260,24 +176,20 @@ class HybridDecoder():
         #       Coding-Decoding mode A
         #   IF nZeros == Umax:
         #       Coding-Decoding mode B
-        nZeros = self.getNumberOfBitsEqualToTargetValue('0', self.Umax, updateCounters=True)
+        nZeros = self.bitReader.countTrailingZeros(self.Umax)
         # Coding-Decoding mode A
         if nZeros < self.Umax:
-            # Remove one bit from the bitstream (with value 1)
-            binaryString = self.readBinaryStringFromBitStream(1, updateCounters=True)
+            # Remove the 'zeros' and one bit from the bitstream (with value 1)
+            self.bitReader.skip(nZeros + 1)
             # Read the 'k' bits as plain binary ('k' least significant bits of 'j')
-            if k > 0:
-                binaryString = self.readBinaryStringFromBitStream(k, updateCounters=True)
-                integerValueOfTheKLeastSignificantBitsOfJ = int(binaryString, 2)
-            else:
-                integerValueOfTheKLeastSignificantBitsOfJ = 0
+            integerValueOfTheKLeastSignificantBitsOfJ = self.bitReader.read(k)
             # Generate the 'j' value
-            j = int(nZeros * 2**k) + integerValueOfTheKLeastSignificantBitsOfJ
+            j = (nZeros << k) | integerValueOfTheKLeastSignificantBitsOfJ
         # Coding-Decoding mode B
-        elif nZeros == self.Umax:
-            # Read 'j' as a plain binary number using D bits
-            binaryString = self.readBinaryStringFromBitStream(self.dynamicRangeInBits, updateCounters=True)
-            j = int(binaryString, 2)
+        else:
+            # Remove the 'zeros' and read 'j' as a plain binary number using D bits
+            self.bitReader.skip(nZeros)
+            j = self.bitReader.read(self.dynamicRangeInBits)
         # Return the 'j' value
         return j
 
@@ -285,7 +197,7 @@ class HybridDecoder():
     # Returns True: current mapped residual has to be processed as high-entropy
     # Returns False: current mapped residual has to be processed as low-entropy
     def EvaluateHighEntropyCondition(self):
-        if self.Sigma * (2**14) >= self.T0 * self.Gamma:
+        if self.codeSelectionTables.isHighEntropy(self.Sigma, self.Gamma):
             # Process current residual as high entropy
             return True
         else:
@@ -301,14 +213,13 @@ class HybridDecoder():
         # its value after being rescaled is Γ(t)=2^(ɣ-1)
         #if self.Gamma == 2**(self.gamma - 1):
         t = col + row * self.nCols
-        self.Gamma = self.GammaList[t]
-        rescaling = self.RescalingList[t]
+        self.Gamma = self.counterSchedule.getGamma(t)
+        rescaling = self.counterSchedule.isRescaling(t)
         # If Γ(t) was rescaled
         if rescaling:
             # The least significant bit of Sigma(t-1) is stored in the bitstream before rescaling it
             # It must be read and added to the decoder rescaled value of Sigma
-            binaryString = self.readBinaryStringFromBitStream(1, updateCounters=True)
-            SigmaLeastSignificantBit = int(binaryString, 2)
+            SigmaLeastSignificantBit = self.bitReader.read(1)
             #self.Sigma = int(2*self.Sigma - 4*mappedResidual - 1) | SigmaLeastSignificantBit
             self.Sigma = int(2*self.Sigma - 4*mappedResidual) - SigmaLeastSignificantBit
         else:
@@ -336,14 +247,7 @@ class HybridDecoder():
         #   D: dynamicRangeInBits
         #   Σ(t): Sigma 
         #   Γ(t): Gamma
-        k_good = 2
-        k = 3
-        while k <= max(self.dynamicRangeInBits-2, 2): 
-            if self.Gamma * 2**(k+2) <= self.Sigma + int( (49/2**5)*self.Gamma ):
-                k_good = k
-                k = k + 1
-            else:
-                break
+        k_good = self.codeSelectionTables.getK(self.Sigma, self.Gamma)
         # Code the mappedResidual using the appropiate value of 'k' and the 'GPO2' method 
         mappedResidual = self.GPO2_decoding(k_good)
         return mappedResidual
@@ -355,33 +259,21 @@ class HybridDecoder():
     def LowEntropyProcess(self):
         # Get the largest code index 'i' satisfying:
         #   Σ(t) · 2^14 < Γ(t) · T(i)
-        i_good = 0
-        i = 1
-        while i < 16: #len(self.Table_InputSimbolLimitAndThreshold):
-            #  Threshold, Ti
-            Ti = self.Table_InputSimbolLimitAndThreshold[i][2]
-            # Condition to be satisfied
-            if self.Sigma * 2**14 < self.Gamma * Ti:
-                i_good = i
-                i = i + 1
-            else:
-                break
-        i = i_good
-        # Get the corresponding Input Simbol Limit, Li
-        Li = self.Table_InputSimbolLimitAndThreshold[i][1] 
+        i = self.codeSelectionTables.getCodeIndex(self.Sigma, self.Gamma)
+        # Get the trie of the code index and the corresponding Input Simbol Limit, Li
+        trie = self.LowEntropyCodeTries[i]
+        Li = trie.Li
         # Get the corresponding active prefix 
         ActivePrefix = self.ActivePrefixList[i]
-        # If the Acvtive Prefix string is empty, load a new one from the bitstream
-        if ActivePrefix == '':
-            dictionary_OutputToInputCodeWords = self.Table_OutputToInputCodeWords[i]
-            outputCodeWord = self.getOutputCodeWordFromBitstream(dictionary_OutputToInputCodeWords)
-            inputCodeWord = dictionary_OutputToInputCodeWords.get(outputCodeWord)
-            ActivePrefix = inputCodeWord
-        # Extract the last character of the string (li) and update the acvite prefix value in the list
-        li = ActivePrefix[-1:]
-        self.ActivePrefixList[i] = ActivePrefix[:-1]
+        # If the Acvtive Prefix is empty, load the input symbols of a new codeword from the bitstream
+        if not ActivePrefix:
+            code = self.getInputCodeWordFromBitstream(trie.decodingLookupTable)
+            ActivePrefix.extend(trie.codeSymbols[code])
+        # Extract the last input symbol (li) from the active prefix
+        li = ActivePrefix.pop()
         # Decode the corresponding mapped residual from li according to its value
-        if li == 'X':
+        if li > Li:
+            # Scape symbol 'X' (Li+1)
             # the mapped residual was codded using Rk'(j), using:
             #   k = 0
             #   j = δ(t) - L(i) - 1
@@ -389,8 +281,8 @@ class HybridDecoder():
             j = self.GPO2_decoding(k)
             mappedResidual = j + Li + 1
         else:
-            # li contains the mapped residual value represented in hexadecimal notation
-            mappedResidual = int(li, 16)
+            # li is the mapped residual value
+            mappedResidual = li
         # return the mapped residual
         return mappedResidual
 
@@ -401,14 +293,13 @@ class HybridDecoder():
     def decodeTargetMappedResidual(self, row, col, band):
         if row == 0 and col == 0:
             # The first mapped residual of each band is decoded as a plain binary with D bits
-            binaryString = self.readBinaryStringFromBitStream(self.dynamicRangeInBits, updateCounters=True)
-            mappedResidual = int(binaryString, 2)
+            mappedResidual = self.bitReader.read(self.dynamicRangeInBits)
         else:
             # Get High-Resolution accumulator for the current band from the list
             self.getHighResolutionAccumulatorForTargetBand(band)
             # Get Counter for target 't' value
             t = col + row * self.nCols
-            self.Gamma = self.GammaList[t]
+            self.Gamma = self.counterSchedule.getGamma(t)
             # Evaluate if the mapped residual should be processed as high or low entropy
             if self.EvaluateHighEntropyCondition():
                 # High entropy processing
@@ -437,6 +328,15 @@ class HybridDecoder():
 
     def decode(self, inputFilePath, Umax, gamma, gamma_0, dynamicRange, nCols, nRows=1, nBands=1, decodingOrder='bsq'):
 
+        # Read bitstream from binary file
+        self.readBitStreamFromBinaryFile(inputFilePath)
+        # Decode it
+        return self.decodeBitStream(self.bitStream, Umax, gamma, gamma_0, dynamicRange, nCols, nRows, nBands, decodingOrder)
+
+
+    # Decode a bitstream already in memory (bytes or bytearray with the content of a coded file)
+    def decodeBitStream(self, bitStream, Umax, gamma, gamma_0, dynamicRange, nCols, nRows=1, nBands=1, decodingOrder='bsq'):
+
         # Get the input parameters
         self.Umax = Umax
         self.gamma = gamma
@@ -446,9 +346,8 @@ class HybridDecoder():
         self.nRows = nRows
         self.nBands = nBands
         decodingOrder = decodingOrder
+        self.bitStream = bitStream
 
-        # Read bitstream from binary file
-        self.readBitStreamFromBinaryFile(inputFilePath)
         # Initialize the decoding variables
         self.initializeDecodingVariables()
         # Decode image tail
@@ -3,6 +3,194 @@ import numpy
 import struct
 import math
 
+from BitStream import packCodes
+from ParallelSegments import mapSegments
+
+
+
+# Header of the extended coding modes: an M value of 0 (not valid in the Golomb mode) followed by
+# a byte with the coding mode
+EXTENDED_MODE_ESCAPE = 0
+#   Rice mode: M = 2^k. Followed by a byte with k. The remainders are coded as fixed-width k-bit fields
+RICE_MODE = 1
+#   Block-adaptive mode: the vector is split into segments of the same size, each of them coded independently
+#   with its own parameter. The header is completed with 'zeros' until the end of the byte and followed by:
+#       1 byte: 1 if the segments are coded in the Rice mode, 0 otherwise
+#       uint32: segment size (elements)
+#       uint32: number of segments
+#       uint32 per segment: M of the segment
+#       uint32 per segment + 1: offset (bytes) of each segment from the start of the first one, and end of the last one
+#   followed by the segments (each of them completed with 'zeros' until the end of the byte)
+BLOCK_ADAPTIVE_MODE = 2
+
+
+
+
+# ---- Vectorized coding functions ---- #
+# (module functions, so they can be executed in the processes of a process pool)
+
+# Calculate the coding parameter M (Mean value of the values)
+# In the Rice mode M is rounded to the nearest power of two, M = 2^k
+def getCodingParameter(values, riceMode=False):
+    M = int(numpy.mean(values))
+    M = max(M, 1) # Protection in case M == 0
+    if riceMode:
+        M = 2**int(round(math.log2(M)))
+    return M
+
+
+# (codeValue, codeLength) pairs of the codes of all the values at once (M, b and difference are the same for all of them)
+def computeGolombCodes(values, M, riceMode=False):
+    values = numpy.asarray(values).astype(numpy.int64).ravel()
+    # Get the first power of two (b) bigger than M (b = floor(log2(M))+1)
+    b = int(math.floor(math.log2(M))+1)
+    difference =  2**b - M
+    if riceMode:
+        # M = 2^k: the quotient and the k-bit remainder are obtained with shifts and masks
+        q = values >> (b - 1)
+        rCode = values & (M - 1)
+        rBits = numpy.full(values.size, b - 1)
+    else:
+        q = values // M # Division Quotient
+        r = values % M  # Division Reminder
+        # Truncated binary code of r
+        shortCode = r < difference
+        rBits = numpy.where(shortCode, b - 1, b)
+        rCode = numpy.where(shortCode, r, r + difference)
+    # Codes of each element:
+    #   q in unary code, as ones in codes of up to 64 bits (q//64 codes of 64 ones and one code with the rest)
+    #   followed by the final 0 of the unary code and r in binary code
+    nFullCodes = q >> 6
+    nCodesPerElement = nFullCodes + 2
+    firstCode = numpy.cumsum(nCodesPerElement) - nCodesPerElement
+    nCodes = int(nCodesPerElement.sum())
+    codeValues = numpy.full(nCodes, 2**64 - 1, dtype=numpy.uint64)
+    codeLengths = numpy.full(nCodes, 64, dtype=numpy.int64)
+    restCode = firstCode + nFullCodes
+    codeValues[restCode] = (numpy.uint64(1) << (q & 63).astype(numpy.uint64)) - numpy.uint64(1)
+    codeLengths[restCode] = q & 63
+    codeValues[restCode + 1] = rCode
+    codeLengths[restCode + 1] = rBits + 1
+    return codeValues, codeLengths
+
+
+# Code a segment of values as bytes (the last one completed with 'zeros')
+def codeSegment(values, M, riceMode=False):
+    packedBytes, nBits = packCodes(*computeGolombCodes(values, M, riceMode))
+    return packedBytes.tobytes()
+
+
+# Number of bytes of the bitstream unpacked at a time by decodeGolombCodes
+DECODING_CHUNK_SIZE_IN_BYTES = 1 << 16
+
+# The chain of zeros of the elements is followed with jumps of 2^CHAIN_JUMP_LEVELS elements
+CHAIN_JUMP_LEVELS = 4
+
+
+# 32 bits (big-endian) windows starting at each byte of 'byteArray' but the 3 last ones
+def getByteWindows(byteArray):
+    byteArray = byteArray.astype(numpy.uint32)
+    return (byteArray[:-3] << 24) | (byteArray[1:-2] << 16) | (byteArray[2:-1] << 8) | byteArray[3:]
+
+
+# Unsigned integers of 'nBits' bits (up to 25, MSB first) starting at the bit positions 'startBits', read from the
+# windows of the bytes containing their first bit (windows: getByteWindows of the bytes)
+def readBitFields(windows, startBits, nBits):
+    window = windows[startBits >> 3]
+    return (window >> (32 - (startBits & 7) - nBits).astype(numpy.uint32)) & ((numpy.uint32(1) << numpy.asarray(nBits, dtype=numpy.uint32)) - numpy.uint32(1))
+
+
+# Vectorized decoder
+# The unary code of each element ends in a zero, so the bitstream is unpacked and, for every zero, the
+# end of the element whose unary code would end in it is obtained at once (from the truncated binary code
+# of r after the zero), together with the zero ending the unary code of the next element. Then, only the
+# chain of zeros of the actual elements has to be followed (and their q and r decoded): the zeros 2^CHAIN_JUMP_LEVELS elements ahead are obtained by
+# pointer doubling, so the chain is followed sequentially only every 2^CHAIN_JUMP_LEVELS elements, and
+# the zeros in between are filled in for all the jumps at once
+# The bitstream is processed in chunks of DECODING_CHUNK_SIZE_IN_BYTES bytes (larger if a unary code does
+# not fit in it), each one starting at the byte with the first bit of the next element to be decoded
+# Inputs:
+#   byteArray: bytes of the bitstream
+#   startBit: position of the first bit of the first element
+#   nElements: number of elements to be decoded
+def decodeGolombCodes(byteArray, startBit, nElements, M, riceMode=False, chunkSizeInBytes=DECODING_CHUNK_SIZE_IN_BYTES):
+    # 'zeros' after the end of the bitstream, so the codes after any zero can be read
+    byteArray = numpy.concatenate((numpy.asarray(byteArray, dtype=numpy.uint8), numpy.zeros(8, dtype=numpy.uint8)))
+    # Get the first power of two (b) bigger than M (b = floor(log2(M))+1)
+    b = int(math.floor(math.log2(M))+1)
+    difference =  2**b - M
+    k = b - 1
+    decodedVector = numpy.empty(nElements, dtype=numpy.int64)
+    nDecoded = 0
+    chunkBytes = chunkSizeInBytes
+    while nDecoded < nElements:
+        # Chunk starting at the byte with the first bit of the next element (and the 4 next bytes, for the rCodes)
+        chunkStart = startBit >> 3
+        chunkEnd = min(chunkStart + chunkBytes, byteArray.size - 4)
+        chunk = byteArray[chunkStart:chunkEnd + 4]
+        nBits = 8 * (chunkEnd - chunkStart)
+        isZero = numpy.unpackbits(chunk[:chunkEnd - chunkStart]) == 0
+        isZero[:startBit & 7] = False
+        zeroPositions = numpy.flatnonzero(isZero).astype(numpy.int32)
+        nZeros = zeroPositions.size
+        if nZeros == 0:
+            if chunkEnd == byteArray.size - 4:
+                raise ValueError('The bitstream ends before decoding {} elements'.format(nElements))
+            # Unary code longer than the chunk
+            chunkBytes = 2 * chunkBytes
+            continue
+        chunkBytes = chunkSizeInBytes
+        # Index (in zeroPositions) of the first zero at or after each position
+        nextZeroIndex = numpy.cumsum(isZero, dtype=numpy.int32)
+        nextZeroIndex -= isZero
+        # The element ending its unary code in a zero ends b bits after it, or b+1 bits if the b-1 first bits
+        # of rCode are not smaller than difference (Rice mode: always b bits, with a fixed-width k-bit remainder)
+        windows = getByteWindows(chunk)
+        rCodeStart = zeroPositions + 1
+        elementEnd = zeroPositions + b
+        if not riceMode:
+            elementEnd += readBitFields(windows, rCodeStart, k) >= difference
+        # Zero ending the unary code of the next element (nZeros: the next element ends after the chunk)
+        nextZero = numpy.full(nZeros + 1, nZeros, dtype=numpy.int32)
+        inChunk = elementEnd < nBits
+        nextZero[:nZeros][inChunk] = nextZeroIndex[elementEnd[inChunk]]
+        # Zeros 2^CHAIN_JUMP_LEVELS elements ahead
+        jumpZero = nextZero
+        for level in range(0, CHAIN_JUMP_LEVELS):
+            jumpZero = jumpZero[jumpZero]
+        # Follow the chain of zeros of the elements, a jump at a time
+        nJumps = (nElements - nDecoded + (1 << CHAIN_JUMP_LEVELS) - 1) >> CHAIN_JUMP_LEVELS
+        jumpZeros = []
+        zero = 0
+        while zero < nZeros and len(jumpZeros) < nJumps:
+            jumpZeros.append(zero)
+            zero = int(jumpZero[zero])
+        elementZeros = numpy.empty((len(jumpZeros), 1 << CHAIN_JUMP_LEVELS), dtype=numpy.int32)
+        elementZeros[:, 0] = jumpZeros
+        for step in range(1, 1 << CHAIN_JUMP_LEVELS):
+            elementZeros[:, step] = nextZero[elementZeros[:, step - 1]]
+        elementZeros = elementZeros.ravel()
+        # The zeros of the elements are followed by the ones after the chunk (nZeros)
+        elementZeros = elementZeros[:min(numpy.searchsorted(elementZeros, nZeros), nElements - nDecoded)]
+        # q: number of ones between the end of the previous element and the zero
+        previousEnd = numpy.concatenate(([startBit & 7], elementEnd[elementZeros[:-1]]))
+        q = (zeroPositions[elementZeros] - previousEnd).astype(numpy.int64)
+        # r: rCode of the elements (read with b-1 bits for the short codes and b bits for the long ones)
+        rBits = elementEnd[elementZeros] - rCodeStart[elementZeros]
+        rCode = readBitFields(windows, rCodeStart[elementZeros], rBits).astype(numpy.int64)
+        if riceMode:
+            decodedVector[nDecoded:nDecoded + elementZeros.size] = (q << k) | rCode
+        else:
+            decodedVector[nDecoded:nDecoded + elementZeros.size] = q * M + numpy.where(rBits == k, rCode, rCode - difference)
+        nDecoded += elementZeros.size
+        startBit = 8 * chunkStart + int(elementEnd[elementZeros[-1]])
+    return decodedVector
+
+
+# Decode a segment coded with codeSegment
+def decodeSegment(segmentBytes, nElements, M, riceMode=False):
+    return decodeGolombCodes(numpy.frombuffer(segmentBytes, dtype=numpy.uint8), 0, nElements, M, riceMode)
+
 
 
 class GolombRiceCoder:
@@ -72,14 +260,8 @@ class GolombRiceCoder:
         return currentByte, writtenBits
 
 
-    def code(self, vector, dynamicRange, outputFilePath, logFilePath=None):
-
-        self.fileOut = open(outputFilePath, 'wb')
-        
-        self.verbose = False
-        if logFilePath != None:
-            self.logFile = open(logFilePath, 'w')
-            self.verbose = True
+    # Code the vector writing the bitstream bit by bit (and the coding log if requested)
+    def codeBitByBit(self, vector, headerCodes, M, b, difference):
 
         # Get the MTac size
         nElements = vector.shape[0]
@@ -87,16 +269,9 @@ class GolombRiceCoder:
         self.writtenBytes = 0
         currentByte = 0
         writtenBits = 0
-        # Calculate the coding parameter M (Mean value of the mapped tac)
-        M = int(numpy.mean(vector))
-        M = max(M, 1) # Protection in case M == 0
-        # Write the M value in the bitstream as binary code
-        integerNumber = M
-        numberOfBitsToBeUsed = dynamicRange 
-        (currentByte, writtenBits) = self.writeIntToBinary(currentByte, writtenBits, integerNumber, numberOfBitsToBeUsed)
-        # Get the first power of two (b) bigger than M (b = floor(log2(M))+1)
-        b = int(math.floor(math.log2(M))+1)
-        difference =  2**b - M
+        # Write the header (M value) in the bitstream as binary code
+        for integerNumber, numberOfBitsToBeUsed in headerCodes:
+            (currentByte, writtenBits) = self.writeIntToBinary(currentByte, writtenBits, integerNumber, numberOfBitsToBeUsed)
 
         # TODO: Checking
         if self.verbose:
@@ -134,6 +309,75 @@ class GolombRiceCoder:
         # Add 0 to complete the last byte (Padding)
         (currentByte, writtenBits) = self.paddingByte(currentByte, writtenBits)
 
+
+    # Code the vector computing the (codeValue, codeLength) pairs of the header and of all the elements
+    # at once, and packing them into bytes at once
+    def codeWithBitPacker(self, vector, headerCodes, M, riceMode=False):
+        codeValues, codeLengths = computeGolombCodes(vector, M, riceMode)
+        headerValues, headerLengths = zip(*headerCodes)
+        codeValues = numpy.concatenate((numpy.array(headerValues, dtype=numpy.uint64), codeValues))
+        codeLengths = numpy.concatenate((numpy.array(headerLengths, dtype=numpy.int64), codeLengths))
+        packedBytes, nBits = packCodes(codeValues, codeLengths)
+        self.writePackedBytes(packedBytes, nBits)
+
+
+    # Code the vector in the block-adaptive mode, with the segments coded in parallel if nWorkers > 1
+    def codeSegmented(self, vector, dynamicRange, segmentSize, riceMode=False, nWorkers=None):
+        values = numpy.asarray(vector).astype(numpy.int64).ravel()
+        segments = [values[start:start + segmentSize] for start in range(0, values.size, segmentSize)]
+        parameters = [getCodingParameter(segment, riceMode) for segment in segments]
+        codedSegments = mapSegments(codeSegment, nWorkers, segments, parameters, [riceMode] * len(segments))
+        # Header: escape value and mode, completed until the end of the byte
+        headerBytes, nBits = packCodes([EXTENDED_MODE_ESCAPE, BLOCK_ADAPTIVE_MODE], [dynamicRange, 8])
+        segmentOffsets = numpy.concatenate(([0], numpy.cumsum([len(codedSegment) for codedSegment in codedSegments])))
+        segmentTable = numpy.concatenate(([segmentSize, len(segments)], parameters, segmentOffsets)).astype('>u4')
+        bitstream = headerBytes.tobytes() + bytes([int(riceMode)]) + segmentTable.tobytes() + b''.join(codedSegments)
+        # Add one 'zeros' byte if the number of written bytes is odd
+        self.writtenBytes = len(bitstream) + len(bitstream) % 2
+        self.fileOut.write(bitstream + bytes(len(bitstream) % 2))
+
+
+    # Write the packed bitstream to the output file, with the same padding as paddingByte:
+    # 'zeros' until completing the last byte (a whole byte if it is already complete), plus
+    # one more byte if the number of written bytes is odd
+    def writePackedBytes(self, packedBytes, nBits):
+        self.writtenBytes = (nBits >> 3) + 1
+        self.writtenBytes = self.writtenBytes + self.writtenBytes % 2
+        outputBytes = numpy.zeros(self.writtenBytes, dtype=numpy.uint8)
+        outputBytes[:packedBytes.size] = packedBytes
+        self.fileOut.write(outputBytes.tobytes())
+
+
+    def code(self, vector, dynamicRange, outputFilePath, logFilePath=None, riceMode=False, segmentSize=None, nWorkers=None):
+
+        self.fileOut = open(outputFilePath, 'wb')
+        
+        self.verbose = False
+        if logFilePath != None:
+            self.logFile = open(logFilePath, 'w')
+            self.verbose = True
+
+        # Block-adaptive mode
+        if segmentSize is not None:
+            self.codeSegmented(vector, dynamicRange, segmentSize, riceMode, nWorkers)
+        else:
+            # Calculate the coding parameter M (Mean value of the mapped tac)
+            M = getCodingParameter(vector, riceMode)
+            if riceMode:
+                # Header: escape value, mode and k (M = 2^k)
+                headerCodes = [(EXTENDED_MODE_ESCAPE, dynamicRange), (RICE_MODE, 8), (M.bit_length() - 1, 8)]
+            else:
+                # Header: M value
+                headerCodes = [(M, dynamicRange)]
+            # Write the bitstream bit by bit when the coding log is requested
+            if self.verbose:
+                # Get the first power of two (b) bigger than M (b = floor(log2(M))+1)
+                b = int(math.floor(math.log2(M))+1)
+                difference =  2**b - M
+                self.codeBitByBit(vector, headerCodes, M, b, difference)
+            else:
+                self.codeWithBitPacker(vector, headerCodes, M, riceMode)
+
         self.fileOut.close()
 
         if self.verbose:
@@ -278,24 +522,65 @@ class GolombRiceCoder:
         return vector
 
 
-    def decode(self, filePath, dynamicRange, nElements, logFilePath=None):
+    # Vectorized decoder (see decodeGolombCodes)
+    def decodeBitstreamVectorized(self, byteArray, nElements, dynamicRange, nWorkers=None):
+        byteArray = numpy.asarray(byteArray, dtype=numpy.uint8)
+        bits = numpy.unpackbits(byteArray[:(dynamicRange + 23) >> 3])
+        # First read the header: M value (binary code), or escape value and mode
+        M = self.readIntFromBits(bits, 0, dynamicRange)
+        headerBits = dynamicRange
+        riceMode = False
+        if M == EXTENDED_MODE_ESCAPE:
+            mode = self.readIntFromBits(bits, dynamicRange, 8)
+            if mode == BLOCK_ADAPTIVE_MODE:
+                return self.decodeSegmentedBitstream(byteArray, nElements, dynamicRange, nWorkers)
+            if mode == RICE_MODE:
+                riceMode = True
+                M = 2**self.readIntFromBits(bits, dynamicRange + 8, 8)
+                headerBits = dynamicRange + 16
+        decodedVector = decodeGolombCodes(byteArray, headerBits, nElements, M, riceMode)
+        return decodedVector.astype('uint16')
+
+
+    # Decode a bitstream coded in the block-adaptive mode, with the segments decoded in parallel if nWorkers > 1
+    def decodeSegmentedBitstream(self, byteArray, nElements, dynamicRange, nWorkers=None):
+        tableStart = (dynamicRange + 8 + 7) >> 3
+        riceMode = bool(byteArray[tableStart])
+        [segmentSize, nSegments] = numpy.frombuffer(byteArray[tableStart + 1:tableStart + 9].tobytes(), dtype='>u4').tolist()
+        segmentTable = numpy.frombuffer(byteArray[tableStart + 9:tableStart + 9 + 4 * (2 * nSegments + 1)].tobytes(), dtype='>u4').tolist()
+        parameters = segmentTable[:nSegments]
+        segmentOffsets = segmentTable[nSegments:]
+        segmentsStart = tableStart + 9 + 4 * (2 * nSegments + 1)
+        byteString = byteArray.tobytes()
+        codedSegments = [byteString[segmentsStart + segmentOffsets[segment]:segmentsStart + segmentOffsets[segment + 1]] for segment in range(0, nSegments)]
+        segmentElements = [min(segmentSize, nElements - segment * segmentSize) for segment in range(0, nSegments)]
+        decodedSegments = mapSegments(decodeSegment, nWorkers, codedSegments, segmentElements, parameters, [riceMode] * nSegments)
+        decodedVector = numpy.concatenate(decodedSegments) if nSegments > 0 else numpy.zeros(0, dtype=numpy.int64)
+        return decodedVector.astype('uint16')
+
+
+    # Integer value of 'nBits' bits (MSB first) of an array of bits
+    def readIntFromBits(self, bits, startBit, nBits):
+        readValue = 0
+        for bit in bits[startBit:startBit + nBits].tolist():
+            readValue = (readValue << 1) | bit
+        return readValue
+
+
+    def decode(self, filePath, dynamicRange, nElements, logFilePath=None, nWorkers=None):
 
         self.verbose = False
         if logFilePath != None:
             self.logFile = open(logFilePath, 'w')
             self.verbose = True
 
-        # Get the number of bytes in the file
-        nBytesInBitstream = self.getSizeOfFile(filePath)
-        # Read the bytes to a python list one by one
-        byteList = []
-        filePointer = open(filePath, 'rb')
-        for byteIndex in range(0, nBytesInBitstream):
-            currentByte = struct.unpack('B', filePointer.read(1))[0] 
-            byteList.append(currentByte)
-        filePointer.close()
-        # Decode the bistream
-        decodedVector = self.decodeBitstream(byteList, nElements, dynamicRange)
-        # Cast data to integer
-        decodedVector = decodedVector.astype('uint16')
+        # Read all the bytes of the file at once
+        byteArray = numpy.fromfile(filePath, dtype=numpy.uint8)
+        # Decode the bitstream bit by bit when the decoding log is requested (only in the Golomb mode)
+        if self.verbose and self.checkIntFromBinary(byteArray, 0, 0, dynamicRange) != EXTENDED_MODE_ESCAPE:
+            decodedVector = self.decodeBitstream(byteArray.tolist(), nElements, dynamicRange)
+            # Cast data to integer
+            decodedVector = decodedVector.astype('uint16')
+        else:
+            decodedVector = self.decodeBitstreamVectorized(byteArray, nElements, dynamicRange, nWorkers)
         return decodedVector
\ No newline at end of file
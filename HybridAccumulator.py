@@ -0,0 +1,200 @@
+import numpy
+from bisect import bisect_right
+
+
+
+# Values of the High-Resolution accumulator (Σ(t): Sigma) and the Counter (Γ(t): Gamma) for a
+# sequence of mapped residuals, together with all the coding decisions that only depend on them
+# All the arrays have one element per mapped residual (values after updating with that residual)
+class AccumulatorTrajectory():
+
+    def __init__(self):
+        # Σ(t) and Γ(t) after the update
+        self.Sigma = None
+        self.Gamma = None
+        # True if Γ(t) was rescaled
+        self.rescaling = None
+        # Least significant bit of Σ(t-1) (written to the bitstream when rescaling)
+        self.rescalingBits = None
+        # True: high-entropy processing | False: low-entropy processing
+        self.highEntropy = None
+        # GPO2 code index 'k' of the high-entropy processing
+        self.k = None
+        # Code index 'i' of the low-entropy processing
+        self.codeIndex = None
+        # Σ and Γ after the last mapped residual
+        self.finalSigma = None
+        self.finalGamma = None
+
+
+# ----- Code selection tables ----- #
+
+# Breakpoints of Σ for selecting, for each possible value of Γ (0 <= Γ < 2^ɣ^*):
+#   the high-entropy processing: Σ·2^14 >= T(0)·Γ  <=>  Σ >= ceil(T(0)·Γ / 2^14)
+#   the GPO2 code index 'k': Γ·2^(k+2) <= Σ + floor(49/2^5·Γ)  <=>  Σ >= Γ·2^(k+2) - floor(49·Γ / 2^5)
+#       (increasing with 'k', so 'k' is 2 plus the number of breakpoints <= Σ for 3 <= k <= max{D-2, 2})
+#   the low-entropy code index 'i': Σ·2^14 < Γ·T(i)  <=>  Σ < ceil(Γ·T(i) / 2^14)
+#       (T(i) decreases with 'i', so 'i' is the number of breakpoints > Σ for 1 <= i <= 15)
+# The breakpoints are stored in increasing order, so the selections are binary searches
+class CodeSelectionTables():
+
+    def __init__(self, dynamicRangeInBits, gamma, Table_InputSimbolLimitAndThreshold):
+        GammaValues = numpy.arange(0, 2**gamma, dtype=numpy.int64)[:, None]
+        thresholds = numpy.array([row[2] for row in Table_InputSimbolLimitAndThreshold], dtype=numpy.int64)
+        # High-entropy processing: Σ >= highEntropyLimits[Γ]
+        self.highEntropyLimitArray = -((-thresholds[0] * GammaValues[:, 0]) >> 14)
+        # GPO2 code index: k = 2 + number of kBreakpoints[Γ] <= Σ
+        kValues = numpy.arange(3, max(dynamicRangeInBits - 2, 2) + 1, dtype=numpy.int64)[None, :]
+        self.kBreakpointArray = (GammaValues << (kValues + 2)) - ((49 * GammaValues) >> 5)
+        # Low-entropy code index: i = 15 - number of codeIndexBreakpoints[Γ] <= Σ (breakpoints for i = 15 ... 1)
+        self.codeIndexBreakpointArray = -((-GammaValues * thresholds[15:0:-1][None, :]) >> 14)
+        # Lists for the selection of a single value
+        self.highEntropyLimits = self.highEntropyLimitArray.tolist()
+        self.kBreakpoints = self.kBreakpointArray.tolist()
+        self.codeIndexBreakpoints = self.codeIndexBreakpointArray.tolist()
+        # Sorted keys for the selection of arrays of values (see countBreakpoints)
+        self.kBreakpointKeys = self.getBreakpointKeys(self.kBreakpointArray)
+        self.codeIndexBreakpointKeys = self.getBreakpointKeys(self.codeIndexBreakpointArray)
+
+
+    # Returns True if the mapped residual has to be processed as high-entropy
+    def isHighEntropy(self, Sigma, Gamma):
+        return Sigma >= self.highEntropyLimits[Gamma]
+
+
+    # Largest 'k' (2 <= k <= max{D-2, 2}) satisfying Γ·2^(k+2) <= Σ + floor(49/2^5·Γ)
+    def getK(self, Sigma, Gamma):
+        return 2 + bisect_right(self.kBreakpoints[Gamma], Sigma)
+
+
+    # Largest code index 'i' satisfying Σ·2^14 < Γ·T(i)
+    def getCodeIndex(self, Sigma, Gamma):
+        return 15 - bisect_right(self.codeIndexBreakpoints[Gamma], Sigma)
+
+
+    # Vectorized versions for arrays of Σ and Γ values
+    def isHighEntropyArray(self, SigmaValues, GammaValues):
+        return SigmaValues >= self.highEntropyLimitArray[GammaValues]
+
+    def getKArray(self, SigmaValues, GammaValues):
+        return 2 + self.countBreakpoints(self.kBreakpointKeys, SigmaValues, GammaValues)
+
+    def getCodeIndexArray(self, SigmaValues, GammaValues):
+        return 15 - self.countBreakpoints(self.codeIndexBreakpointKeys, SigmaValues, GammaValues)
+
+
+    # All the breakpoints of a table (one row of increasing breakpoints per Γ) as a single increasing array,
+    # adding to the breakpoints of each row Γ times the range of values of the table
+    def getBreakpointKeys(self, breakpointArray):
+        minimumBreakpoint = int(breakpointArray.min()) if breakpointArray.size > 0 else 0
+        maximumBreakpoint = int(breakpointArray.max()) if breakpointArray.size > 0 else 0
+        rowRange = maximumBreakpoint - minimumBreakpoint + 3
+        keys = (breakpointArray - minimumBreakpoint + 1) + rowRange * numpy.arange(0, breakpointArray.shape[0], dtype=numpy.int64)[:, None]
+        return (keys.ravel(), minimumBreakpoint, maximumBreakpoint, rowRange, breakpointArray.shape[1])
+
+
+    # Number of breakpoints of the row Γ <= Σ, for arrays of Σ and Γ values
+    # (Σ is clipped to the range of the breakpoints, which does not change the result)
+    def countBreakpoints(self, breakpointKeys, SigmaValues, GammaValues):
+        keys, minimumBreakpoint, maximumBreakpoint, rowRange, nBreakpointsPerRow = breakpointKeys
+        SigmaKeys = (numpy.clip(SigmaValues, minimumBreakpoint - 1, maximumBreakpoint + 1) - minimumBreakpoint + 1) + rowRange * GammaValues
+        return numpy.searchsorted(keys, SigmaKeys, side='right') - nBreakpointsPerRow * GammaValues
+
+
+
+
+# ----- Counter schedule ----- #
+
+# Counter values Γ(t) for t = 0, 1, 2... (t: number of updates) starting from Γ(0) = 'Gamma'
+# Γ is increased by one until reaching 2^ɣ^*-1. The next update rescales it to 2^(ɣ^*-1), and from
+# there on the same period of 2^(ɣ^*-1) updates is repeated, so Γ(t) is obtained directly from 't'
+class CounterSchedule():
+
+    def __init__(self, Gamma, gamma):
+        self.initialGamma = Gamma
+        self.period = 2**(gamma - 1)
+        # Update with the first rescaling
+        self.firstRescaling = 2**gamma - Gamma
+
+
+    # Counter value Γ(t)
+    def getGamma(self, t):
+        if t < self.firstRescaling:
+            return self.initialGamma + t
+        return self.period + (t - self.firstRescaling) % self.period
+
+
+    # Returns True if Γ(t) was rescaled in the update 't'
+    def isRescaling(self, t):
+        return t >= self.firstRescaling and (t - self.firstRescaling) % self.period == 0
+
+
+    # Vectorized versions for arrays of 't' values
+    def getGammaArray(self, t):
+        return numpy.where(t < self.firstRescaling, self.initialGamma + t, self.period + (t - self.firstRescaling) % self.period)
+
+    def isRescalingArray(self, t):
+        return (t >= self.firstRescaling) & ((t - self.firstRescaling) % self.period == 0)
+
+
+# Counter values Γ(t) and rescaling flags for 'nSamples' updates starting from the counter value 'Gamma'
+def computeCounterSchedule(nSamples, Gamma, gamma):
+    counterSchedule = CounterSchedule(Gamma, gamma)
+    t = numpy.arange(1, nSamples + 1, dtype=numpy.int64)
+    return counterSchedule.getGammaArray(t), counterSchedule.isRescalingArray(t)
+
+
+
+
+# ----- Accumulator trajectory ----- #
+
+# Compute the trajectory of Σ(t) and Γ(t) for all the mapped residuals at once
+# Inputs:
+#   mappedResiduals: 1D array with the mapped residuals (all of them update the accumulator)
+#   Sigma, Gamma: Σ and Γ before the first update
+#   gamma: ɣ^*
+#   codeSelectionTables: CodeSelectionTables for the dynamic range and ɣ^*
+def computeAccumulatorTrajectory(mappedResiduals, Sigma, Gamma, gamma, codeSelectionTables):
+    trajectory = AccumulatorTrajectory()
+    mappedResiduals = numpy.asarray(mappedResiduals, dtype=numpy.int64)
+    nSamples = mappedResiduals.size
+    Sigma = int(Sigma)
+    Gamma = int(Gamma)
+    # Counter
+    GammaValues, rescaling = computeCounterSchedule(nSamples, Gamma, gamma)
+    # High-Resolution accumulator
+    #   Between rescalings Σ only accumulates 4·δ(t). At each rescaling Σ(t) = (Σ(t-1) + 4·δ(t) + 1) / 2
+    #   The values of Σ just after each rescaling are obtained sequentially (one operation per rescaling),
+    #   and the rest of values adding the cumulative sum of the residuals since the last rescaling
+    increments = 4 * mappedResiduals
+    cumulativeIncrements = numpy.cumsum(increments)
+    rescalingIndexes = numpy.flatnonzero(rescaling)
+    #   Σ just after the last rescaling (or initial Σ) and cumulative increment at that point, for each sample
+    segmentStartSigma = [Sigma]
+    if rescalingIndexes.size > 0:
+        segmentIncrements = numpy.add.reduceat(increments[:rescalingIndexes[-1] + 1], numpy.concatenate(([0], rescalingIndexes[:-1] + 1)))
+        for segmentIncrement in segmentIncrements.tolist():
+            Sigma = (Sigma + segmentIncrement + 1) >> 1
+            segmentStartSigma.append(Sigma)
+    segmentStartSigma = numpy.array(segmentStartSigma, dtype=numpy.int64)
+    segmentStartIncrement = numpy.concatenate(([0], cumulativeIncrements[rescalingIndexes]))
+    segment = numpy.cumsum(rescaling)
+    SigmaValues = segmentStartSigma[segment] + cumulativeIncrements - segmentStartIncrement[segment]
+    # Least significant bit of Σ(t-1) for the rescaling updates
+    previousSigma = numpy.concatenate(([segmentStartSigma[0]], SigmaValues))[:nSamples]
+    rescalingBits = previousSigma & 0x1
+    # High-entropy condition, GPO2 code index 'k' and low-entropy code index 'i'
+    highEntropy = codeSelectionTables.isHighEntropyArray(SigmaValues, GammaValues)
+    kValues = codeSelectionTables.getKArray(SigmaValues, GammaValues)
+    codeIndex = codeSelectionTables.getCodeIndexArray(SigmaValues, GammaValues)
+    # Store the results
+    trajectory.Sigma = SigmaValues
+    trajectory.Gamma = GammaValues
+    trajectory.rescaling = rescaling
+    trajectory.rescalingBits = rescalingBits
+    trajectory.highEntropy = highEntropy
+    trajectory.k = kValues
+    trajectory.codeIndex = codeIndex
+    trajectory.finalSigma = int(SigmaValues[-1]) if nSamples > 0 else Sigma
+    trajectory.finalGamma = int(GammaValues[-1]) if nSamples > 0 else Gamma
+    return trajectory
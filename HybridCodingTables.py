@@ -0,0 +1,567 @@
+import numpy
+import pickle
+import os
+import threading
+import functools
+import hashlib
+import warnings
+
+
+# ----- Coding Tables ----- #
+
+# Directory with the coding tables (relative to this file, not to the current working directory)
+CODING_TABLES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CodingTables')
+
+# Low-Entropy Code Input Symbo Limit and Threshold (Table 5-16)
+# Code index, i || Input Simbol Limit, Li || Threshold, Ti
+INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH = os.path.join(CODING_TABLES_DIRECTORY, 'LowEntropyCodeInputSymbolLimitAndThreshold.pickle')
+
+# Code tables (Input to output)
+# List. Element index = Code index
+# Each list element is a dictionary with 'key' = 'input codeword'
+INPUT_TO_OUTPUT_CODEWORDS = os.path.join(CODING_TABLES_DIRECTORY, 'CodingTable.pickle')
+
+# Flush tables (Input to output)
+# List. Element index = Code index
+# Each list element is a dictionary with 'key' = 'input codeword'
+FLUSH_INPUT_TO_OUTPUT_CODEWORDS = os.path.join(CODING_TABLES_DIRECTORY, 'FlushCodingTable.pickle')
+
+# Compiled coding tables (all the previous tables in a single array-based file)
+COMPILED_CODING_TABLES_PATH = os.path.join(CODING_TABLES_DIRECTORY, 'CompiledCodingTables.npy')
+
+
+
+
+# ----- Compiled coding tables format ----- #
+
+# The compiled file is a 1D uint8 '.npy' array (so it can be memory-mapped) containing:
+#   Header: magic, version and number of sections (uint32 each)
+#   Section table: byte offset and number of elements of each section (uint32 each)
+#   Sections, in the order of COMPILED_SECTIONS, starting at 4-byte aligned offsets
+# The arrays of the low-entropy code tries (see TRIE_ARRAYS) of all the code indexes are concatenated in
+# one section each, and the arrays of the trie of code index 'i' are at the positions trieArrayOffsets[i, a]
+# to trieArrayOffsets[i+1, a] of the section of the array 'a'. The bits resolved by the primary regular and
+# flush lookup tables of code index 'i' are triePrimaryBits[i, 0] and triePrimaryBits[i, 1]
+# The code tables (input to output) are not stored: they are built from the trie arrays when requested
+# sourceDigests holds the SHA-1 digests of the source pickle files (in the order of COMPILED_SOURCE_PATHS),
+# used to detect a compiled file older than the pickle files it was compiled from
+COMPILED_MAGIC = 0x31544348   # 'HCT1'
+COMPILED_VERSION = 3
+COMPILED_SECTIONS = [
+    ('limitAndThreshold', '<u4'),
+    ('trieTransitions', '<i4'),
+    ('trieCodeValues', '<u4'),
+    ('trieCodeLengths', 'u1'),
+    ('trieCodeSymbolOffsets', '<u4'),
+    ('trieCodeSymbols', 'u1'),
+    ('trieNodeSymbolOffsets', '<u4'),
+    ('trieNodeSymbols', 'u1'),
+    ('trieFlushCodeValues', '<u4'),
+    ('trieFlushCodeLengths', 'u1'),
+    ('trieLookupTable', '<u4'),
+    ('trieFlushLookupTable', '<u4'),
+    ('trieArrayOffsets', '<u4'),
+    ('triePrimaryBits', 'u1'),
+    ('sourceDigests', 'u1'),
+]
+
+# Source pickle files of the compiled coding tables
+COMPILED_SOURCE_PATHS = [INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH, INPUT_TO_OUTPUT_CODEWORDS, FLUSH_INPUT_TO_OUTPUT_CODEWORDS]
+
+# Input symbols of the low-entropy codes: hexadecimal digits (symbol ids 0 to 15) and scape symbol 'X' (symbol id 16)
+SYMBOL_CHARACTERS = '0123456789ABCDEFX'
+ESCAPE_SYMBOL = 16
+
+
+
+
+# ----- Utils general functions ----- #
+
+# Load a pickle file
+def loadPickleFile(filePath):
+    filePointer = open(filePath, 'rb')
+    content = pickle.load(filePointer)
+    filePointer.close()
+    return content
+
+
+# SHA-1 digests of the source files (concatenated)
+def getSourceDigests(sourcePaths):
+    digests = bytearray()
+    for sourcePath in sourcePaths:
+        with open(sourcePath, 'rb') as filePointer:
+            digests += hashlib.sha1(filePointer.read()).digest()
+    return bytes(digests)
+
+
+# Convert the binary string output codewords of each code table to (codeValue, codeLength) pairs
+def convertCodeWordsToIntegerCodes(codeTables):
+    integerCodeTables = []
+    for codeTable in codeTables:
+        integerCodeTable = {}
+        for inputCodeWord, outputCodeWord in codeTable.items():
+            integerCodeTable[inputCodeWord] = (int(outputCodeWord, 2), len(outputCodeWord))
+        integerCodeTables.append(integerCodeTable)
+    return integerCodeTables
+
+
+# Convert the (codeValue, codeLength) output codewords of each code table to binary strings
+def convertIntegerCodesToCodeWords(integerCodeTables):
+    codeTables = []
+    for integerCodeTable in integerCodeTables:
+        codeTables.append({inputCodeWord: bin(codeValue)[2:].zfill(codeLength) for inputCodeWord, (codeValue, codeLength) in integerCodeTable.items()})
+    return codeTables
+
+
+
+
+# ----- Compilation ----- #
+
+# Name of the compiled section of each trie array
+def getTrieSectionName(arrayName):
+    return 'trie' + arrayName[0].upper() + arrayName[1:]
+
+
+# Arrays of the low-entropy code tries of all the code indexes
+def compileLowEntropyCodeTries(Table_InputSimbolLimitAndThreshold, Table_InputToOutputCodeWords, Table_FlushInputToOutputCodeWords):
+    Table_InputToOutputCodes = convertCodeWordsToIntegerCodes(Table_InputToOutputCodeWords)
+    Table_FlushInputToOutputCodes = convertCodeWordsToIntegerCodes(Table_FlushInputToOutputCodeWords)
+    trieArrays = []
+    primaryBits = []
+    for (i, Li, Ti), inputToOutputCodes, flushInputToOutputCodes in zip(Table_InputSimbolLimitAndThreshold, Table_InputToOutputCodes, Table_FlushInputToOutputCodes):
+        arrays, triePrimaryBits, flushPrimaryBits = buildLowEntropyCodeTrieArrays(Li, inputToOutputCodes, flushInputToOutputCodes)
+        trieArrays.append(arrays)
+        primaryBits += [triePrimaryBits, flushPrimaryBits]
+    sectionsContent = [numpy.concatenate([arrays[name] for arrays in trieArrays]) for name, dtype in TRIE_ARRAYS]
+    arrayOffsets = numpy.zeros((len(trieArrays) + 1, len(TRIE_ARRAYS)), dtype=numpy.uint32)
+    arrayOffsets[1:] = numpy.cumsum([[len(arrays[name]) for name, dtype in TRIE_ARRAYS] for arrays in trieArrays], axis=0)
+    return sectionsContent + [arrayOffsets.ravel(), primaryBits]
+
+
+# Compile the pickle coding tables into a single array-based file
+def compileCodingTables(outputFilePath=COMPILED_CODING_TABLES_PATH,
+                        limitAndThresholdPath=INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH,
+                        inputToOutputCodeWordsPath=INPUT_TO_OUTPUT_CODEWORDS,
+                        flushInputToOutputCodeWordsPath=FLUSH_INPUT_TO_OUTPUT_CODEWORDS):
+    # Sections content (same order as COMPILED_SECTIONS)
+    Table_InputSimbolLimitAndThreshold = loadPickleFile(limitAndThresholdPath)
+    Table_InputToOutputCodeWords = loadPickleFile(inputToOutputCodeWordsPath)
+    Table_FlushInputToOutputCodeWords = loadPickleFile(flushInputToOutputCodeWordsPath)
+    sectionsContent = [numpy.array(Table_InputSimbolLimitAndThreshold).flatten()]
+    sectionsContent += compileLowEntropyCodeTries(Table_InputSimbolLimitAndThreshold, Table_InputToOutputCodeWords, Table_FlushInputToOutputCodeWords)
+    sectionsContent.append(numpy.frombuffer(getSourceDigests([limitAndThresholdPath, inputToOutputCodeWordsPath, flushInputToOutputCodeWordsPath]), dtype='u1'))
+    # Header and section table
+    headerSize = 4 * (3 + 2 * len(COMPILED_SECTIONS))
+    header = [COMPILED_MAGIC, COMPILED_VERSION, len(COMPILED_SECTIONS)]
+    data = bytearray()
+    for (name, dtype), content in zip(COMPILED_SECTIONS, sectionsContent):
+        sectionBytes = numpy.asarray(content, dtype=dtype).tobytes()
+        header += [headerSize + len(data), len(content)]
+        data += sectionBytes
+        # 4-byte alignment
+        data += bytes(-len(data) % 4)
+    fileContent = numpy.frombuffer(numpy.array(header, dtype='<u4').tobytes() + bytes(data), dtype='u1')
+    numpy.save(outputFilePath, fileContent)
+
+
+
+
+# ----- Compiled coding tables loading ----- #
+
+# Coding tables loaded from the compiled file (memory-mapped)
+class CompiledCodingTables():
+
+    def __init__(self, filePath=COMPILED_CODING_TABLES_PATH):
+        # Memory-mapped file content
+        self.fileContent = numpy.load(filePath, mmap_mode='r')
+        self.filePath = filePath
+        # Sections as views of the file content (dictionary with 'key' = section name)
+        self.sections = {}
+        header = self.fileContent[0:12].view('<u4')
+        if header[0] != COMPILED_MAGIC or header[1] != COMPILED_VERSION or header[2] != len(COMPILED_SECTIONS):
+            raise ValueError('{} is not a compiled coding tables file (version {})'.format(filePath, COMPILED_VERSION))
+        sectionTable = self.fileContent[12:12 + 8 * len(COMPILED_SECTIONS)].view('<u4')
+        for index, (name, dtype) in enumerate(COMPILED_SECTIONS):
+            byteOffset = int(sectionTable[2 * index])
+            nElements = int(sectionTable[2 * index + 1])
+            nBytes = nElements * numpy.dtype(dtype).itemsize
+            self.sections[name] = self.fileContent[byteOffset:byteOffset + nBytes].view(dtype)
+
+
+    # Low-Entropy Code Input Symbo Limit and Threshold table as a list of [i, Li, Ti]
+    def getInputSymbolLimitAndThresholdTable(self):
+        return self.sections['limitAndThreshold'].reshape(-1, 3).tolist()
+
+
+    # Check whether the source pickle files have changed since the file was compiled
+    # The digests are only computed when a source file is newer than the compiled file
+    def isStale(self, sourcePaths=COMPILED_SOURCE_PATHS):
+        sourcePaths = [sourcePath for sourcePath in sourcePaths if os.path.isfile(sourcePath)]
+        compiledTime = os.path.getmtime(self.filePath)
+        if all(os.path.getmtime(sourcePath) <= compiledTime for sourcePath in sourcePaths):
+            return False
+        return len(sourcePaths) != len(COMPILED_SOURCE_PATHS) or getSourceDigests(sourcePaths) != self.sections['sourceDigests'].tobytes()
+
+
+    # Code tables (input to output) as lists of dictionaries with 'key' = 'input codeword'
+    # and the output codeword as a binary string
+    def getInputToOutputCodeWords(self, flush=False):
+        return convertIntegerCodesToCodeWords(self.getInputToOutputCodes(flush))
+
+
+    # Code tables (input to output) as lists of dictionaries with 'key' = 'input codeword'
+    # and the output codeword as a (codeValue, codeLength) pair, built from the trie arrays
+    def getInputToOutputCodes(self, flush=False):
+        return [trie.getInputToOutputCodes(flush) for trie in self.getLowEntropyCodeTries()]
+
+
+    # Low-entropy code tries, with their arrays as views of the file content
+    def getLowEntropyCodeTries(self):
+        tries = []
+        arrayOffsets = self.sections['trieArrayOffsets'].reshape(-1, len(TRIE_ARRAYS)).tolist()
+        primaryBits = self.sections['triePrimaryBits'].reshape(-1, 2).tolist()
+        for i, (codeIndex, Li, Ti) in enumerate(self.getInputSymbolLimitAndThresholdTable()):
+            arrays = {}
+            for a, (name, dtype) in enumerate(TRIE_ARRAYS):
+                arrays[name] = self.sections[getTrieSectionName(name)][arrayOffsets[i][a]:arrayOffsets[i + 1][a]]
+            tries.append(LowEntropyCodeTrie(Li, arrays, *primaryBits[i]))
+        return tries
+
+
+
+
+# ----- Decoding lookup tables ----- #
+
+# Number of bits resolved by the primary lookup table of each code index
+# Codewords longer than this use a secondary table selected by their last 'primaryBits' bits
+DECODING_LOOKUP_PRIMARY_BITS = 10
+
+# Flag of the entries of the primary lookup table pointing to a secondary table
+DECODING_LOOKUP_SECONDARY_FLAG = 0x80
+
+
+# Build the lookup table of the codes of one code index (list of (codeValue, codeLength, decodedValue))
+# The decoder reads the bitstream backwards, so the codewords are identified by their last bits:
+# the index of the table are the next 'primaryBits' bits to be read (peeked from the reverse reader)
+# Returns: (primaryBits, entries), with entries as a uint32 array of 2^primaryBits primary entries followed
+# by the secondary tables. Each entry packs a value (upper 24 bits) and a length (lower 8 bits):
+#   entry = decodedValue << 8 | codeLength when the codeword is resolved by the entry
+#   entry = secondaryStart << 8 | DECODING_LOOKUP_SECONDARY_FLAG | secondaryBits when the next 'secondaryBits'
+#   bits are needed, being the secondary table the entries from 'secondaryStart' on
+def buildDecodingLookupTable(codes, primaryBits=DECODING_LOOKUP_PRIMARY_BITS):
+    # Longest codewords first, so the shortest matching codeword is the one kept in each entry
+    # (as done when reading the bitstream bit by bit)
+    codes = sorted(codes, key=lambda code: -code[1])
+    maxCodeLength = codes[0][1]
+    primaryBits = min(primaryBits, maxCodeLength)
+    entries = [0] * (1 << primaryBits)
+    # Group the long codewords by their last 'primaryBits' bits
+    longCodes = {}
+    for codeValue, codeLength, decodedValue in codes:
+        if codeLength > primaryBits:
+            primaryIndex = codeValue & ((1 << primaryBits) - 1)
+            longCodes.setdefault(primaryIndex, []).append((codeValue >> primaryBits, codeLength - primaryBits, decodedValue))
+    # Secondary tables (the codeword length stored in their entries is the complete one)
+    for primaryIndex, secondaryCodes in sorted(longCodes.items()):
+        secondaryBits = secondaryCodes[0][1]
+        secondaryStart = len(entries)
+        entries += [0] * (1 << secondaryBits)
+        for codeValue, codeLength, decodedValue in secondaryCodes:
+            entries[secondaryStart + codeValue:secondaryStart + (1 << secondaryBits):(1 << codeLength)] = [decodedValue << 8 | (primaryBits + codeLength)] * (1 << (secondaryBits - codeLength))
+        entries[primaryIndex] = secondaryStart << 8 | DECODING_LOOKUP_SECONDARY_FLAG | secondaryBits
+    # Primary table
+    for codeValue, codeLength, decodedValue in codes:
+        if codeLength <= primaryBits:
+            entries[codeValue:(1 << primaryBits):(1 << codeLength)] = [decodedValue << 8 | codeLength] * (1 << (primaryBits - codeLength))
+    return (primaryBits, numpy.array(entries, dtype=numpy.uint32))
+
+
+
+
+# ----- Low-entropy code tries ----- #
+
+# Arrays of each trie (stored for all the code indexes in the compiled coding tables)
+#   transitions: transitions of each node, (nNodes, L(i)+2) flattened
+#   codeValues, codeLengths: output code of each complete input codeword
+#   codeSymbolOffsets, codeSymbols: input symbols of complete input codeword 'n' at the positions
+#   codeSymbolOffsets[n] to codeSymbolOffsets[n+1] of codeSymbols
+#   nodeSymbolOffsets, nodeSymbols: active prefix (input symbols) of each node, in the same way
+#   flushCodeValues, flushCodeLengths: output code of the flush codeword of each node
+#   lookupTable, flushLookupTable: decoding lookup table entries of the codes and flush codes (see buildDecodingLookupTable)
+TRIE_ARRAYS = [
+    ('transitions', '<i4'),
+    ('codeValues', '<u4'),
+    ('codeLengths', 'u1'),
+    ('codeSymbolOffsets', '<u4'),
+    ('codeSymbols', 'u1'),
+    ('nodeSymbolOffsets', '<u4'),
+    ('nodeSymbols', 'u1'),
+    ('flushCodeValues', '<u4'),
+    ('flushCodeLengths', 'u1'),
+    ('lookupTable', '<u4'),
+    ('flushLookupTable', '<u4'),
+]
+
+
+# Convert a list of symbol lists to (offsets, symbols) arrays
+def flattenSymbolLists(symbolLists):
+    offsets = numpy.zeros(len(symbolLists) + 1, dtype=numpy.uint32)
+    offsets[1:] = numpy.cumsum([len(symbols) for symbols in symbolLists])
+    symbols = numpy.array([symbol for symbols in symbolLists for symbol in symbols], dtype=numpy.uint8)
+    return offsets, symbols
+
+
+# Convert (offsets, symbols) arrays to a list of symbol lists
+def splitSymbolLists(offsets, symbols):
+    offsets = offsets.tolist()
+    symbols = symbols.tolist()
+    return [symbols[offsets[n]:offsets[n + 1]] for n in range(0, len(offsets) - 1)]
+
+
+# Input symbol of a character of an input codeword of the code with Input Simbol Limit L(i)
+def getTrieInputSymbol(character, Li):
+    symbol = SYMBOL_CHARACTERS.index(character)
+    if symbol == ESCAPE_SYMBOL:
+        return Li + 1
+    if symbol > Li:
+        raise ValueError('Input symbol {} greater than the Input Simbol Limit {}'.format(character, Li))
+    return symbol
+
+
+# Build the arrays of the trie of the variable-to-variable low-entropy code of one code index (see LowEntropyCodeTrie)
+# Li: Input Simbol Limit, L(i)
+# inputToOutputCodes, flushInputToOutputCodes: dictionaries with 'key' = 'input codeword' and the output codeword as a (codeValue, codeLength) pair
+# Returns: (arrays, primaryBits, flushPrimaryBits), with arrays as a dictionary with 'key' = name of TRIE_ARRAYS
+def buildLowEntropyCodeTrieArrays(Li, inputToOutputCodes, flushInputToOutputCodes):
+    escapeSymbol = Li + 1
+    # Active prefix (list of input symbols) and transitions of each node
+    nodeSymbols = [[]]
+    transitions = [[0] * (Li + 2)]
+    codes = []
+    codeSymbols = []
+    nodeIndexes = {'': 0}
+    for inputCodeWord, outputCode in inputToOutputCodes.items():
+        symbols = [getTrieInputSymbol(character, Li) for character in inputCodeWord]
+        # Nodes of all the proper prefixes of the input codeword
+        node = 0
+        for length in range(1, len(inputCodeWord)):
+            prefix = inputCodeWord[:length]
+            if prefix not in nodeIndexes:
+                nodeIndexes[prefix] = len(nodeSymbols)
+                nodeSymbols.append(symbols[:length])
+                transitions.append([0] * (Li + 2))
+                transitions[node][symbols[length - 1]] = nodeIndexes[prefix]
+            node = nodeIndexes[prefix]
+        transitions[node][symbols[-1]] = ~len(codes)
+        codes.append(outputCode)
+        codeSymbols.append(symbols)
+    # Flush codewords (one for each active prefix)
+    flushCodes = []
+    for symbols in nodeSymbols:
+        prefix = ''.join(SYMBOL_CHARACTERS[ESCAPE_SYMBOL if symbol == escapeSymbol else symbol] for symbol in symbols)
+        flushCodes.append(flushInputToOutputCodes[prefix])
+    # Lookup tables for decoding the output codewords
+    # The decoded values are the code (regular codewords) or the node (flush codewords)
+    primaryBits, lookupTable = buildDecodingLookupTable([(codeValue, codeLength, code) for code, (codeValue, codeLength) in enumerate(codes)])
+    flushPrimaryBits, flushLookupTable = buildDecodingLookupTable([(codeValue, codeLength, node) for node, (codeValue, codeLength) in enumerate(flushCodes)])
+    arrays = {'transitions': numpy.array(transitions, dtype=numpy.int32).ravel(), 'lookupTable': lookupTable, 'flushLookupTable': flushLookupTable}
+    arrays['codeValues'], arrays['codeLengths'] = [numpy.array(values, dtype=numpy.uint32) for values in zip(*codes)]
+    arrays['flushCodeValues'], arrays['flushCodeLengths'] = [numpy.array(values, dtype=numpy.uint32) for values in zip(*flushCodes)]
+    arrays['codeSymbolOffsets'], arrays['codeSymbols'] = flattenSymbolLists(codeSymbols)
+    arrays['nodeSymbolOffsets'], arrays['nodeSymbols'] = flattenSymbolLists(nodeSymbols)
+    return (arrays, primaryBits, flushPrimaryBits)
+
+
+# Integer trie of the variable-to-variable low-entropy code of one code index 'i'
+# Each node is one of the active prefixes the code can have (node 0: empty active prefix), and
+# the input symbols are the integers 0 ... L(i) (mapped residual values) and L(i)+1 (escape symbol 'X'),
+# so the input symbol of a low-entropy mapped residual δ(t) is min(δ(t), L(i)+1)
+#   transitions[node][symbol] >= 0: active prefix + symbol is the active prefix of the node 'transitions[node][symbol]'
+#   transitions[node][symbol] < 0: active prefix + symbol is the complete input codeword of the code '~transitions[node][symbol]'
+# The trie is built from its arrays (memory-mapped from the compiled coding tables, or built by
+# buildLowEntropyCodeTrieArrays), and the lists used by the coders and decoders are obtained from
+# them the first time they are used
+class LowEntropyCodeTrie():
+
+    def __init__(self, Li, arrays, primaryBits, flushPrimaryBits):
+        # Input Simbol Limit, L(i)
+        self.Li = Li
+        self.escapeSymbol = Li + 1
+        # Arrays of the trie (dictionary with 'key' = name of TRIE_ARRAYS)
+        self.arrays = arrays
+        # Bits resolved by the primary lookup tables
+        self.primaryBits = primaryBits
+        self.flushPrimaryBits = flushPrimaryBits
+
+
+    # Transitions of each node (list of lists, indexed by input symbol)
+    @functools.cached_property
+    def transitions(self):
+        return self.arrays['transitions'].reshape(-1, self.Li + 2).tolist()
+
+
+    # Output codes (codeValue, codeLength) of each complete input codeword
+    @functools.cached_property
+    def codes(self):
+        return list(zip(self.arrays['codeValues'].tolist(), self.arrays['codeLengths'].tolist()))
+
+
+    # Input symbols of each complete input codeword
+    @functools.cached_property
+    def codeSymbols(self):
+        return splitSymbolLists(self.arrays['codeSymbolOffsets'], self.arrays['codeSymbols'])
+
+
+    # Active prefix (list of input symbols) of each node
+    @functools.cached_property
+    def nodeSymbols(self):
+        return splitSymbolLists(self.arrays['nodeSymbolOffsets'], self.arrays['nodeSymbols'])
+
+
+    # Output codes (codeValue, codeLength) of the flush codeword of each node
+    @functools.cached_property
+    def flushCodes(self):
+        return list(zip(self.arrays['flushCodeValues'].tolist(), self.arrays['flushCodeLengths'].tolist()))
+
+
+    # Lookup tables for decoding the output codewords as (primaryBits, entries) (see buildDecodingLookupTable)
+    # The decoded values are the code (regular codewords) or the node (flush codewords)
+    @functools.cached_property
+    def decodingLookupTable(self):
+        return (self.primaryBits, self.arrays['lookupTable'].tolist())
+
+
+    @functools.cached_property
+    def flushDecodingLookupTable(self):
+        return (self.flushPrimaryBits, self.arrays['flushLookupTable'].tolist())
+
+
+    def getNumberOfNodes(self):
+        return len(self.arrays['nodeSymbolOffsets']) - 1
+
+
+    # Input codewords (strings) of a list of symbol lists
+    def getInputCodeWords(self, symbolLists):
+        characters = SYMBOL_CHARACTERS[:self.Li + 1] + SYMBOL_CHARACTERS[ESCAPE_SYMBOL]
+        return [''.join([characters[symbol] for symbol in symbols]) for symbols in symbolLists]
+
+
+    # Code table (input to output) as a dictionary with 'key' = 'input codeword' and the output
+    # codeword as a (codeValue, codeLength) pair
+    # The flush codewords are the active prefixes of the nodes
+    def getInputToOutputCodes(self, flush=False):
+        if flush:
+            return dict(zip(self.getInputCodeWords(self.nodeSymbols), self.flushCodes))
+        return dict(zip(self.getInputCodeWords(self.codeSymbols), self.codes))
+
+
+# Build the tries for all the code indexes
+# Table_InputSimbolLimitAndThreshold: list of [i, Li, Ti]
+# Table_InputToOutputCodes, Table_FlushInputToOutputCodes: lists of dictionaries with 'key' = 'input codeword'
+def buildLowEntropyCodeTries(Table_InputSimbolLimitAndThreshold, Table_InputToOutputCodes, Table_FlushInputToOutputCodes):
+    tries = []
+    for (i, Li, Ti), inputToOutputCodes, flushInputToOutputCodes in zip(Table_InputSimbolLimitAndThreshold, Table_InputToOutputCodes, Table_FlushInputToOutputCodes):
+        tries.append(LowEntropyCodeTrie(Li, *buildLowEntropyCodeTrieArrays(Li, inputToOutputCodes, flushInputToOutputCodes)))
+    return tries
+
+
+
+
+# ----- Shared coding tables ----- #
+
+# Every form of the coding tables used by the coders and decoders
+# Each form is loaded (or built) the first time it is requested, and then kept for
+# the rest of the process. The returned tables are shared and must not be modified
+class HybridCodingTableSet():
+
+    def __init__(self, compiledTablesPath=COMPILED_CODING_TABLES_PATH):
+        # Compiled coding tables path (the pickle files are used if it does not exist)
+        self.compiledTablesPath = compiledTablesPath
+        self.compiledTables = None
+        self.compiledTablesChecked = False
+        # Already loaded tables (dictionary with 'key' = (table name, flush))
+        self.tables = {}
+        self.lock = threading.RLock()
+
+
+    # Compiled coding tables (None if they have not been compiled, or if they are older than the pickle files)
+    def getCompiledTables(self):
+        if not self.compiledTablesChecked:
+            self.compiledTablesChecked = True
+            if os.path.isfile(self.compiledTablesPath):
+                compiledTables = CompiledCodingTables(self.compiledTablesPath)
+                if compiledTables.isStale():
+                    warnings.warn('{} is older than the pickle coding tables, using the pickle files (run HybridCodingTables.py to compile them again)'.format(self.compiledTablesPath))
+                else:
+                    self.compiledTables = compiledTables
+        return self.compiledTables
+
+
+    # Get a table form, loading it if it is requested for the first time
+    def getTable(self, name, flush=False):
+        key = (name, flush)
+        table = self.tables.get(key)
+        if table is None:
+            with self.lock:
+                table = self.tables.get(key)
+                if table is None:
+                    table = self.loadTable(name, flush)
+                    self.tables[key] = table
+        return table
+
+
+    # Load a table form from the compiled coding tables or from the pickle files
+    def loadTable(self, name, flush):
+        compiledTables = self.getCompiledTables()
+        if name == 'InputSymbolLimitAndThreshold':
+            if compiledTables is not None:
+                return compiledTables.getInputSymbolLimitAndThresholdTable()
+            return loadPickleFile(INPUT_SYMBOL_LIMIT_AND_THRESHOLD_TABLE_PATH)
+        if name == 'InputToOutputCodeWords':
+            if compiledTables is not None:
+                return convertIntegerCodesToCodeWords(self.getTable('InputToOutputCodes', flush))
+            return loadPickleFile(FLUSH_INPUT_TO_OUTPUT_CODEWORDS if flush else INPUT_TO_OUTPUT_CODEWORDS)
+        if name == 'InputToOutputCodes':
+            # Built from the tries when the compiled coding tables are used
+            if compiledTables is not None:
+                return [trie.getInputToOutputCodes(flush) for trie in self.getTable('LowEntropyCodeTries')]
+            return convertCodeWordsToIntegerCodes(self.getTable('InputToOutputCodeWords', flush))
+        if name == 'LowEntropyCodeTries':
+            if compiledTables is not None:
+                return compiledTables.getLowEntropyCodeTries()
+            # The tries include the codes of both the regular and the flush tables
+            return buildLowEntropyCodeTries(self.getTable('InputSymbolLimitAndThreshold'), self.getTable('InputToOutputCodes'), self.getTable('InputToOutputCodes', flush=True))
+        raise ValueError('Unknown coding table: {}'.format(name))
+
+
+    # Load the table forms used by the coders and decoders
+    # (the tries are built from the integer codes when the pickle files are used)
+    def loadAllTables(self):
+        self.getTable('InputSymbolLimitAndThreshold')
+        self.getTable('LowEntropyCodeTries')
+
+
+# Coding tables shared by all the coder and decoder instances of the process
+sharedCodingTables = HybridCodingTableSet()
+
+
+# Get the coding tables shared by all the coder and decoder instances of the process
+def getCodingTables():
+    return sharedCodingTables
+
+
+# Load all the shared coding tables
+# Calling it before creating a process pool (fork start method) lets the workers inherit
+# the already loaded tables instead of loading them again
+def preloadCodingTables():
+    sharedCodingTables.loadAllTables()
+    return sharedCodingTables
+
+
+
+
+if(__name__ == "__main__"):
+
+    # Compile the pickle coding tables
+    compileCodingTables()
+    print('Compiled coding tables: {}'.format(COMPILED_CODING_TABLES_PATH))
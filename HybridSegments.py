@@ -0,0 +1,222 @@
+import numpy
+import struct
+import math
+
+import Coder_Hybrid_Mod
+import Decoder_Hybrid_rg
+from HybridCodingTables import preloadCodingTables
+from ParallelSegments import mapSegments
+
+
+
+# ----- Segmented hybrid container ----- #
+
+# The 1D input vector is split into segments coded independently with the hybrid coder (Coder_Hybrid_Mod),
+# each one with its own initial accumulator and counter, and its own image tail. Every segment can be
+# decoded on its own (Decoder_Hybrid_rg), so the segments are coded and decoded in parallel processes
+# and the decoder does not need to start from the end of the file
+#
+# File format (big-endian):
+#   Header: magic, version, number of segments (uint32 each), D, Umax, ɣ^*, ɣ(0) (uint8 each), Σ(0) (uint64)
+#   Index: number of mapped residuals of each segment (uint64 each)
+#          byte offset of each segment and of the end of the file (uint64 each)
+#   Segments: hybrid bitstreams (without header)
+CONTAINER_MAGIC = 0x31534748   # 'HGS1'
+CONTAINER_VERSION = 1
+CONTAINER_HEADER_FORMAT = '>IIIBBBBQ'
+
+# Default number of mapped residuals of each segment
+DEFAULT_SEGMENT_SIZE = 65536
+
+
+
+
+# ----- Utils general functions ----- #
+
+# Lengths of the segments of a vector of 'nSamples' mapped residuals
+def getSegmentLengths(nSamples, segmentSize=DEFAULT_SEGMENT_SIZE):
+    nSegments = max(1, math.ceil(nSamples / segmentSize))
+    segmentLengths = [segmentSize] * nSegments
+    segmentLengths[-1] = nSamples - segmentSize * (nSegments - 1)
+    return segmentLengths
+
+
+# Code one segment (arguments as a tuple, so it can be sent to the worker processes)
+def codeSegment(arguments):
+    (segment, dynamicRangeInBits, Umax, gamma, gamma_0, Sigma_0) = arguments
+    coder = Coder_Hybrid_Mod.HybridCoder()
+    coder.setConfigurationParameters(Umax, gamma, gamma_0, Sigma_0)
+    return coder.codeToBytes(dynamicRangeInBits, '', segment)
+
+
+# Decode one segment (arguments as a tuple, so it can be sent to the worker processes)
+def decodeSegment(arguments):
+    (bitStream, nSamples, dynamicRangeInBits, Umax, gamma, gamma_0) = arguments
+    decoder = Decoder_Hybrid_rg.HybridDecoder()
+    return decoder.decodeBitStream(bitStream, Umax, gamma, gamma_0, dynamicRangeInBits, nSamples).reshape(nSamples)
+
+
+
+
+# ----- Container index ----- #
+
+# Header and index of a segmented hybrid file
+class SegmentIndex():
+
+    def __init__(self):
+        # Coding parameters (the same ones for all the segments)
+        self.dynamicRangeInBits = None
+        self.Umax = None
+        self.gamma = None
+        self.gamma_0 = None
+        self.Sigma_0 = None
+        # Number of mapped residuals of each segment
+        self.segmentLengths = None
+        # Byte offset of each segment in the file (and of the end of the file)
+        self.segmentOffsets = None
+
+
+    def getNumberOfSegments(self):
+        return len(self.segmentLengths)
+
+
+    # Position of the first mapped residual of each segment in the vector (and total number of mapped residuals)
+    def getSegmentStarts(self):
+        return [0] + numpy.cumsum(self.segmentLengths).tolist()
+
+
+    def toBytes(self):
+        header = struct.pack(CONTAINER_HEADER_FORMAT, CONTAINER_MAGIC, CONTAINER_VERSION, len(self.segmentLengths),
+                             self.dynamicRangeInBits, self.Umax, self.gamma, self.gamma_0, self.Sigma_0)
+        return header + numpy.array(self.segmentLengths + self.segmentOffsets, dtype='>u8').tobytes()
+
+
+    # Size (in bytes) of the header and the index
+    def getSize(self):
+        return struct.calcsize(CONTAINER_HEADER_FORMAT) + 8 * (2 * len(self.segmentLengths) + 1)
+
+
+# Read the header and the index of a segmented hybrid file
+def readSegmentIndex(filePath):
+    segmentIndex = SegmentIndex()
+    filePointer = open(filePath, 'rb')
+    headerSize = struct.calcsize(CONTAINER_HEADER_FORMAT)
+    (magic, version, nSegments, segmentIndex.dynamicRangeInBits, segmentIndex.Umax, segmentIndex.gamma,
+     segmentIndex.gamma_0, segmentIndex.Sigma_0) = struct.unpack(CONTAINER_HEADER_FORMAT, filePointer.read(headerSize))
+    if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+        filePointer.close()
+        raise ValueError('{} is not a segmented hybrid file (version {})'.format(filePath, CONTAINER_VERSION))
+    index = numpy.frombuffer(filePointer.read(8 * (2 * nSegments + 1)), dtype='>u8').tolist()
+    filePointer.close()
+    segmentIndex.segmentLengths = index[:nSegments]
+    segmentIndex.segmentOffsets = index[nSegments:]
+    return segmentIndex
+
+
+# Read the bitstream of one segment of a segmented hybrid file (without reading the rest of segments)
+def readSegmentBitStream(filePath, segmentIndex, segment):
+    return readSegmentBitStreams(filePath, segmentIndex, [segment])[0]
+
+
+# Read only the bytes of the segments 'segments' (list of segment numbers) of a segmented hybrid file
+def readSegmentBitStreams(filePath, segmentIndex, segments):
+    bitStreams = []
+    filePointer = open(filePath, 'rb')
+    for segment in segments:
+        filePointer.seek(segmentIndex.segmentOffsets[segment])
+        bitStreams.append(filePointer.read(segmentIndex.segmentOffsets[segment + 1] - segmentIndex.segmentOffsets[segment]))
+    filePointer.close()
+    return bitStreams
+
+
+
+
+# ----- Coding and decoding ----- #
+
+# Code a 1D vector of mapped residuals as independently coded segments
+# Inputs:
+#   vector: mapped residuals
+#   segmentLengths: number of mapped residuals of each segment (by default, segments of DEFAULT_SEGMENT_SIZE)
+#   nWorkers: number of processes coding the segments (None or 1: sequential coding)
+# Returns the index of the file
+def encodeParallel(vector, dynamicRangeInBits, outputFilePath, segmentLengths=None, nWorkers=None, Umax=32, gamma=4, gamma_0=1, Sigma_0=32768):
+    vector = numpy.asarray(vector).ravel()
+    if segmentLengths is None:
+        segmentLengths = getSegmentLengths(vector.size)
+    segmentLengths = [int(segmentLength) for segmentLength in segmentLengths]
+    if sum(segmentLengths) != vector.size or min(segmentLengths) < 1:
+        raise ValueError('The segment lengths do not match the {} elements of the vector'.format(vector.size))
+    segments = numpy.split(vector, numpy.cumsum(segmentLengths)[:-1])
+    return encodeSegments(segments, segmentLengths, dynamicRangeInBits, outputFilePath, nWorkers, Umax, gamma, gamma_0, Sigma_0)
+
+
+# Code the segments of an iterable (list, generator...) whose lengths are 'segmentLengths' as a segmented hybrid file
+# With sequential coding (nWorkers None or 1) each segment is requested when it is going to be coded, so only
+# one segment has to be in memory at the same time
+def encodeSegments(segments, segmentLengths, dynamicRangeInBits, outputFilePath, nWorkers=None, Umax=32, gamma=4, gamma_0=1, Sigma_0=32768):
+    # Coding parameters as clipped by the coder
+    coder = Coder_Hybrid_Mod.HybridCoder()
+    coder.setConfigurationParameters(Umax, gamma, gamma_0, Sigma_0)
+    segmentIndex = SegmentIndex()
+    segmentIndex.dynamicRangeInBits = dynamicRangeInBits
+    segmentIndex.Umax = coder.Umax
+    segmentIndex.gamma = coder.gamma
+    segmentIndex.gamma_0 = coder.gamma_0
+    segmentIndex.Sigma_0 = coder.Sigma_0
+    segmentIndex.segmentLengths = [int(segmentLength) for segmentLength in segmentLengths]
+    # The workers inherit the already loaded coding tables
+    preloadCodingTables()
+    arguments = ((segment, dynamicRangeInBits, coder.Umax, coder.gamma, coder.gamma_0, coder.Sigma_0) for segment in segments)
+    bitStreams = mapSegments(codeSegment, nWorkers, arguments)
+    # Index and file
+    offset = segmentIndex.getSize()
+    segmentIndex.segmentOffsets = [offset]
+    for bitStream in bitStreams:
+        offset = offset + len(bitStream)
+        segmentIndex.segmentOffsets.append(offset)
+    filePointer = open(outputFilePath, 'wb')
+    filePointer.write(segmentIndex.toBytes())
+    for bitStream in bitStreams:
+        filePointer.write(bitStream)
+    filePointer.close()
+    return segmentIndex
+
+
+# Decode the segments 'segments' (list of segment numbers, all of them by default) of a segmented hybrid file
+# (only the index and the requested segments are read)
+# Returns the concatenation of the decoded segments (uint16, as Decoder_Hybrid_rg)
+def decodeParallel(filePath, nWorkers=None, segments=None):
+    segmentIndex = readSegmentIndex(filePath)
+    if segments is None:
+        segments = range(0, segmentIndex.getNumberOfSegments())
+    segments = list(segments)
+    bitStreams = readSegmentBitStreams(filePath, segmentIndex, segments)
+    arguments = [(bitStream, segmentIndex.segmentLengths[segment], segmentIndex.dynamicRangeInBits,
+                  segmentIndex.Umax, segmentIndex.gamma, segmentIndex.gamma_0) for bitStream, segment in zip(bitStreams, segments)]
+    preloadCodingTables()
+    decodedSegments = mapSegments(decodeSegment, nWorkers, arguments)
+    if len(decodedSegments) == 0:
+        return numpy.zeros(0, dtype='uint16')
+    return numpy.concatenate(decodedSegments)
+
+
+
+
+
+# ----- HyperLCA blocks ----- #
+
+# Code the 1D vector of a Data_Adapter.Adapter with one segment per HyperLCA block, so any block can be
+# decoded on its own (decodeBlock)
+# The blocks are adapted one by one (Data_Adapter.Adapter.IterateBlocks), the 1D vector is never built
+def encodeBlocks(adapter, numBlocks, dynamicRangeInBits, outputFilePath, nWorkers=None, Umax=32, gamma=4, gamma_0=1, Sigma_0=32768):
+    return encodeSegments(adapter.IterateBlocks(numBlocks), adapter.GetBlockLengths(numBlocks), dynamicRangeInBits, outputFilePath, nWorkers, Umax, gamma, gamma_0, Sigma_0)
+
+
+# Decode only the block 'b' of a file coded with encodeBlocks (only its index and the segment of the block are read)
+# Returns the 1D vector of the block (it can be split with Data_Adapter.Adapter.SplitBlockVector)
+def decodeBlock(filePath, b):
+    segmentIndex = readSegmentIndex(filePath)
+    if b < 0 or b >= segmentIndex.getNumberOfSegments():
+        raise IndexError('Block {} out of range ({} blocks)'.format(b, segmentIndex.getNumberOfSegments()))
+    bitStream = readSegmentBitStream(filePath, segmentIndex, b)
+    return decodeSegment((bitStream, segmentIndex.segmentLengths[b], segmentIndex.dynamicRangeInBits, segmentIndex.Umax, segmentIndex.gamma, segmentIndex.gamma_0))
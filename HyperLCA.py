@@ -0,0 +1,441 @@
+import numpy
+import math
+
+
+
+# ----- HyperLCA compressor and decompressor ----- #
+
+# Python version of the MATLAB functions of 'MatlabCodes' (HyperLCA_Transform.m, HyperLCA_Prediction_Mapper.m,
+# Inverse_HyperLCA_Prediction_Mapper.m, Inverse_HyperLCA_Transform.m and MainHyperLCA_Test_mod.m).
+# The functions keep the MATLAB names, inputs and outputs:
+#   ImgBlock: hyperspectral image pixels placed in columns (nb x np)
+#   Pixels: extracted pixels (nb x pmax)
+#   Projections: projection vectors (pmax x np)
+#   averagePixel: average pixel (nb x 1)
+
+
+
+
+# ----- Utils general functions ----- #
+
+# MATLAB int16(x) for double values: round half away from zero and saturate to [-32768, 32767]
+def roundToInt16(x):
+    integerPart = numpy.trunc(x)
+    rounded = integerPart + numpy.where(numpy.abs(x - integerPart) >= 0.5, numpy.sign(x), 0)
+    return numpy.clip(rounded, -32768, 32767)
+
+
+# Number of pixels and projection vectors extracted from each block for the desired compression ratio
+def computePmax(blockSize, nb, DR_Pixels, DR_Projections, desiredCR):
+    num = blockSize * nb * DR_Pixels / desiredCR - nb * DR_Pixels
+    den = blockSize * DR_Projections + nb * DR_Pixels
+    return math.floor(num / den)
+
+
+# Read an image file (multibandread of MainHyperLCA_Test_mod.m, 'bip' with little-endian uint16 values)
+# and store it as a single matrix (nb x np), with the pixels in the MATLAB (column-major) order
+def readImageAsMatrix(filePath, nr, nc, nb):
+    Img = numpy.fromfile(filePath, dtype='<u2', count=nr * nc * nb).reshape(nr, nc, nb)
+    return Img.transpose(1, 0, 2).reshape(nr * nc, nb).T.astype(numpy.float64)
+
+
+
+
+# ----- Transform ----- #
+
+# Number of iterations of the transform between two exact computations of the energy of the residual pixels
+# (energyRefreshPeriod). In the other iterations the energy is downdated, since the projection j removes
+# projection_j^2 · (q_j · q_j) from the energy of each pixel
+# The downdating gives the same results as the exact energy (same maxIndex sequence and projections), but it only
+# saves the energy computation: each iteration still deflates the residual and projects it (two passes over the
+# block), so it is about 5-20% faster (224 bands, 1024 pixels: 16.6 -> 15.6 ms with pmax = 14, 60.9 -> 49.4 ms
+# with pmax = 57, see benchmark.py). The large speed-up (about 3-4x) only comes from the lazy deflation below,
+# which is not the default because it does not give the MATLAB projections
+ENERGY_REFRESH_PERIOD = 8
+
+# Number of iterations between two deflations of the residual image with the lazy deflation (deflationPeriod > 1,
+# not used by default). The lazy deflation selects the same pixels, but the rounding of some scaled projections
+# can change by one, so the transforms deflate the residual in every iteration by default (deflationPeriod = 1)
+LAZY_DEFLATION_PERIOD = 8
+
+
+# HyperLCA transform of one image block (HyperLCA_Transform.m)
+# The brightest pixel is selected with the downdated energy of the residual pixels, which is computed exactly every
+# 'energyRefreshPeriod' iterations (energyRefreshPeriod = 1: exact energy in every iteration, as in the MATLAB function)
+# With deflationPeriod = 1 (default) the residual is deflated in every iteration, as in the MATLAB function, so the
+# projections are the exact ones. With deflationPeriod > 1 the residual image is deflated lazily: it is only computed
+# every 'deflationPeriod' iterations, with a single matrix product of the pending projections (and its energy is
+# computed exactly), and between two deflations the selected pixel q and the projection are corrected with the pending
+# vectors (Q) and projections. The scaled projections of the already selected pixels (exact values 0 or 1) can then
+# differ by one
+def HyperLCA_Transform(ImgBlock, pmax, DR_Projections, energyRefreshPeriod=ENERGY_REFRESH_PERIOD, deflationPeriod=1):
+    # Auxiliary copy of the image
+    # (always in 'C' order: the rounding of the matrix products, and so the floored projections, depends on the
+    # memory layout, and HyperLCA_TransformBlocks uses this one)
+    AuxImgBlock = numpy.ascontiguousarray(ImgBlock, dtype=numpy.float64)
+    nb, np = AuxImgBlock.shape
+    Pixels = numpy.empty((nb, pmax))
+    Projections = numpy.empty((pmax, np))
+    Q = numpy.empty((nb, pmax))
+    # Subtract the average pixel to the entire image
+    averagePixel = roundToInt16(AuxImgBlock.mean(axis=1, keepdims=True))
+    ImgBlock = AuxImgBlock - averagePixel
+    # Iterations whose projections have not been removed from ImgBlock yet: deflation ... j - 1
+    deflation = 0
+    # Last iteration with the energy computed exactly
+    energyRefresh = 0
+    for j in range(0, pmax):
+        # Remove the pending projections from the image
+        if j - deflation == deflationPeriod:
+            if deflationPeriod == 1:
+                ImgBlock -= numpy.outer(Q[:, deflation], Projections[deflation, :])
+            else:
+                ImgBlock -= Q[:, deflation:j] @ Projections[deflation:j, :]
+            deflation = j
+        # Select the next vector as the brightest pixel of the image (first one in case of ties, as MATLAB max)
+        if j == deflation and (j == 0 or deflationPeriod > 1 or j - energyRefresh == energyRefreshPeriod):
+            ImgError = numpy.einsum('ij,ij->j', ImgBlock, ImgBlock)
+            energyRefresh = j
+        else:
+            ImgError -= Projections[j - 1, :]**2 * qq
+        maxIndex = numpy.argmax(ImgError)
+        q = ImgBlock[:, maxIndex] - Q[:, deflation:j] @ Projections[deflation:j, maxIndex]
+        qq = q @ q
+        u = q / qq
+        Q[:, j] = q
+        # Compressed data to be send: maxIndex
+        Pixels[:, j] = AuxImgBlock[:, maxIndex]
+        projection = u @ ImgBlock
+        if j > deflation:
+            projection -= (u @ Q[:, deflation:j]) @ Projections[deflation:j, :]
+        Projections[j, :] = projection
+    # Scaling projection vectors
+    scalingFactor = (2**(DR_Projections - 1) - 1)
+    Projections = numpy.floor((Projections + 1) * scalingFactor)
+    return Pixels, Projections, averagePixel
+
+
+
+
+# ----- Multi-block transform ----- #
+
+# Number of blocks transformed at the same time by HyperLCA_TransformBlocks (small batches keep the
+# residuals of the batch in cache)
+BLOCKS_PER_BATCH = 8
+
+
+# Image blocks (numBlocks x nb x blockSize) of an image matrix (nb x np): consecutive groups of 'blockSize' pixels
+# (the blocks of MainHyperLCA_Test_mod.m for i = 1, without the column shared by consecutive blocks in its loop)
+def getImageBlocks(ImgVect, blockSize, numBlocks):
+    nb = ImgVect.shape[0]
+    return ImgVect[:, 0:numBlocks * blockSize].reshape(nb, numBlocks, blockSize).transpose(1, 0, 2)
+
+
+# HyperLCA transform of several image blocks at once (ImgBlocks: numBlocks x nb x blockSize)
+# Every block runs the same 'pmax' iterations, so the means, the energies, the selection of the brightest pixels,
+# the projections and the deflations are computed for all the blocks of a batch with batched operations
+# The results are written directly in the layout of the concatenated outputs of MainHyperLCA_Test_mod.m (the
+# layout of the PM_* arrays read by Data_Adapter):
+#   Pixels: nb x (numBlocks · pmax), the pixels of each block in consecutive columns
+#   Projections: pmax x (numBlocks · blockSize), the projection vectors of each block in consecutive columns
+#   averagePixel: nb x numBlocks, one column per block
+def HyperLCA_TransformBlocks(ImgBlocks, pmax, DR_Projections, blocksPerBatch=BLOCKS_PER_BATCH, energyRefreshPeriod=ENERGY_REFRESH_PERIOD, deflationPeriod=1):
+    numBlocks, nb, blockSize = ImgBlocks.shape
+    Pixels = numpy.empty((nb, numBlocks * pmax))
+    Projections = numpy.empty((pmax, numBlocks * blockSize))
+    averagePixel = numpy.empty((nb, numBlocks))
+    # Views of the outputs indexed by block
+    PixelsView = Pixels.reshape(nb, numBlocks, pmax)
+    ProjectionsView = Projections.reshape(pmax, numBlocks, blockSize)
+    for firstBlock in range(0, numBlocks, blocksPerBatch):
+        blocks = slice(firstBlock, min(firstBlock + blocksPerBatch, numBlocks))
+        AuxImgBlocks = numpy.ascontiguousarray(ImgBlocks[blocks], dtype=numpy.float64)
+        blockIndexes = numpy.arange(AuxImgBlocks.shape[0])
+        # Projections and selected vectors of the batch (energy downdating and deflation as in HyperLCA_Transform)
+        BatchProjections = numpy.empty((AuxImgBlocks.shape[0], pmax, blockSize))
+        Q = numpy.empty((AuxImgBlocks.shape[0], nb, pmax))
+        # Subtract the average pixel to each block
+        batchAveragePixel = roundToInt16(AuxImgBlocks.mean(axis=2, keepdims=True))
+        averagePixel[:, blocks] = batchAveragePixel[:, :, 0].T
+        Residuals = AuxImgBlocks - batchAveragePixel
+        deflation = 0
+        energyRefresh = 0
+        for j in range(0, pmax):
+            # Remove the pending projections from each block
+            if j - deflation == deflationPeriod:
+                if deflationPeriod == 1:
+                    Residuals -= Q[:, :, deflation, None] * BatchProjections[:, deflation, None, :]
+                else:
+                    Residuals -= numpy.matmul(Q[:, :, deflation:j], BatchProjections[:, deflation:j, :])
+                deflation = j
+            # Brightest pixel of each block
+            if j == deflation and (j == 0 or deflationPeriod > 1 or j - energyRefresh == energyRefreshPeriod):
+                ImgError = numpy.einsum('kij,kij->kj', Residuals, Residuals)
+                energyRefresh = j
+            else:
+                ImgError -= BatchProjections[:, j - 1, :]**2 * qq
+            maxIndex = numpy.argmax(ImgError, axis=1)
+            q = Residuals[blockIndexes, :, maxIndex] - numpy.matmul(Q[:, :, deflation:j], BatchProjections[blockIndexes, deflation:j, maxIndex, None])[:, :, 0]
+            qq = numpy.matmul(q[:, None, :], q[:, :, None])[:, 0]
+            u = q / qq
+            Q[:, :, j] = q
+            PixelsView[:, blocks, j] = AuxImgBlocks[blockIndexes, :, maxIndex].T
+            projection = numpy.matmul(u[:, None, :], Residuals)[:, 0, :]
+            if j > deflation:
+                projection -= numpy.matmul(numpy.matmul(u[:, None, :], Q[:, :, deflation:j]), BatchProjections[:, deflation:j, :])[:, 0, :]
+            BatchProjections[:, j, :] = projection
+        ProjectionsView[:, blocks, :] = BatchProjections.transpose(1, 0, 2)
+    # Scaling projection vectors
+    scalingFactor = (2**(DR_Projections - 1) - 1)
+    Projections += 1
+    Projections *= scalingFactor
+    numpy.floor(Projections, out=Projections)
+    return Pixels, Projections, averagePixel
+
+
+
+
+# ----- Prediction mapper ----- #
+
+# Mapped residual of the value 'v' predicted by 'pv' (mapPredictedValue of HyperLCA_Prediction_Mapper.m)
+def mapPredictedValue(xMin, xMax, v, pv):
+    prediction = pv
+    increment = v - prediction
+    tita = min(prediction - xMin, xMax - prediction)
+    if 0 <= increment and increment <= tita:
+        MR = 2 * increment
+    elif -tita <= increment and increment < 0:
+        MR = 2 * abs(increment) - 1
+    else:
+        MR = tita + abs(increment)
+    return MR
+
+
+# mapPredictedValue for arrays of values and predictions
+def mapPredictedValues(xMin, xMax, v, pv):
+    increment = v - pv
+    tita = numpy.minimum(pv - xMin, xMax - pv)
+    return numpy.where((0 <= increment) & (increment <= tita), 2 * increment,
+                       numpy.where((-tita <= increment) & (increment < 0), 2 * numpy.abs(increment) - 1, tita + numpy.abs(increment)))
+
+
+# HyperLCA prediction mapper (HyperLCA_Prediction_Mapper.m)
+# Each value is predicted by the previous one (previous band for the average pixel and the pixels, previous
+# sample for the projections), so all the values are mapped at once from the input arrays
+# As in the MATLAB function, 'np' is the number of rows of Projections, so only the samples 2 ... pmax of each
+# projection vector are mapped
+def HyperLCA_Prediction_Mapper(Pixels, Projections, averagePixel, DR_pixels, DR_Projections):
+    pmax = Pixels.shape[1]
+    np = min(Projections.shape[0], Projections.shape[1])
+    # Centroid
+    xMin = 0
+    xMax = 2**DR_pixels - 1
+    mappedAveragePixel = numpy.array(averagePixel, dtype=numpy.float64)
+    mappedAveragePixel[1:] = mapPredictedValues(xMin, xMax, averagePixel[1:], averagePixel[:-1])
+    # Pixels
+    mappedPixels = numpy.array(Pixels, dtype=numpy.float64)
+    mappedPixels[1:, :pmax] = mapPredictedValues(xMin, xMax, Pixels[1:, :pmax], Pixels[:-1, :pmax])
+    # Projections
+    xMin = 0
+    xMax = 2**DR_Projections - 1
+    mappedProjections = numpy.array(Projections, dtype=numpy.float64)
+    mappedProjections[:pmax, 1:np] = mapPredictedValues(xMin, xMax, Projections[:pmax, 1:np], Projections[:pmax, :np - 1])
+    return mappedPixels, mappedProjections, mappedAveragePixel
+
+
+# HyperLCA prediction mapper of the outputs of HyperLCA_TransformBlocks (each block mapped as in HyperLCA_Prediction_Mapper)
+def HyperLCA_Prediction_MapperBlocks(Pixels, Projections, averagePixel, DR_pixels, DR_Projections):
+    nb, numBlocks = averagePixel.shape
+    pmax = Pixels.shape[1] // numBlocks
+    ProjectionsView = Projections.reshape(pmax, numBlocks, -1)
+    np = min(pmax, ProjectionsView.shape[2])
+    # Centroids and pixels (each column predicted along the bands)
+    xMin = 0
+    xMax = 2**DR_pixels - 1
+    mappedAveragePixel = numpy.array(averagePixel, dtype=numpy.float64)
+    mappedAveragePixel[1:] = mapPredictedValues(xMin, xMax, averagePixel[1:], averagePixel[:-1])
+    mappedPixels = numpy.array(Pixels, dtype=numpy.float64)
+    mappedPixels[1:] = mapPredictedValues(xMin, xMax, Pixels[1:], Pixels[:-1])
+    # Projections (samples 2 ... pmax of each projection vector of each block)
+    xMin = 0
+    xMax = 2**DR_Projections - 1
+    mappedProjections = numpy.array(Projections, dtype=numpy.float64)
+    mappedProjections.reshape(pmax, numBlocks, -1)[:, :, 1:np] = mapPredictedValues(xMin, xMax, ProjectionsView[:, :, 1:np], ProjectionsView[:, :, :np - 1])
+    return mappedPixels, mappedProjections, mappedAveragePixel
+
+
+# HyperLCA compressor of the first 'numBlocks' blocks of an image matrix (nb x np) (MainHyperLCA_Test_mod.m)
+# Returns PM_Pixels, PM_Projections and PM_Centroid
+# The blocks are the ones of getImageBlocks, so the first block is the one of MainHyperLCA_Test_mod.m, but the
+# following ones do not include the column shared with the previous block (see HyperLCA_CompressorPerBlock)
+def HyperLCA_Compressor(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections, energyRefreshPeriod=ENERGY_REFRESH_PERIOD, deflationPeriod=1):
+    Pixels, Projections, averagePixel = HyperLCA_TransformBlocks(getImageBlocks(ImgVect, blockSize, numBlocks), pmax, DR_Projections,
+                                                                 energyRefreshPeriod=energyRefreshPeriod, deflationPeriod=deflationPeriod)
+    return HyperLCA_Prediction_MapperBlocks(Pixels, Projections, averagePixel, DR_Pixels, DR_Projections)
+
+
+# HyperLCA compressor with the block loop of MainHyperLCA_Test_mod.m (reference for HyperLCA_Compressor)
+# As in the MATLAB loop ('aux'), each block after the first one starts at the last column of the previous
+# block, so it has blockSize + 1 columns, and the outputs of the blocks are concatenated
+def HyperLCA_CompressorPerBlock(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections):
+    PM_Pixels = []
+    PM_Projections = []
+    PM_Centroid = []
+    aux = 1
+    for i in range(1, numBlocks + 1):
+        ImgBlock = ImgVect[:, aux - 1:blockSize * i]
+        aux = blockSize * i
+        Pixels, Projections, averagePixel = HyperLCA_Transform(ImgBlock, pmax, DR_Projections, energyRefreshPeriod=1)
+        Pixels, Projections, averagePixel = HyperLCA_Prediction_Mapper(Pixels, Projections, averagePixel, DR_Pixels, DR_Projections)
+        PM_Pixels.append(Pixels)
+        PM_Projections.append(Projections)
+        PM_Centroid.append(averagePixel)
+    return numpy.hstack(PM_Pixels), numpy.hstack(PM_Projections), numpy.hstack(PM_Centroid)
+
+
+
+
+# ----- Inverse prediction mapper ----- #
+
+# Value predicted by 'pv' from its mapped residual 'v' (imapPredictedValue of Inverse_HyperLCA_Prediction_Mapper.m)
+def imapPredictedValue(xMin, xMax, v, pv):
+    prediction = pv
+    tita = min(prediction - xMin, xMax - prediction)
+    absIncrement = abs(v - tita)
+    if prediction + absIncrement <= xMax and prediction - absIncrement >= xMin:
+        if math.fmod(v, 2) == 0:
+            MR = prediction + v / 2
+        else:
+            MR = prediction - (v + 1) / 2
+    else:
+        if prediction + absIncrement <= xMax:
+            MR = prediction + absIncrement
+        else:
+            MR = prediction - absIncrement
+    return MR
+
+
+# imapPredictedValue for arrays of mapped residuals and predictions
+def imapPredictedValues(xMin, xMax, v, pv):
+    tita = numpy.minimum(pv - xMin, xMax - pv)
+    absIncrement = numpy.abs(v - tita)
+    small = (pv + absIncrement <= xMax) & (pv - absIncrement >= xMin)
+    smallValues = numpy.where(numpy.fmod(v, 2) == 0, pv + v / 2, pv - (v + 1) / 2)
+    largeValues = numpy.where(pv + absIncrement <= xMax, pv + absIncrement, pv - absIncrement)
+    return numpy.where(small, smallValues, largeValues)
+
+
+# Inverse of the prediction mapping along the first axis of 'mappedValues': each value is predicted by the
+# previous already recovered one, so the recurrence is solved one position at a time for all the columns at once
+def inverseMapAlongFirstAxis(xMin, xMax, mappedValues):
+    values = numpy.array(mappedValues, dtype=numpy.float64)
+    for i in range(1, values.shape[0]):
+        values[i] = imapPredictedValues(xMin, xMax, values[i], values[i - 1])
+    return values
+
+
+# HyperLCA inverse prediction mapper (Inverse_HyperLCA_Prediction_Mapper.m)
+# The average pixel is recovered together with the pixels (one more column), band by band, and the
+# projection vectors sample by sample. As in the MATLAB function, only the samples 2 ... pmax of each
+# projection vector are recovered (see HyperLCA_Prediction_Mapper)
+def Inverse_HyperLCA_Prediction_Mapper(Pixels, Projections, averagePixel, DR_pixels, DR_Projections):
+    pmax = Pixels.shape[1]
+    np = min(Projections.shape[0], Projections.shape[1])
+    # Centroid and pixels
+    xMin = 0
+    xMax = 2**DR_pixels - 1
+    columns = inverseMapAlongFirstAxis(xMin, xMax, numpy.hstack((numpy.reshape(averagePixel, (-1, 1)), Pixels)))
+    recoveredAveragePixel = columns[:, 0:1].reshape(numpy.shape(averagePixel))
+    recoveredPixels = columns[:, 1:]
+    # Projections
+    xMin = 0
+    xMax = 2**DR_Projections - 1
+    recoveredProjections = numpy.array(Projections, dtype=numpy.float64)
+    recoveredProjections[:pmax, :np] = inverseMapAlongFirstAxis(xMin, xMax, Projections[:pmax, :np].T).T
+    return recoveredPixels, recoveredProjections, recoveredAveragePixel
+
+
+
+
+# ----- Inverse transform ----- #
+
+# Gram-Schmidt orthogonalization of the extracted pixels (Inverse_HyperLCA_Transform.m)
+# Single (modified Gram-Schmidt) pass over preallocated Q and U: once the column 'j' is obtained, its
+# component is removed from the following columns only (the previous ones are not used anymore)
+def HyperLCA_GramSchmidt(Pixels):
+    nb, pmax = Pixels.shape
+    Q = numpy.array(Pixels, dtype=numpy.float64)
+    U = numpy.empty((nb, pmax))
+    for j in range(0, pmax):
+        U[:, j] = Q[:, j] / (Q[:, j] @ Q[:, j])
+        if j + 1 < pmax:
+            Q[:, j + 1:] -= numpy.outer(U[:, j], Q[:, j] @ Q[:, j + 1:])
+    return Q, U
+
+
+# HyperLCA inverse transform of one image block (Inverse_HyperLCA_Transform.m)
+# The image is reconstructed with a single matrix product: averagePixel + Q · Projections
+def Inverse_HyperLCA_Transform(Pixels, Projections, averagePixel, DR_Projections):
+    averagePixel = numpy.reshape(averagePixel, (-1, 1))
+    # Subtract the average pixel to the Pixels
+    Q, U = HyperLCA_GramSchmidt(Pixels - averagePixel)
+    # Scaling projection vectors
+    scalingFactor = (2**(DR_Projections - 1) - 1)
+    Projections = (Projections / scalingFactor) - 1
+    return averagePixel + Q @ Projections[0:Q.shape[1], :]
+
+
+
+
+# ----- Decompression of the decoded data ----- #
+
+# Split the vector of one block (Data_Adapter layout: average pixel, and each extracted pixel followed by its
+# projection vector) into the average pixel (nb x 1), the pixels (nb x pmax) and the projections (pmax x np)
+def splitBlockVector(blockVector, nb, pmax):
+    blockVector = numpy.asarray(blockVector, dtype=numpy.float64)
+    averagePixel = blockVector[0:nb].reshape(nb, 1)
+    endMembers = blockVector[nb:].reshape(pmax, -1)
+    return endMembers[:, 0:nb].T, endMembers[:, nb:], averagePixel
+
+
+# Image block (nb x np) from the decoded vector of the block (inverse prediction mapper and inverse transform)
+def decompressBlockVector(blockVector, nb, pmax, DR_Pixels, DR_Projections):
+    Pixels, Projections, averagePixel = splitBlockVector(blockVector, nb, pmax)
+    Pixels, Projections, averagePixel = Inverse_HyperLCA_Prediction_Mapper(Pixels, Projections, averagePixel, DR_Pixels, DR_Projections)
+    return Inverse_HyperLCA_Transform(Pixels, Projections, averagePixel, DR_Projections)
+
+
+
+
+if(__name__ == "__main__"):
+
+    import os
+
+    # Input parameters (MainHyperLCA_Test_mod.m)
+    imageFilePath = os.path.join('InputData', 'AVIRIS_LunarLake_BIP_LE')
+    nr = 512
+    nc = 512
+    nb = 224
+    desiredCR = 16
+    blockSize = 1024
+    DR_Pixels = 16
+    DR_Projections = 12
+    numBlocks = 1
+
+    # The image is not shipped with the repository (only the outputs of MainHyperLCA_Test_mod.m, in 'InputData')
+    if not os.path.isfile(imageFilePath):
+        print('Image not found: {} (the check against the MATLAB outputs can not be run)'.format(imageFilePath))
+    else:
+        ImgVect = readImageAsMatrix(imageFilePath, nr, nc, nb)
+        pmax = computePmax(blockSize, nb, DR_Pixels, DR_Projections, desiredCR)
+        # HyperLCA compressor (just one image block for tests)
+        PM_Pixels, PM_Projections, PM_Centroid = HyperLCA_Compressor(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections)
+        numpy.save(os.path.join('OutputData', 'PM_Pixels.npy'), PM_Pixels)
+        numpy.save(os.path.join('OutputData', 'PM_Projections.npy'), PM_Projections)
+        numpy.save(os.path.join('OutputData', 'PM_Centroid.npy'), PM_Centroid)
+        # Check against the outputs of MainHyperLCA_Test_mod.m (bit-identical integers)
+        referenceOutputs = [numpy.load(os.path.join('InputData', fileName)) for fileName in ['PM_Pixels.npy', 'PM_Projections.npy', 'PM_Centroid.npy']]
+        if all(numpy.array_equal(output, reference) for output, reference in zip([PM_Pixels, PM_Projections, PM_Centroid], referenceOutputs)):
+            print('Same outputs as MainHyperLCA_Test_mod.m')
+        else:
+            print('Outputs different from MainHyperLCA_Test_mod.m')
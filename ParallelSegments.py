@@ -0,0 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+
+# ----- Parallel processing of segments ----- #
+
+# Apply 'function' to each set of arguments, in a process pool if nWorkers > 1
+# (used by the coders that split their input into independently coded segments)
+def mapSegments(function, nWorkers, *arguments):
+    if nWorkers is None or nWorkers <= 1:
+        return list(map(function, *arguments))
+    with ProcessPoolExecutor(max_workers=nWorkers) as executor:
+        return list(executor.map(function, *arguments))
@@ -0,0 +1,308 @@
+import time
+import os
+import tempfile
+import math
+
+import numpy
+
+import HybridCodingTables
+from BitStream import BitStreamWriter, packCodes
+from GolombRiceCoder import GolombRiceCoder
+import Coder_Hybrid
+import Coder_Hybrid_Mod
+import Decoder_Hybrid
+import Decoder_Hybrid_rg
+import Decoder_Hybrid_Mod
+import HybridSegments
+import HyperLCA
+
+
+
+# ----- Utils general functions ----- #
+
+# Average time (in seconds) of 'nRepetitions' calls to 'function'
+def measureTime(function, nRepetitions):
+    startTime = time.perf_counter()
+    for repetition in range(0, nRepetitions):
+        function()
+    return (time.perf_counter() - startTime) / nRepetitions
+
+
+
+
+# ----- Benchmarks ----- #
+
+# Construction cost of each coder and decoder instance
+#   private tables: each instance loads its own coding tables (previous behaviour)
+#   shared tables: the instances use the coding tables already loaded in the process
+def benchmarkInstanceConstruction(nInstances=20):
+    print('\n Instance construction (ms per instance) \n')
+    print('{:<34}{:>16}{:>16}{:>16}'.format('Class', 'private pickle', 'private npy', 'shared'))
+    classes = [('Coder_Hybrid.HybridCoder', Coder_Hybrid.HybridCoder),
+               ('Coder_Hybrid_Mod.HybridCoder', Coder_Hybrid_Mod.HybridCoder),
+               ('Decoder_Hybrid.HybridDecoder', Decoder_Hybrid.HybridDecoder),
+               ('Decoder_Hybrid_rg.HybridDecoder', Decoder_Hybrid_rg.HybridDecoder),
+               ('Decoder_Hybrid_Mod.HybridDecoder', Decoder_Hybrid_Mod.HybridDecoder)]
+    sharedCodingTables = HybridCodingTables.sharedCodingTables
+    for className, instanceClass in classes:
+        results = []
+        for compiledTablesPath in ['', HybridCodingTables.COMPILED_CODING_TABLES_PATH]:
+            # A new (empty) table set for each instance
+            def constructWithPrivateTables():
+                HybridCodingTables.sharedCodingTables = HybridCodingTables.HybridCodingTableSet(compiledTablesPath)
+                instanceClass()
+            results.append(measureTime(constructWithPrivateTables, nInstances))
+        HybridCodingTables.sharedCodingTables = sharedCodingTables
+        instanceClass()
+        results.append(measureTime(instanceClass, nInstances))
+        print('{:<34}{:>16.3f}{:>16.3f}{:>16.3f}'.format(className, *[1000 * result for result in results]))
+
+
+# Coding time of the hybrid coder (Coder_Hybrid_Mod) for synthetic mapped residuals
+#   per sample: Σ(t) and Γ(t) updated and evaluated sample by sample (previous behaviour)
+#   trajectory: Σ(t) and Γ(t) computed for all the samples at once (HybridAccumulator.py)
+def benchmarkHybridCoding(nSamples=200000, dynamicRangeInBits=16):
+    print('\n Hybrid coding (Msamples/s) \n')
+    print('{:<34}{:>16}{:>16}'.format('Residuals', 'per sample', 'trajectory'))
+    rng = numpy.random.default_rng(0)
+    residualSets = [('low entropy', rng.geometric(0.8, nSamples) - 1),
+                    ('high entropy', rng.geometric(0.01, nSamples) - 1)]
+    for residualsName, mappedResiduals in residualSets:
+        mappedResiduals = mappedResiduals.clip(0, 2**dynamicRangeInBits - 1)
+        coder = Coder_Hybrid_Mod.HybridCoder()
+        coder.dynamicRangeInBits = dynamicRangeInBits
+        def codePerSample():
+            coder.initializeCodingVariables()
+            for index in range(0, nSamples):
+                coder.codeTargetMappedResidual(mappedResiduals, index)
+        def codeTrajectory():
+            coder.initializeCodingVariables()
+            coder.codeMappedResiduals(mappedResiduals)
+        results = [measureTime(codePerSample, 1), measureTime(codeTrajectory, 1)]
+        print('{:<34}{:>16.3f}{:>16.3f}'.format(residualsName, *[nSamples / result / 1e6 for result in results]))
+
+
+# Throughput (MB/s of output bitstream) writing random codes
+#   writeBits: one call per code to BitStreamWriter.writeBits
+#   packCodes: all the codes packed at once
+def benchmarkBitPacker(nCodes=500000, maxCodeLength=48):
+    print('\n Bit packer (MB/s) \n')
+    print('{:<34}{:>16}{:>16}'.format('Codes', 'writeBits', 'packCodes'))
+    rng = numpy.random.default_rng(0)
+    codeSets = [('short (1 - 8 bits)', rng.integers(1, 9, nCodes)),
+                ('long (1 - {} bits)'.format(maxCodeLength), rng.integers(1, maxCodeLength + 1, nCodes)),
+                ('very long (64 - 128 bits)', rng.integers(64, 129, nCodes))]
+    for codesName, codeLengths in codeSets:
+        codeValues = rng.integers(0, 2**63, nCodes, dtype=numpy.uint64)
+        nMegaBytes = codeLengths.sum() / 8 / 1e6
+        codeValuesList = codeValues.tolist()
+        codeLengthsList = codeLengths.tolist()
+        def writeCodesOneByOne():
+            bitWriter = BitStreamWriter()
+            for codeValue, codeLength in zip(codeValuesList, codeLengthsList):
+                bitWriter.writeBits(codeValue, codeLength)
+        def writeCodesPacked():
+            packCodes(codeValues, codeLengths)
+        results = [measureTime(writeCodesOneByOne, 1), measureTime(writeCodesPacked, 3)]
+        print('{:<34}{:>16.2f}{:>16.2f}'.format(codesName, *[nMegaBytes / result for result in results]))
+
+
+# Golomb-Rice coding and decoding time (ms) for synthetic vectors
+#   bit by bit: bitstream written/read bit by bit (previous behaviour, still used when a log file is requested)
+#   vectorized: codes of all the elements computed and packed/unpacked at once
+def benchmarkGolombRiceCoding(nElements=50000, dynamicRange=16):
+    print('\n Golomb-Rice coding and decoding (ms), compression ratio \n')
+    print('{:<22}{:>18}{:>18}{:>18}{:>18}{:>10}'.format('Vector', 'code bit by bit', 'code vectorized', 'dec. bit by bit', 'dec. vectorized', 'ratio'))
+    rng = numpy.random.default_rng(0)
+    vectors = [('geometric', rng.geometric(0.05, nElements) - 1),
+               ('uniform', rng.integers(0, 2**dynamicRange, nElements))]
+    outputFilePath = os.path.join(tempfile.gettempdir(), 'benchmarkGolombRice.bin')
+    for vectorName, vector in vectors:
+        for riceMode in [False, True]:
+            coder = GolombRiceCoder()
+            def codeBitByBit():
+                coder.fileOut = open(outputFilePath, 'wb')
+                coder.verbose = False
+                M = max(int(numpy.mean(vector)), 1)
+                b = int(math.floor(math.log2(M))+1)
+                coder.codeBitByBit(vector, [(M, dynamicRange)], M, b, 2**b - M)
+                coder.fileOut.close()
+            def codeVectorized():
+                coder.code(vector, dynamicRange, outputFilePath, riceMode=riceMode)
+            def decodeBitByBit():
+                coder.decodeBitstream(numpy.fromfile(outputFilePath, dtype=numpy.uint8).tolist(), nElements, dynamicRange)
+            def decodeVectorized():
+                coder.decode(outputFilePath, dynamicRange, nElements)
+            if riceMode:
+                # The bit by bit coder and decoder are only measured in the Golomb mode
+                results = [float('nan'), measureTime(codeVectorized, 5), float('nan'), measureTime(decodeVectorized, 5)]
+            else:
+                results = [measureTime(codeBitByBit, 1), measureTime(codeVectorized, 5), measureTime(decodeBitByBit, 1), measureTime(decodeVectorized, 5)]
+            compressionRatio = nElements * 2 / coder.getSizeOfFile(outputFilePath)
+            rowName = vectorName + (' (Rice)' if riceMode else '')
+            print('{:<22}{:>18.2f}{:>18.2f}{:>18.2f}{:>18.2f}{:>10.2f}'.format(rowName, *[1000 * result for result in results], compressionRatio))
+    os.remove(outputFilePath)
+
+
+# Block-adaptive Golomb-Rice coding of a large vector whose statistics change along it
+# Coding and decoding times (ms) and compression ratio, with the segments processed sequentially or in a process pool
+def benchmarkBlockAdaptiveGolombRice(nSegments=64, segmentSize=65536, dynamicRange=16):
+    print('\n Block-adaptive Golomb-Rice coding (ms), compression ratio \n')
+    print('{:<34}{:>16}{:>16}{:>10}'.format('Mode', 'coding', 'decoding', 'ratio'))
+    rng = numpy.random.default_rng(0)
+    means = rng.choice([2, 20, 200, 2000], nSegments)
+    vector = numpy.concatenate([rng.geometric(1 / mean, segmentSize) - 1 for mean in means]).clip(0, 2**dynamicRange - 1)
+    outputFilePath = os.path.join(tempfile.gettempdir(), 'benchmarkGolombRice.bin')
+    modes = [('single M', None, None),
+             ('segments', segmentSize, None),
+             ('segments, {} processes'.format(os.cpu_count()), segmentSize, os.cpu_count())]
+    for modeName, modeSegmentSize, nWorkers in modes:
+        coder = GolombRiceCoder()
+        def codeVector():
+            coder.code(vector, dynamicRange, outputFilePath, segmentSize=modeSegmentSize, nWorkers=nWorkers)
+        def decodeVector():
+            coder.decode(outputFilePath, dynamicRange, vector.size, nWorkers=nWorkers)
+        results = [measureTime(codeVector, 1), measureTime(decodeVector, 1)]
+        compressionRatio = vector.size * 2 / coder.getSizeOfFile(outputFilePath)
+        print('{:<34}{:>16.2f}{:>16.2f}{:>10.2f}'.format(modeName, *[1000 * result for result in results], compressionRatio))
+    os.remove(outputFilePath)
+
+
+# Hybrid coding and decoding times (ms) of a 1D vector as a single stream (Coder_Hybrid_Mod, Decoder_Hybrid_rg)
+# and as independently coded segments (HybridSegments.py), processed sequentially or in a process pool
+def benchmarkSegmentedHybridCoding(nSamples=200000, segmentSize=25000, dynamicRangeInBits=16):
+    print('\n Segmented hybrid coding (ms), compression ratio \n')
+    print('{:<34}{:>16}{:>16}{:>10}'.format('Mode', 'coding', 'decoding', 'ratio'))
+    rng = numpy.random.default_rng(0)
+    vector = numpy.where(rng.random(nSamples) < 0.7, rng.geometric(0.8, nSamples) - 1, rng.geometric(0.01, nSamples) - 1).clip(0, 2**dynamicRangeInBits - 1)
+    outputFilePath = os.path.join(tempfile.gettempdir(), 'benchmarkHybrid.bin')
+    def codeSingleStream():
+        coder = Coder_Hybrid_Mod.HybridCoder()
+        bitStream = coder.codeToBytes(dynamicRangeInBits, '', vector)
+        filePointer = open(outputFilePath, 'wb')
+        filePointer.write(bitStream)
+        filePointer.close()
+    def decodeSingleStream():
+        Decoder_Hybrid_rg.HybridDecoder().decode(outputFilePath, 32, 4, 1, dynamicRangeInBits, nSamples)
+    results = [measureTime(codeSingleStream, 1), measureTime(decodeSingleStream, 1)]
+    compressionRatio = nSamples * dynamicRangeInBits / 8 / os.path.getsize(outputFilePath)
+    print('{:<34}{:>16.2f}{:>16.2f}{:>10.2f}'.format('single stream', *[1000 * result for result in results], compressionRatio))
+    segmentLengths = HybridSegments.getSegmentLengths(nSamples, segmentSize)
+    for modeName, nWorkers in [('segments', None), ('segments, {} processes'.format(os.cpu_count()), os.cpu_count())]:
+        def codeSegments():
+            HybridSegments.encodeParallel(vector, dynamicRangeInBits, outputFilePath, segmentLengths, nWorkers)
+        def decodeSegments():
+            HybridSegments.decodeParallel(outputFilePath, nWorkers)
+        results = [measureTime(codeSegments, 1), measureTime(decodeSegments, 1)]
+        compressionRatio = nSamples * dynamicRangeInBits / 8 / os.path.getsize(outputFilePath)
+        print('{:<34}{:>16.2f}{:>16.2f}{:>10.2f}'.format(modeName, *[1000 * result for result in results], compressionRatio))
+    os.remove(outputFilePath)
+
+
+# Time (ms) of each stage of the Python compression and decompression chain for one synthetic image block:
+# HyperLCA transform, prediction mapper and hybrid coding of the mapped values (Data_Adapter layout), and
+# hybrid decoding, inverse prediction mapper and inverse transform
+def benchmarkHyperLCAChain(nb=224, blockSize=1024, DR_Pixels=16, DR_Projections=12, desiredCR=16):
+    print('\n HyperLCA compression chain (ms per block) \n')
+    print('{:<34}{:>16}'.format('Stage', 'time'))
+    rng = numpy.random.default_rng(0)
+    # Smooth spectra (mixtures of a few random signatures) plus noise
+    signatures = rng.integers(1000, 12000, (nb, 6)).astype(numpy.float64)
+    abundances = rng.dirichlet(numpy.ones(6), blockSize).T
+    ImgBlock = numpy.round(signatures @ abundances + rng.normal(0, 20, (nb, blockSize))).clip(0, 2**DR_Pixels - 1)
+    pmax = HyperLCA.computePmax(blockSize, nb, DR_Pixels, DR_Projections, desiredCR)
+    results = {}
+    def transform():
+        results['transform'] = HyperLCA.HyperLCA_Transform(ImgBlock, pmax, DR_Projections)
+    def mapper():
+        results['mapper'] = HyperLCA.HyperLCA_Prediction_Mapper(*results['transform'], DR_Pixels, DR_Projections)
+    def coding():
+        Pixels, Projections, averagePixel = results['mapper']
+        results['vector'] = numpy.concatenate((averagePixel.ravel(), numpy.hstack((Pixels.T, Projections)).ravel())).astype(int)
+        results['bitStream'] = Coder_Hybrid_Mod.HybridCoder().codeToBytes(DR_Pixels, '', results['vector'])
+    def decoding():
+        results['decoded'] = Decoder_Hybrid_rg.HybridDecoder().decodeBitStream(results['bitStream'], 32, 4, 1, DR_Pixels, results['vector'].size)
+    def inverseMapper():
+        Pixels, Projections, averagePixel = HyperLCA.splitBlockVector(results['decoded'], nb, pmax)
+        results['inverseMapper'] = HyperLCA.Inverse_HyperLCA_Prediction_Mapper(Pixels, Projections, averagePixel, DR_Pixels, DR_Projections)
+    def inverseTransform():
+        HyperLCA.Inverse_HyperLCA_Transform(*results['inverseMapper'], DR_Projections)
+    stages = [('transform (pmax = {})'.format(pmax), transform), ('prediction mapper', mapper), ('hybrid coding', coding),
+              ('hybrid decoding', decoding), ('inverse prediction mapper', inverseMapper), ('inverse transform', inverseTransform)]
+    for stageName, stage in stages:
+        print('{:<34}{:>16.2f}'.format(stageName, 1000 * measureTime(stage, 5)))
+
+
+# HyperLCA transform time (ms per block) for several compression ratios (pmax)
+#   exact energy: residual image deflated and its energy recomputed in every iteration (energyRefreshPeriod = 1, as HyperLCA_Transform.m)
+#   downdating: residual image deflated in every iteration and energy downdating (default, energyRefreshPeriod = ENERGY_REFRESH_PERIOD)
+#   lazy deflation: energy downdating and lazy deflation (deflationPeriod = LAZY_DEFLATION_PERIOD)
+def benchmarkHyperLCATransform(nb=224, blockSize=1024, DR_Pixels=16, DR_Projections=12, desiredCRs=(16, 8, 4)):
+    print('\n HyperLCA transform (ms per block) \n')
+    print('{:<34}{:>16}{:>16}{:>16}'.format('pmax', 'exact energy', 'downdating', 'lazy deflation'))
+    rng = numpy.random.default_rng(0)
+    signatures = rng.integers(1000, 12000, (nb, 6)).astype(numpy.float64)
+    abundances = rng.dirichlet(numpy.ones(6), blockSize).T
+    ImgBlock = numpy.round(signatures @ abundances + rng.normal(0, 20, (nb, blockSize))).clip(0, 2**DR_Pixels - 1)
+    for desiredCR in desiredCRs:
+        pmax = HyperLCA.computePmax(blockSize, nb, DR_Pixels, DR_Projections, desiredCR)
+        results = {}
+        def exactTransform():
+            results['exact'] = HyperLCA.HyperLCA_Transform(ImgBlock, pmax, DR_Projections, energyRefreshPeriod=1)
+        def transform():
+            results['downdating'] = HyperLCA.HyperLCA_Transform(ImgBlock, pmax, DR_Projections)
+        def lazyTransform():
+            results['lazy'] = HyperLCA.HyperLCA_Transform(ImgBlock, pmax, DR_Projections, deflationPeriod=HyperLCA.LAZY_DEFLATION_PERIOD)
+        times = [measureTime(exactTransform, 5), measureTime(transform, 5), measureTime(lazyTransform, 5)]
+        # All the versions must select the same pixels, and the downdating must give the same projections
+        equal = numpy.array_equal(results['exact'][0], results['lazy'][0]) and all(numpy.array_equal(exact, downdated) for exact, downdated in zip(results['exact'], results['downdating']))
+        print('{:<34}{:>16.2f}{:>16.2f}{:>16.2f}'.format('{}{}'.format(pmax, '' if equal else ' (DIFFERENT RESULTS)'), *[1000 * t for t in times]))
+
+
+# HyperLCA compressor time (s) for a whole synthetic image (AVIRIS size: 512 x 512 pixels, 224 bands)
+#   per block loop: HyperLCA_Transform and HyperLCA_Prediction_Mapper for each block, concatenating the outputs (MainHyperLCA_Test_mod.m)
+#   batched: HyperLCA_Compressor (all the blocks transformed at once, outputs written in preallocated arrays)
+def benchmarkHyperLCAMultiBlock(nr=512, nc=512, nb=224, blockSize=1024, DR_Pixels=16, DR_Projections=12, desiredCR=16):
+    print('\n HyperLCA multi-block compressor (s per image) \n')
+    print('{:<34}{:>16}{:>16}'.format('Image', 'per block loop', 'batched'))
+    rng = numpy.random.default_rng(0)
+    numBlocks = nr * nc // blockSize
+    signatures = rng.integers(1000, 12000, (nb, 6)).astype(numpy.float64)
+    ImgVect = signatures @ rng.dirichlet(numpy.ones(6), nr * nc).T
+    ImgVect += rng.normal(0, 20, ImgVect.shape)
+    numpy.round(ImgVect, out=ImgVect).clip(0, 2**DR_Pixels - 1, out=ImgVect)
+    pmax = HyperLCA.computePmax(blockSize, nb, DR_Pixels, DR_Projections, desiredCR)
+    results = {}
+    def compressPerBlock():
+        for i in range(0, numBlocks):
+            ImgBlock = ImgVect[:, blockSize * i:blockSize * (i + 1)]
+            Pixels, Projections, averagePixel = HyperLCA.HyperLCA_Transform(ImgBlock, pmax, DR_Projections)
+            Pixels, Projections, averagePixel = HyperLCA.HyperLCA_Prediction_Mapper(Pixels, Projections, averagePixel, DR_Pixels, DR_Projections)
+            if i == 0:
+                PM_Pixels, PM_Projections, PM_Centroid = Pixels, Projections, averagePixel
+            else:
+                PM_Pixels = numpy.concatenate((PM_Pixels, Pixels), axis=1)
+                PM_Projections = numpy.concatenate((PM_Projections, Projections), axis=1)
+                PM_Centroid = numpy.concatenate((PM_Centroid, averagePixel), axis=1)
+        results['per block'] = (PM_Pixels, PM_Projections, PM_Centroid)
+    def compressBatched():
+        results['batched'] = HyperLCA.HyperLCA_Compressor(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections)
+    times = [measureTime(compressPerBlock, 1), measureTime(compressBatched, 1)]
+    equal = all(numpy.array_equal(a, b) for a, b in zip(results['per block'], results['batched']))
+    imageName = '{}x{}x{}, {} blocks{}'.format(nr, nc, nb, numBlocks, '' if equal else ' (DIFFERENT)')
+    print('{:<34}{:>16.2f}{:>16.2f}'.format(imageName, *times))
+
+
+
+
+if(__name__ == "__main__"):
+
+    benchmarkInstanceConstruction()
+    benchmarkHybridCoding()
+    benchmarkBitPacker()
+    benchmarkGolombRiceCoding()
+    benchmarkBlockAdaptiveGolombRice()
+    benchmarkSegmentedHybridCoding()
+    benchmarkHyperLCAChain()
+    benchmarkHyperLCATransform()
+    benchmarkHyperLCAMultiBlock()
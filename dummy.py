@@ -1,68 +1,349 @@
-import Data_Adapter
-import pickle
-
-import Coder_Hybrid_Mod as coder
-import Decoder_Hybrid_rg as decoder
-
-from GolombRiceCoder import * 
-
-
-import numpy as np
-import os
-
-
-
-if(__name__ == "__main__"):
-
-
-    print('\n\n Hybrid coder test \n\n ')
-
-    # Data paths
-    centroid = os.path.join('InputData','PM_Centroid.npy')
-    pixels = os.path.join('InputData','PM_Pixels.npy')
-    projections = os.path.join('InputData','PM_Projections.npy')
-    # Adapt the input data to a 1D vector format
-    adaptador = Data_Adapter.Adapter(centroid, pixels, projections)
-    v = adaptador.AdaptInputTo1DVector(32)
-
-    # Instantiate coder object
-    codificador = coder.HybridCoder()
-    # Code input vector
-    codificador.code(16, '', os.path.join('OutputData','CodedData.npy'), v)
-    print(v)
-    # Decode coded vector
-    decodificador = decoder.HybridDecoder()
-    vDecoded = decodificador.decode(os.path.join('OutputData','CodedData.npy'), 32, 4, 1, 16, len(v))
-    print(vDecoded)
-
-    
-    if(adaptador.CompareVectors(v, vDecoded)):
-        print("Vectores iguales")
-    else:
-        print("Vectores diferentes")
-
-
-
-    print('\n\n GolombRiceTest \n\n ')
-    
-    grCoderOutputFilePath = os.path.join('OutputData','grCodedData.bin') 
-    grCoder = GolombRiceCoder()
-    '''grCoder.code(adaptador.PM_Centroid.flatten(), 16, grCoderOutputFilePath)
-    grCoder.code(adaptador.PM_Pixels.flatten(), 16, grCoderOutputFilePath)
-    grCoder.code(adaptador.PM_Projections.flatten(), 16, grCoderOutputFilePath)'''
-    grCoder.code(v, 16, grCoderOutputFilePath)
-    compressionRatio = len(v)*2 / grCoder.getSizeOfFile(grCoderOutputFilePath)
-    print('Coding compression ratio: {}'.format(round(compressionRatio, 2)))
-
-    vDecoded = grCoder.decode(grCoderOutputFilePath, 16, len(v))
-
-    print(v)
-    print(vDecoded)
-    if(adaptador.CompareVectors(v, vDecoded)):
-        print("Vectores iguales")
-    else:
-        print("Vectores diferentes")
-
-
-
+import Data_Adapter
+import pickle
+
+import Coder_Hybrid_Mod as coder
+import Decoder_Hybrid_rg as decoder
+
+from GolombRiceCoder import * 
+
+
+import numpy as np
+import os
+import io
+import contextlib
+import tempfile
+
+from HybridCodingTables import getCodingTables
+from HybridAccumulator import CodeSelectionTables
+import HyperLCA
+
+
+
+# Selection of the high-entropy processing and of the code indexes with the original loops of the coders and decoders
+def referenceHighEntropyCondition(Sigma, Gamma, Table_InputSimbolLimitAndThreshold):
+    return Sigma * (2**14) >= Table_InputSimbolLimitAndThreshold[0][2] * Gamma
+
+def referenceK(Sigma, Gamma, dynamicRangeInBits):
+    k_good = 2
+    k = 3
+    while k <= max(dynamicRangeInBits-2, 2): 
+        if Gamma * 2**(k+2) <= Sigma + int( (49/2**5)*Gamma ):
+            k_good = k
+            k = k + 1
+        else:
+            break
+    return k_good
+
+def referenceCodeIndex(Sigma, Gamma, Table_InputSimbolLimitAndThreshold):
+    i_good = 0
+    i = 1
+    while i < 16:
+        Ti = Table_InputSimbolLimitAndThreshold[i][2]
+        if Sigma * 2**14 < Gamma * Ti:
+            i_good = i
+            i = i + 1
+        else:
+            break
+    return i_good
+
+
+# Compare the code selection tables with the original loops for every Γ and:
+#   exhaustive: every Σ < 2^(D+ɣ^*+1)
+#   otherwise: every breakpoint of the tables, its neighbours and the extreme values
+# (the selections only change at the breakpoints)
+def checkCodeSelectionTables(configurations=[(4, 4, True), (4, 6, True), (6, 5, True), (8, 4, True), (12, 8, False), (16, 8, False), (16, 11, False)]):
+    Table_InputSimbolLimitAndThreshold = getCodingTables().getTable('InputSymbolLimitAndThreshold')
+    allEqual = True
+    for dynamicRangeInBits, gamma, exhaustive in configurations:
+        tables = CodeSelectionTables(dynamicRangeInBits, gamma, Table_InputSimbolLimitAndThreshold)
+        for Gamma in range(1, 2**gamma):
+            if exhaustive:
+                SigmaValues = range(0, 2**(dynamicRangeInBits + gamma + 1))
+            else:
+                breakpoints = [tables.highEntropyLimits[Gamma]] + tables.kBreakpoints[Gamma] + tables.codeIndexBreakpoints[Gamma]
+                SigmaValues = sorted(set([0, 2**(dynamicRangeInBits + gamma + 1)] + [max(breakpoint + offset, 0) for breakpoint in breakpoints for offset in [-1, 0, 1]]))
+            selections = [(tables.isHighEntropy(Sigma, Gamma), tables.getK(Sigma, Gamma), tables.getCodeIndex(Sigma, Gamma)) for Sigma in SigmaValues]
+            referenceSelections = [(referenceHighEntropyCondition(Sigma, Gamma, Table_InputSimbolLimitAndThreshold), referenceK(Sigma, Gamma, dynamicRangeInBits),
+                                    referenceCodeIndex(Sigma, Gamma, Table_InputSimbolLimitAndThreshold)) for Sigma in SigmaValues]
+            # Vectorized selections
+            SigmaArray = np.array(SigmaValues, dtype=np.int64)
+            GammaArray = np.full(SigmaArray.size, Gamma, dtype=np.int64)
+            arraySelections = list(zip(tables.isHighEntropyArray(SigmaArray, GammaArray).tolist(), tables.getKArray(SigmaArray, GammaArray).tolist(),
+                                       tables.getCodeIndexArray(SigmaArray, GammaArray).tolist()))
+            if selections != referenceSelections or arraySelections != referenceSelections:
+                print('Code selection mismatch: D = {}, gamma = {}, Gamma = {}'.format(dynamicRangeInBits, gamma, Gamma))
+                allEqual = False
+                break
+    return allEqual
+
+
+# Code a vector in chunks, taking a checkpoint after each chunk and resuming the coding from the serialized
+# state in a new coder instance (after coding one more chunk that is discarded), and compare the output file
+# with the one obtained coding the whole vector at once (both files are written in a temporary directory)
+def checkResumedCoding(nSamples=20000, nChunks=7):
+    rng = np.random.default_rng(0)
+    v = np.where(rng.random(nSamples) < 0.5, rng.poisson(0.5, nSamples), rng.integers(0, 2**12, nSamples))
+    with tempfile.TemporaryDirectory() as outputDirectory:
+        singleShotPath = os.path.join(outputDirectory, 'SingleShotCodedData.bin')
+        resumedPath = os.path.join(outputDirectory, 'ResumedCodedData.bin')
+        with contextlib.redirect_stdout(io.StringIO()):
+            coder.HybridCoder().code(16, '', singleShotPath, v)
+        chunks = np.array_split(v, nChunks)
+        session = coder.HybridCoder().openSession(16, '', resumedPath, bufferSizeInBytes=256)
+        for index, chunk in enumerate(chunks):
+            session.feed(chunk)
+            stateBytes = session.checkpoint().toBytes()
+            # Coding that is lost when the worker is restarted
+            if index + 1 < len(chunks):
+                session.feed(chunks[index + 1])
+                session.coder.bitWriter.writeCompleteBytesToFile(session.filePointer)
+            session.filePointer.close()
+            session = coder.HybridCoder().resumeSession(coder.HybridCoderState.fromBytes(stateBytes), resumedPath, bufferSizeInBytes=256)
+        session.close()
+        singleShotFile = open(singleShotPath, 'rb')
+        resumedFile = open(resumedPath, 'rb')
+        equal = singleShotFile.read() == resumedFile.read()
+        singleShotFile.close()
+        resumedFile.close()
+        # States taken with getState without a checkpoint, after the header (its bits are still in the
+        # accumulator) and after coding a chunk (the states keep the whole bitstream)
+        headerBinaryString = '1011001110001111000011'
+        singleShotBytes = coder.HybridCoder().codeToBytes(16, headerBinaryString, v)
+        firstCoder = coder.HybridCoder()
+        firstSession = firstCoder.openSession(16, headerBinaryString, resumedPath)
+        states = [(0, firstCoder.getState().toBytes())]
+        firstSession.feed(v[:1001])
+        states.append((1001, firstCoder.getState().toBytes()))
+        firstSession.filePointer.close()
+        for nCodedSamples, stateBytes in states:
+            with coder.HybridCoder().resumeSession(coder.HybridCoderState.fromBytes(stateBytes), resumedPath) as session:
+                session.feed(v[nCodedSamples:])
+            resumedFile = open(resumedPath, 'rb')
+            equal = equal and singleShotBytes == resumedFile.read()
+            resumedFile.close()
+    return equal
+
+
+# Code and decode vectors of a few samples (the first sample is coded alone), also feeding a single sample as the
+# first chunk of a coding session
+def checkShortVectors(lengths=[1, 2, 3], dynamicRangeInBits=16):
+    rng = np.random.default_rng(0)
+    allEqual = True
+    for nSamples in lengths:
+        v = rng.integers(0, 2**dynamicRangeInBits, nSamples)
+        bitStream = coder.HybridCoder().codeToBytes(dynamicRangeInBits, '', v)
+        vDecoded = decoder.HybridDecoder().decodeBitStream(bitStream, 32, 4, 1, dynamicRangeInBits, nSamples).ravel()
+        allEqual = allEqual and np.array_equal(v, vDecoded)
+        with tempfile.TemporaryDirectory() as outputDirectory:
+            sessionPath = os.path.join(outputDirectory, 'SessionCodedData.bin')
+            with coder.HybridCoder().openSession(dynamicRangeInBits, '', sessionPath) as session:
+                session.feedChunks([v[0:1], v[1:]])
+            sessionFile = open(sessionPath, 'rb')
+            allEqual = allEqual and sessionFile.read() == bitStream
+            sessionFile.close()
+    return allEqual
+
+
+# Synthetic hyperspectral image matrix (nb x np): mixtures of a few random signatures plus noise
+def generateHyperspectralImage(rng, nb, nPixels, DR_Pixels):
+    signatures = rng.integers(1000, 12000, (nb, 5)).astype(np.float64)
+    abundances = rng.dirichlet(np.ones(5), nPixels).T
+    return np.round(signatures @ abundances + rng.normal(0, 20, (nb, nPixels))).clip(0, 2**DR_Pixels - 1)
+
+
+
+# HyperLCA transform, prediction mapper and their inverses on a seeded synthetic image (mixtures of a few signatures
+# plus noise), comparing:
+#   the multi-block transform with the transform of each block
+#   the lazy deflation with the default transform (same selected pixels)
+#   the vectorized mapping functions with the scalar ones
+#   the inverse prediction mapper of the mapped values with the transform outputs
+#   the block decompressed from its vector (Data_Adapter layout) with the inverse transform of the transform outputs
+#   (the reconstruction is compared with a tolerance, the rest of values exactly)
+def checkHyperLCA(nb=64, blockSize=256, numBlocks=3, pmax=12, DR_Pixels=16, DR_Projections=12):
+    rng = np.random.default_rng(0)
+    ImgVect = generateHyperspectralImage(rng, nb, numBlocks * blockSize, DR_Pixels)
+    allEqual = True
+    # Multi-block transform
+    ImgBlocks = HyperLCA.getImageBlocks(ImgVect, blockSize, numBlocks)
+    Pixels, Projections, averagePixel = HyperLCA.HyperLCA_TransformBlocks(ImgBlocks, pmax, DR_Projections)
+    exactBlocks = HyperLCA.HyperLCA_TransformBlocks(ImgBlocks, pmax, DR_Projections, energyRefreshPeriod=1)
+    allEqual = allEqual and all(np.array_equal(exact, downdated) for exact, downdated in zip(exactBlocks, [Pixels, Projections, averagePixel]))
+    for block in range(0, numBlocks):
+        blockPixels, blockProjections, blockAveragePixel = HyperLCA.HyperLCA_Transform(ImgBlocks[block], pmax, DR_Projections)
+        allEqual = allEqual and np.array_equal(Pixels[:, block * pmax:(block + 1) * pmax], blockPixels)
+        allEqual = allEqual and np.array_equal(Projections[:, block * blockSize:(block + 1) * blockSize], blockProjections)
+        allEqual = allEqual and np.array_equal(averagePixel[:, block:block + 1], blockAveragePixel)
+        # Exact energy in every iteration (MATLAB function): same selected pixels and projections as the downdating
+        exactPixels, exactProjections, exactAveragePixel = HyperLCA.HyperLCA_Transform(ImgBlocks[block], pmax, DR_Projections, energyRefreshPeriod=1)
+        allEqual = allEqual and np.array_equal(exactPixels, blockPixels) and np.array_equal(exactProjections, blockProjections)
+        allEqual = allEqual and np.array_equal(exactAveragePixel, blockAveragePixel)
+        # Lazy deflation
+        lazyPixels, lazyProjections, lazyAveragePixel = HyperLCA.HyperLCA_Transform(ImgBlocks[block], pmax, DR_Projections, deflationPeriod=HyperLCA.LAZY_DEFLATION_PERIOD)
+        allEqual = allEqual and np.array_equal(lazyPixels, blockPixels)
+    # Vectorized mapping functions
+    xMin = 0
+    xMax = 2**DR_Projections - 1
+    values = rng.integers(xMin, xMax + 1, 1000)
+    predictions = rng.integers(xMin, xMax + 1, 1000)
+    mappedValues = HyperLCA.mapPredictedValues(xMin, xMax, values, predictions)
+    allEqual = allEqual and mappedValues.tolist() == [HyperLCA.mapPredictedValue(xMin, xMax, v, pv) for v, pv in zip(values.tolist(), predictions.tolist())]
+    recoveredValues = HyperLCA.imapPredictedValues(xMin, xMax, mappedValues, predictions)
+    allEqual = allEqual and recoveredValues.tolist() == [HyperLCA.imapPredictedValue(xMin, xMax, v, pv) for v, pv in zip(mappedValues.tolist(), predictions.tolist())]
+    allEqual = allEqual and np.array_equal(recoveredValues, values)
+    # Prediction mapper and its inverse, and decompression of the block vector
+    blockPixels, blockProjections, blockAveragePixel = HyperLCA.HyperLCA_Transform(ImgBlocks[0], pmax, DR_Projections)
+    mappedPixels, mappedProjections, mappedAveragePixel = HyperLCA.HyperLCA_Prediction_Mapper(blockPixels, blockProjections, blockAveragePixel, DR_Pixels, DR_Projections)
+    recovered = HyperLCA.Inverse_HyperLCA_Prediction_Mapper(mappedPixels, mappedProjections, mappedAveragePixel, DR_Pixels, DR_Projections)
+    allEqual = allEqual and all(np.array_equal(recoveredArray, array) for recoveredArray, array in zip(recovered, [blockPixels, blockProjections, blockAveragePixel]))
+    blockVector = np.concatenate((mappedAveragePixel.ravel(), np.hstack((mappedPixels.T, mappedProjections)).ravel()))
+    ImgBlock = HyperLCA.decompressBlockVector(blockVector, nb, pmax, DR_Pixels, DR_Projections)
+    # (the recovered arrays have another memory layout, so the matrix products can differ in the last bits)
+    allEqual = allEqual and np.allclose(ImgBlock, HyperLCA.Inverse_HyperLCA_Transform(blockPixels, blockProjections, blockAveragePixel, DR_Projections), rtol=0, atol=1e-6)
+    return allEqual
+
+
+# HyperLCA compressor against the block loop of MainHyperLCA_Test_mod.m (HyperLCA_CompressorPerBlock): the first
+# block is the same one, and the following ones must give the outputs of the batched functions for the loop blocks,
+# which include the last column of the previous block
+def checkHyperLCAPerBlock(nb=64, blockSize=256, numBlocks=4, pmax=12, DR_Pixels=16, DR_Projections=12):
+    rng = np.random.default_rng(1)
+    # Pixels in consecutive memory positions, as in the matrices of readImageAsMatrix (MATLAB layout)
+    ImgVect = np.asfortranarray(generateHyperspectralImage(rng, nb, numBlocks * blockSize, DR_Pixels))
+    loopOutputs = HyperLCA.HyperLCA_CompressorPerBlock(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections)
+    loopPixels, loopProjections, loopCentroid = loopOutputs
+    Pixels, Projections, Centroid = HyperLCA.HyperLCA_Compressor(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections)
+    allEqual = np.array_equal(loopPixels[:, :pmax], Pixels[:, :pmax])
+    allEqual = allEqual and np.array_equal(loopProjections[:, :blockSize], Projections[:, :blockSize])
+    allEqual = allEqual and np.array_equal(loopCentroid[:, :1], Centroid[:, :1])
+    ImgBlocks = np.stack([ImgVect[:, blockSize * i - 1:blockSize * (i + 1)] for i in range(1, numBlocks)])
+    blockOutputs = HyperLCA.HyperLCA_TransformBlocks(ImgBlocks, pmax, DR_Projections)
+    blockOutputs = HyperLCA.HyperLCA_Prediction_MapperBlocks(*blockOutputs, DR_Pixels, DR_Projections)
+    allEqual = allEqual and np.array_equal(loopPixels[:, pmax:], blockOutputs[0])
+    allEqual = allEqual and np.array_equal(loopProjections[:, blockSize:], blockOutputs[1])
+    allEqual = allEqual and np.array_equal(loopCentroid[:, 1:], blockOutputs[2])
+    return allEqual
+
+
+# HyperLCA compressor against the outputs of MainHyperLCA_Test_mod.m in 'InputData' (bit-identical integers)
+# The source image is not shipped with the repository, so the check is only run when it is available
+def checkHyperLCAReference(imageFilePath=os.path.join('InputData', 'AVIRIS_LunarLake_BIP_LE'), nr=512, nc=512, nb=224,
+                           desiredCR=16, blockSize=1024, numBlocks=1, DR_Pixels=16, DR_Projections=12):
+    ImgVect = HyperLCA.readImageAsMatrix(imageFilePath, nr, nc, nb)
+    pmax = HyperLCA.computePmax(blockSize, nb, DR_Pixels, DR_Projections, desiredCR)
+    outputs = HyperLCA.HyperLCA_Compressor(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections)
+    loopOutputs = HyperLCA.HyperLCA_CompressorPerBlock(ImgVect, blockSize, numBlocks, pmax, DR_Pixels, DR_Projections)
+    referenceOutputs = [np.load(os.path.join('InputData', fileName)) for fileName in ['PM_Pixels.npy', 'PM_Projections.npy', 'PM_Centroid.npy']]
+    return all(np.array_equal(output, reference) and np.array_equal(loopOutput, reference) for output, loopOutput, reference in zip(outputs, loopOutputs, referenceOutputs))
+
+
+if(__name__ == "__main__"):
+
+
+    print('\n\n Code selection tables test \n\n ')
+
+    if(checkCodeSelectionTables()):
+        print("Tablas iguales a los bucles originales")
+    else:
+        print("Tablas diferentes de los bucles originales")
+
+
+
+    print('\n\n Resumed coding test \n\n ')
+
+    if(checkResumedCoding()):
+        print("Ficheros iguales")
+    else:
+        print("Ficheros diferentes")
+
+
+
+    print('\n\n Short vectors test \n\n ')
+
+    if(checkShortVectors()):
+        print("Vectores cortos iguales")
+    else:
+        print("Vectores cortos diferentes")
+
+
+
+    print('\n\n HyperLCA test \n\n ')
+
+    if(checkHyperLCA()):
+        print("HyperLCA iguales")
+    else:
+        print("HyperLCA diferentes")
+
+    if(checkHyperLCAPerBlock()):
+        print("HyperLCA iguales al bucle por bloques de MATLAB")
+    else:
+        print("HyperLCA diferentes al bucle por bloques de MATLAB")
+
+    if(not os.path.isfile(os.path.join('InputData', 'AVIRIS_LunarLake_BIP_LE'))):
+        print("Imagen no encontrada: no se compara con las salidas de MATLAB")
+    elif(checkHyperLCAReference()):
+        print("HyperLCA iguales a MATLAB")
+    else:
+        print("HyperLCA diferentes a MATLAB")
+
+
+
+    print('\n\n Hybrid coder test \n\n ')
+
+    # Data paths
+    centroid = os.path.join('InputData','PM_Centroid.npy')
+    pixels = os.path.join('InputData','PM_Pixels.npy')
+    projections = os.path.join('InputData','PM_Projections.npy')
+    # Adapt the input data to a 1D vector format
+    adaptador = Data_Adapter.Adapter(centroid, pixels, projections)
+    v = adaptador.AdaptInputTo1DVector(adaptador.numBlocks)
+
+    # Instantiate coder object
+    codificador = coder.HybridCoder()
+    # Code input vector
+    codificador.code(16, '', os.path.join('OutputData','CodedData.npy'), v)
+    print(v)
+    # Decode coded vector
+    decodificador = decoder.HybridDecoder()
+    vDecoded = decodificador.decode(os.path.join('OutputData','CodedData.npy'), 32, 4, 1, 16, len(v))
+    print(vDecoded)
+
+    
+    if(adaptador.CompareVectors(v, vDecoded)):
+        print("Vectores iguales")
+    else:
+        print("Vectores diferentes")
+
+    # Centroid, pixels and projections from the decoded vector
+    PM_Centroid, PM_Pixels, PM_Projections = adaptador.Adapt1DVectorToInput(vDecoded)
+    if(np.array_equal(PM_Centroid, adaptador.PM_Centroid.astype(int)) and np.array_equal(PM_Pixels, adaptador.PM_Pixels.astype(int))
+       and np.array_equal(PM_Projections, adaptador.PM_Projections.astype(int))):
+        print("Matrices iguales")
+    else:
+        print("Matrices diferentes")
+
+
+
+    print('\n\n GolombRiceTest \n\n ')
+    
+    grCoderOutputFilePath = os.path.join('OutputData','grCodedData.bin') 
+    grCoder = GolombRiceCoder()
+    '''grCoder.code(adaptador.PM_Centroid.flatten(), 16, grCoderOutputFilePath)
+    grCoder.code(adaptador.PM_Pixels.flatten(), 16, grCoderOutputFilePath)
+    grCoder.code(adaptador.PM_Projections.flatten(), 16, grCoderOutputFilePath)'''
+    grCoder.code(v, 16, grCoderOutputFilePath)
+    compressionRatio = len(v)*2 / grCoder.getSizeOfFile(grCoderOutputFilePath)
+    print('Coding compression ratio: {}'.format(round(compressionRatio, 2)))
+
+    vDecoded = grCoder.decode(grCoderOutputFilePath, 16, len(v))
+
+    print(v)
+    print(vDecoded)
+    if(adaptador.CompareVectors(v, vDecoded)):
+        print("Vectores iguales")
+    else:
+        print("Vectores diferentes")
+
+
+
     
\ No newline at end of file